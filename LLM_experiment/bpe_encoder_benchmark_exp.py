@@ -0,0 +1,72 @@
+# BPEEncoder 编码速度实验：比较 无缓存 / 词级 LRU 缓存 / 进程池 三种方式的 tokens/s，
+# 并与 HelloAgentsLLM_Local 所用的 Hugging Face 分词器对比（需要能加载该分词器）
+# 用法: python LLM_experiment/bpe_encoder_benchmark_exp.py [--words 1000000] [--merges 2000] [--hf-model Qwen/Qwen3-0.6B]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tokenization_exp import BPETrainer, BPEEncoder
+from bpe_trainer_benchmark_exp import make_corpus
+
+def report(name, num_tokens, elapsed):
+    print(f"{name:<28} {num_tokens:>10} tokens {elapsed:8.2f}s {num_tokens / elapsed:>12.0f} tokens/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BPEEncoder 编码速度实验")
+    parser.add_argument("--words", type=int, default=1_000_000)
+    parser.add_argument("--merges", type=int, default=2000)
+    parser.add_argument("--words-per-line", type=int, default=20)
+    parser.add_argument("--processes", type=int, default=os.cpu_count())
+    parser.add_argument("--hf-model", default="Qwen/Qwen3-0.6B")
+    args = parser.parse_args()
+
+    corpus = make_corpus(args.words)
+    trainer = BPETrainer.from_corpus(corpus[:200_000])
+    trainer.train(args.merges)
+    lines = [' '.join(corpus[i:i + args.words_per_line]) for i in range(0, len(corpus), args.words_per_line)]
+
+    # 1. 无缓存（缓存容量为 0）
+    encoder = BPEEncoder.from_trainer(trainer, cache_size=0)
+    start = time.perf_counter()
+    num_tokens = sum(len(ids) for ids in encoder.encode_batch(lines))
+    report("BPEEncoder (无缓存)", num_tokens, time.perf_counter() - start)
+
+    # 2. 词级 LRU 缓存
+    encoder = BPEEncoder.from_trainer(trainer)
+    start = time.perf_counter()
+    batch_ids = encoder.encode_batch(lines)
+    report("BPEEncoder (LRU 缓存)", num_tokens, time.perf_counter() - start)
+    print(f"  缓存: {encoder.cache_info()}")
+    assert encoder.decode_batch(batch_ids[:100]) == lines[:100], "解码结果与原文不一致"
+
+    # 编码训练语料中的词，应得到与训练结束时完全相同的切分
+    for symbols in trainer.words[:1000]:
+        word = ''.join(trainer.symbols[s] for s in symbols)[:-len('</w>')]
+        assert [encoder.id_to_token[i] for i in encoder.encode(word)] == [trainer.symbols[s] for s in symbols]
+
+    # 3. 进程池（使用新的编码器，避免复用上面已经预热的缓存）
+    encoder = BPEEncoder.from_trainer(trainer)
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", suffix=".txt", delete=False) as f:
+        f.write("\n".join(lines))
+    try:
+        start = time.perf_counter()
+        file_ids = encoder.encode_file(f.name, processes=args.processes)
+        report(f"BPEEncoder ({args.processes} 进程)", sum(len(ids) for ids in file_ids), time.perf_counter() - start)
+    finally:
+        os.unlink(f.name)
+
+    # 4. Hugging Face 分词器（HelloAgentsLLM_Local 使用的分词器）
+    try:
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(args.hf_model)
+    except Exception as e:
+        print(f"跳过 Hugging Face 分词器对比: {e}")
+    else:
+        start = time.perf_counter()
+        hf_tokens = sum(len(ids) for ids in tokenizer(lines, add_special_tokens=False).input_ids)
+        report(f"HF {args.hf_model}", hf_tokens, time.perf_counter() - start)
@@ -0,0 +1,79 @@
+# 增量式 BPETrainer 与原始 get_stats + merge_vocab 的对比实验
+# 1) 在中等规模语料上确认两者学到的合并规则完全一致
+# 2) 在数百万词的语料上比较每次合并的耗时
+# 用法: python LLM_experiment/bpe_trainer_benchmark_exp.py [--words 3000000] [--merges 1000]
+
+import argparse
+import random
+import string
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+from tokenization_exp import BPETrainer, get_stats, merge_vocab
+
+def make_corpus(num_words, vocab_size=50000, seed=0):
+    """生成一个词频服从 Zipf 分布的合成语料。"""
+    rng = random.Random(seed)
+    letters = string.ascii_lowercase
+    word_list = [
+        ''.join(rng.choice(letters[:rng.randint(6, 26)]) for _ in range(rng.randint(2, 10)))
+        for _ in range(vocab_size)
+    ]
+    weights = [1 / (rank + 1) for rank in range(vocab_size)]
+    return rng.choices(word_list, weights=weights, k=num_words)
+
+def naive_train(vocab, num_merges):
+    merges = []
+    for _ in range(num_merges):
+        pairs = get_stats(vocab)
+        if not pairs:
+            break
+        best = max(pairs, key=pairs.get)
+        vocab = merge_vocab(best, vocab)
+        merges.append(best)
+    return merges, vocab
+
+def to_vocab(words):
+    trainer = BPETrainer.from_corpus(words)
+    return trainer.vocab()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="BPETrainer 基准")
+    parser.add_argument("--words", type=int, default=3_000_000)
+    parser.add_argument("--merges", type=int, default=1000)
+    parser.add_argument("--naive-merges", type=int, default=20, help="原始实现只跑少量合并，再折算每次耗时")
+    parser.add_argument("--check-words", type=int, default=50_000)
+    parser.add_argument("--check-merges", type=int, default=300)
+    args = parser.parse_args()
+
+    # 1. 一致性检查
+    check_vocab = to_vocab(make_corpus(args.check_words, vocab_size=5000, seed=1))
+    naive_merges, naive_vocab = naive_train(dict(check_vocab), args.check_merges)
+    trainer = BPETrainer.from_vocab(check_vocab)
+    fast_merges = trainer.train(args.check_merges)
+    assert fast_merges == naive_merges, "合并规则不一致"
+    assert trainer.vocab() == naive_vocab, "合并后的词表不一致"
+    print(f"✅ 一致性检查通过: {args.check_words} 词, {args.check_merges} 次合并")
+
+    # 2. 性能对比
+    corpus = make_corpus(args.words)
+    start = time.perf_counter()
+    vocab = to_vocab(corpus)
+    print(f"语料: {args.words} 词, {len(vocab)} 个不同的词 (构建 {time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    naive_train(dict(vocab), args.naive_merges)
+    naive_per_merge = (time.perf_counter() - start) / args.naive_merges
+
+    start = time.perf_counter()
+    trainer = BPETrainer.from_vocab(vocab)
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    learned = trainer.train(args.merges)
+    fast_per_merge = (time.perf_counter() - start) / max(len(learned), 1)
+
+    print(f"原始实现  : {naive_per_merge * 1000:9.2f} ms/次合并 (完成 {args.merges} 次约需 {naive_per_merge * args.merges:.1f}s)")
+    print(f"BPETrainer: {fast_per_merge * 1000:9.2f} ms/次合并 (初始化 {build_time:.2f}s, {len(learned)} 次合并共 {fast_per_merge * len(learned):.1f}s)")
+    print(f"每次合并加速: {naive_per_merge / fast_per_merge:.0f}x")
@@ -1,4 +1,5 @@
-import re, collections
+import os, re, collections, heapq, functools, itertools
+from concurrent.futures import ProcessPoolExecutor
 
 def get_stats(vocab):
     """统计词元对频率"""
@@ -19,19 +20,271 @@ def merge_vocab(pair, v_in):
         v_out[w_out] = v_in[word]
     return v_out
 
-# 准备语料库，每个词末尾加上</w>表示结束，并切分好字符
-vocab = {'h u g </w>': 1, 'p u g </w>': 1, 'p u n </w>': 1, 'b u n </w>': 1}
-num_merges = 4 # 设置合并次数
+class BPETrainer:
+    """
+    增量式 BPE 训练器。
+    词以整数符号数组保存，并维护 词元对 -> 频率、词元对 -> 所在词 两张表以及一个最大堆；
+    每次合并只更新包含该词元对的词，而不是像 get_stats/merge_vocab 那样重新扫描整个词表。
+    合并结果与上面的 get_stats + merge_vocab 完全一致（频率相同时，取在词表中最先出现的词元对）。
+    """
+    def __init__(self):
+        self.symbols = []      # 符号 id -> 符号字符串
+        self.symbol_ids = {}   # 符号字符串 -> 符号 id
+        self.words = []        # 每个词的符号 id 数组
+        self.freqs = []        # 每个词的词频
+        self.pair_counts = collections.defaultdict(int)
+        self.pair_words = collections.defaultdict(set)
+        self.heap = []         # (-频率, 词元对)，过期的条目在弹出时丢弃
+        self.merges = []
 
-for i in range(num_merges):
-    pairs = get_stats(vocab)
-    if not pairs:
-        break
-    best = max(pairs, key=pairs.get)
-    vocab = merge_vocab(best, vocab)
-    print(f"第{i+1}次合并: {best} -> {''.join(best)}")
-    print(f"新词表（部分）: {list(vocab.keys())}")
-    print("-" * 20)
+    @classmethod
+    def from_vocab(cls, vocab):
+        """从 {'h u g </w>': 1} 形式的词表构建（与 get_stats 的输入相同）。"""
+        trainer = cls()
+        for word, freq in vocab.items():
+            trainer._add_word([trainer._symbol_id(s) for s in word.split()], freq)
+        trainer._build_heap()
+        return trainer
+
+    @classmethod
+    def from_corpus(cls, words):
+        """从原始的词序列构建，每个词切分为字符并在末尾加上 </w>。"""
+        counts = collections.Counter(words)
+        return cls.from_vocab({' '.join(word) + ' </w>': freq for word, freq in counts.items()})
+
+    def _symbol_id(self, symbol):
+        symbol_id = self.symbol_ids.get(symbol)
+        if symbol_id is None:
+            symbol_id = self.symbol_ids[symbol] = len(self.symbols)
+            self.symbols.append(symbol)
+        return symbol_id
+
+    def _add_word(self, symbols, freq):
+        word_index = len(self.words)
+        self.words.append(symbols)
+        self.freqs.append(freq)
+        for pair in zip(symbols, symbols[1:]):
+            self.pair_counts[pair] += freq
+            self.pair_words[pair].add(word_index)
+
+    def _build_heap(self):
+        self.heap = [(-count, pair) for pair, count in self.pair_counts.items()]
+        heapq.heapify(self.heap)
+
+    def _first_occurrence(self, pair):
+        """词元对在词表中第一次出现的位置 (词序号, 符号位置)，用于复现 get_stats 的插入顺序。"""
+        word_index = min(self.pair_words[pair])
+        symbols = self.words[word_index]
+        for i in range(len(symbols) - 1):
+            if (symbols[i], symbols[i+1]) == pair:
+                return word_index, i
+
+    def _pop_best(self):
+        """弹出频率最高的词元对；频率相同时取第一次出现位置最靠前的。"""
+        best_count, candidates = None, []
+        while self.heap:
+            neg_count, pair = self.heap[0]
+            if self.pair_counts.get(pair, 0) != -neg_count or pair in candidates:
+                heapq.heappop(self.heap) # 过期或重复的条目
+                continue
+            if best_count is not None and -neg_count != best_count:
+                break
+            best_count = -neg_count
+            candidates.append(heapq.heappop(self.heap)[1])
+        if not candidates or best_count <= 0:
+            return None
+
+        best = min(candidates, key=self._first_occurrence) if len(candidates) > 1 else candidates[0]
+        for pair in candidates:
+            if pair != best:
+                heapq.heappush(self.heap, (-best_count, pair))
+        return best
+
+    def _merge(self, pair):
+        first, second = pair
+        new_id = self._symbol_id(self.symbols[first] + self.symbols[second])
+        changed = set()
+        for word_index in self.pair_words.pop(pair):
+            symbols, freq = self.words[word_index], self.freqs[word_index]
+            # 从左到右不重叠地合并，与 merge_vocab 中正则替换的行为一致
+            merged, i = [], 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and symbols[i] == first and symbols[i+1] == second:
+                    merged.append(new_id)
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    i += 1
+
+            old_pairs = collections.Counter(zip(symbols, symbols[1:]))
+            new_pairs = collections.Counter(zip(merged, merged[1:]))
+            for p, n in old_pairs.items():
+                self.pair_counts[p] -= n * freq
+                changed.add(p)
+                if p not in new_pairs and p != pair:
+                    self.pair_words[p].discard(word_index)
+            for p, n in new_pairs.items():
+                self.pair_counts[p] += n * freq
+                self.pair_words[p].add(word_index)
+                changed.add(p)
+            self.words[word_index] = merged
+
+        self.pair_counts.pop(pair, None)
+        for p in changed:
+            count = self.pair_counts.get(p, 0)
+            if count > 0:
+                heapq.heappush(self.heap, (-count, p))
+            elif p in self.pair_counts:
+                del self.pair_counts[p]
+                self.pair_words.pop(p, None)
+
+    def train(self, num_merges):
+        """执行至多 num_merges 次合并，返回本次学到的合并规则（字符串对）。"""
+        learned = []
+        for _ in range(num_merges):
+            best = self._pop_best()
+            if best is None:
+                break
+            self._merge(best)
+            learned.append((self.symbols[best[0]], self.symbols[best[1]]))
+        self.merges.extend(learned)
+        return learned
+
+    def vocab(self):
+        """以 get_stats 的输入格式导出当前词表。"""
+        return {' '.join(self.symbols[s] for s in symbols): freq for symbols, freq in zip(self.words, self.freqs)}
+
+class BPEEncoder:
+    """
+    基于已学到的合并规则的 BPE 编码器。
+    合并规则按学习顺序编号为 rank，每个词反复合并 rank 最小的相邻词元对，直到没有可合并的词元对；
+    已编码过的词保存在 LRU 缓存中，语料中的高频词只需计算一次。
+    """
+    UNK = "<unk>"
+
+    def __init__(self, merges, symbols=None, cache_size=100_000):
+        """
+        :param merges: 合并规则列表，如 [('u', 'g'), ('ug', '</w>')]
+        :param symbols: 词表中的全部符号；未提供时由合并规则推导（只含合并规则涉及的符号）
+        :param cache_size: 词级 LRU 缓存的容量
+        """
+        self.merges = [tuple(pair) for pair in merges]
+        self.ranks = {pair: rank for rank, pair in enumerate(self.merges)}
+        if symbols is None:
+            symbols = []
+            for first, second in self.merges:
+                symbols.extend([first, second, first + second])
+        self.id_to_token = [self.UNK] + list(dict.fromkeys(symbols))
+        self.token_to_id = {token: i for i, token in enumerate(self.id_to_token)}
+        self.cache_size = cache_size
+        self._encode_word = functools.lru_cache(maxsize=cache_size)(self._bpe)
+
+    @classmethod
+    def from_trainer(cls, trainer, cache_size=100_000):
+        return cls(trainer.merges, trainer.symbols, cache_size)
+
+    def __getstate__(self):
+        # lru_cache 包装的函数无法序列化，传给子进程时只带上合并规则与词表
+        return {"merges": self.merges, "symbols": self.id_to_token[1:], "cache_size": self.cache_size}
+
+    def __setstate__(self, state):
+        self.__init__(state["merges"], state["symbols"], state["cache_size"])
+
+    def _bpe(self, word):
+        """对单个词执行合并，返回词元 id 元组。"""
+        symbols = list(word) + ['</w>']
+        while len(symbols) > 1:
+            # 在当前相邻词元对中找出 rank 最小（最早学到）的一个
+            best, best_rank = None, None
+            for pair in zip(symbols, symbols[1:]):
+                rank = self.ranks.get(pair)
+                if rank is not None and (best_rank is None or rank < best_rank):
+                    best, best_rank = pair, rank
+            if best is None:
+                break
+            first, second = best
+            merged, i = [], 0
+            while i < len(symbols):
+                if i < len(symbols) - 1 and symbols[i] == first and symbols[i+1] == second:
+                    merged.append(first + second)
+                    i += 2
+                else:
+                    merged.append(symbols[i])
+                    i += 1
+            symbols = merged
+        return tuple(self.token_to_id.get(symbol, 0) for symbol in symbols)
+
+    def encode(self, text):
+        """将文本按空白切分成词后逐词编码。"""
+        ids = []
+        for word in text.split():
+            ids.extend(self._encode_word(word))
+        return ids
+
+    def encode_batch(self, texts):
+        return [self.encode(text) for text in texts]
+
+    def decode(self, ids):
+        text = ''.join(self.id_to_token[i] for i in ids)
+        return text.replace('</w>', ' ').strip()
+
+    def decode_batch(self, batch_ids):
+        return [self.decode(ids) for ids in batch_ids]
+
+    def cache_info(self):
+        return self._encode_word.cache_info()
+
+    def encode_file(self, path, processes=None, chunk_lines=10_000):
+        """
+        逐行编码一个大文件，返回每行的词元 id 列表。文件按行流式读取，不会一次性读入内存：
+        每读满 chunk_lines 行就分发一块到进程池中并行编码，同时在途的块数不超过进程数的两倍。
+
+        :param processes: 进程数，None 表示使用 CPU 核数；1 表示在当前进程中逐行编码
+        """
+        results = []
+        with open(path, encoding='utf-8') as f:
+            if processes == 1:
+                for line in f:
+                    results.append(self.encode(line))
+                return results
+
+            processes = processes or os.cpu_count() or 1
+            max_pending = 2 * processes
+            with ProcessPoolExecutor(max_workers=processes, initializer=_init_encoder_worker, initargs=(self,)) as pool:
+                pending = collections.deque()
+                while True:
+                    chunk = list(itertools.islice(f, chunk_lines))
+                    if chunk:
+                        pending.append(pool.submit(_encode_chunk, chunk))
+                    # 按提交顺序取回结果，保持行序；读完文件后取回剩余的全部块
+                    while pending and (len(pending) >= max_pending or not chunk):
+                        results.extend(pending.popleft().result())
+                    if not chunk:
+                        return results
+
+_worker_encoder = None
+
+def _init_encoder_worker(encoder):
+    global _worker_encoder
+    _worker_encoder = encoder # 每个子进程各自持有一份编码器及其缓存
+
+def _encode_chunk(lines):
+    return _worker_encoder.encode_batch(lines)
+
+if __name__ == "__main__":
+    # 准备语料库，每个词末尾加上</w>表示结束，并切分好字符
+    vocab = {'h u g </w>': 1, 'p u g </w>': 1, 'p u n </w>': 1, 'b u n </w>': 1}
+    num_merges = 4 # 设置合并次数
+
+    for i in range(num_merges):
+        pairs = get_stats(vocab)
+        if not pairs:
+            break
+        best = max(pairs, key=pairs.get)
+        vocab = merge_vocab(best, vocab)
+        print(f"第{i+1}次合并: {best} -> {''.join(best)}")
+        print(f"新词表（部分）: {list(vocab.keys())}")
+        print("-" * 20)
 
 """
 >>>
@@ -47,4 +300,4 @@ for i in range(num_merges):
 第4次合并: ('un', '</w>') -> un</w>
 新词表（部分）: ['h ug</w>', 'p ug</w>', 'p un</w>', 'b un</w>']
 --------------------
-"""
\ No newline at end of file
+"""
@@ -0,0 +1,386 @@
+# 数据集批量运行器：从 JSONL 文件中逐行读取问题，以多个线程或 asyncio 任务并发运行 ReActAgent，
+# 每个问题结束后立即把答案与耗时追加到输出文件（JSONL，每行写入后 flush 并 fsync）。
+# 输出文件同时就是检查点：进程崩溃或被中断后以相同的参数重新运行，已有记录的问题会被跳过，只运行剩下的问题。
+# 结束（或被 Ctrl+C 中断）时打印本次运行的吞吐量与延迟统计。
+#
+# 输入: 每行一个 JSON 对象，如 {"id": "q1", "question": "..."}；没有 id 时以行号作为 id
+# 输出: 每个问题一行 {"id", "question", "status", "answer", "error", "latency_s", "steps", "llm_calls", "llm_s",
+#       "ttft_s", "tool_calls", "tools_s", "started_at"}，status 为 answered / unanswered / error
+# 用法: python agent_experiment/BatchRunner.py questions.jsonl results.jsonl [--workers 8] [--mode threads|asyncio]
+#       [--backend openai] [--tools search get_weather] [--max-steps 5] [--retry-errors] [--cassette run.jsonl.gz]
+
+import argparse
+import asyncio
+import contextvars
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from LLMClient import get_llm
+from ReAct_Agent import ReActAgent
+from Cassette import Cassette
+from Tracing import Tracer, emit, enable_tracing, set_event_sink
+from tools.ToolExecutor import ToolExecutor
+
+# 可以注册的工具：名称 -> (模块, 描述)，按需导入，未用到的工具不需要安装其依赖
+TOOLS = {
+    "search": ("tools.Search_by_SerpApi",
+               "一个网页搜索引擎。当你需要回答有關 即時性資訊 或 進行事實驗證時使用此工具，如：獲取當前時間、即時熱點事件等。"),
+    "get_weather": ("tools.GetWeather_from_wttrin", "查询指定城市的实时天气。"),
+    "get_attraction": ("tools.GetAttraction_from_TavilySearch", "根据城市和天气搜索推荐的旅游景点。"),
+}
+
+# --- 每个问题的耗时 ---
+
+class QuestionTimings:
+    """一个问题运行期间所有 LLM 调用与工具调用的次数与耗时，由 TimingTracer 按上下文归集。"""
+    def __init__(self):
+        self.steps = 0
+        self.llm_calls = 0
+        self.llm_errors = 0
+        self.llm_s = 0.0
+        self.ttft_s: List[float] = []
+        self.tool_calls = 0
+        self.tools_s = 0.0
+        self._lock = threading.Lock() # 同一步的多个工具在不同线程中结束
+
+    def add(self, span):
+        with self._lock:
+            if span.name == "agent.step":
+                self.steps += 1
+            elif span.name == "llm.think":
+                self.llm_calls += 1
+                self.llm_s += span.duration
+                if "error" in span.attributes:
+                    self.llm_errors += 1
+                if "ttft_s" in span.attributes:
+                    self.ttft_s.append(span.attributes["ttft_s"])
+            elif span.category == "tool":
+                self.tool_calls += 1
+                self.tools_s += span.duration
+
+    def as_dict(self) -> Dict:
+        return {
+            "steps": self.steps,
+            "llm_calls": self.llm_calls,
+            "llm_s": round(self.llm_s, 4),
+            "ttft_s": round(sum(self.ttft_s) / len(self.ttft_s), 4) if self.ttft_s else None,
+            "tool_calls": self.tool_calls,
+            "tools_s": round(self.tools_s, 4),
+        }
+
+_current_timings: contextvars.ContextVar = contextvars.ContextVar("current_timings", default=None)
+
+class TimingTracer(Tracer):
+    """
+    不保存 span 的 Tracer：span 结束时直接累加到当前问题的 QuestionTimings 上，
+    运行成千上万个问题时内存不会随 span 数量增长。工具线程经由 submitTool / asyncio.to_thread 继承上下文。
+    """
+    def _record(self, span):
+        timings = _current_timings.get()
+        if timings is not None:
+            timings.add(span)
+
+# --- 输入与输出 ---
+
+def read_questions(path, skip_ids: Set[str], id_field: str = "id", question_field: str = "question",
+                   skipped: Set[str] = None) -> Iterator[Tuple[str, str]]:
+    """
+    逐行读取问题，产出 (id, question)；跳过空行、无法解析的行与 skip_ids 中的问题，不会一次性读入整个文件。
+
+    :param skipped: 提供时，记录输入中实际因 skip_ids 被跳过的问题 id
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                item = json.loads(line)
+                question = item[question_field]
+            except (ValueError, KeyError, TypeError) as e:
+                emit("batch.bad_input", f"⚠️ 第 {line_number} 行无法解析，已跳过: {e}", line=line_number)
+                continue
+            question_id = str(item.get(id_field, line_number))
+            if question_id not in skip_ids:
+                yield question_id, question
+            elif skipped is not None:
+                skipped.add(question_id)
+
+class ResultWriter:
+    """
+    只追加的结果文件，线程安全。每条记录写入后立即 flush 并 fsync，崩溃时最多丢失正在写入的那一行。
+    文件以二进制方式打开：崩溃可能把末行截断在一个多字节 UTF-8 字符的中间，
+    重新打开时先截掉最后一个换行之后不完整的部分，读取时逐行解码，无法解码或解析的行被跳过。
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._file = open(self.path, "a+b")
+        self._drop_torn_tail()
+
+    def _drop_torn_tail(self):
+        size = self._file.seek(0, os.SEEK_END)
+        end = size
+        while end > 0: # 从末尾向前按块查找最后一个换行
+            start = max(0, end - 4096)
+            self._file.seek(start)
+            newline = self._file.read(end - start).rfind(b"\n")
+            if newline >= 0:
+                end = start + newline + 1
+                break
+            end = start
+        if end < size:
+            emit("batch.torn_line", f"⚠️ {self.path} 末尾有 {size - end} 字节不完整的记录，已丢弃。", bytes=size - end)
+            self._file.truncate(end)
+
+    def load(self) -> Dict[str, Dict]:
+        """已有的记录，按 id 取最后一条。"""
+        records = {}
+        with open(self.path, "rb") as f:
+            for line in f:
+                try:
+                    record = json.loads(line.decode("utf-8"))
+                except (UnicodeDecodeError, ValueError): # 损坏的行
+                    continue
+                if not (isinstance(record, dict) and "id" in record): # 合法的 JSON 但不是结果记录
+                    continue
+                records[record["id"]] = record
+        return records
+
+    def write(self, record: Dict):
+        line = (json.dumps(record, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+        with self._lock:
+            if self._file.closed: # 中断后仍在运行的守护线程，结果不再写入
+                return
+            self._file.write(line)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+# --- 运行 ---
+
+class BatchRunner:
+    """
+    以 workers 个线程（threads）或 asyncio 任务（asyncio）从同一个问题迭代器中取题，
+    每个问题使用一个新的 ReActAgent（历史记录不能共用），LLM 客户端与工具执行器在所有问题之间共用。
+
+    :param make_agent: 创建 ReActAgent 的函数
+    :param mode: "threads" 调用 ReActAgent.run；"asyncio" 调用 ReActAgent.arun，LLM 客户端需提供 async think
+    """
+    def __init__(self, make_agent: Callable[[], ReActAgent], writer: ResultWriter, workers: int = 4,
+                 mode: str = "threads"):
+        if mode not in ("threads", "asyncio"):
+            raise ValueError(f"未知的运行模式: {mode}")
+        self.make_agent = make_agent
+        self.writer = writer
+        self.workers = workers
+        self.mode = mode
+        self.records: List[Dict] = [] # 本次运行完成的记录
+        self._questions: Iterator = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def _next_question(self) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            if self._stop.is_set():
+                return None
+            return next(self._questions, None)
+
+    def _finish(self, question_id: str, question: str, started_at: float, started: float, timings: QuestionTimings,
+                answer=None, error: Exception = None) -> Dict:
+        if error is not None:
+            status = "error"
+        elif answer is not None:
+            status = "answered"
+        else: # LLM 调用失败时智能体同样返回 None，记为 error 以便 --retry-errors 重新运行
+            status = "error" if timings.llm_errors else "unanswered"
+        record = {
+            "id": question_id,
+            "question": question,
+            "status": status,
+            "answer": answer,
+            "error": f"{type(error).__name__}: {error}" if error is not None
+                     else (f"{timings.llm_errors} 次 LLM 调用失败" if timings.llm_errors else None),
+            "latency_s": round(time.perf_counter() - started, 4),
+            **timings.as_dict(),
+            "started_at": round(started_at, 3),
+        }
+        self.writer.write(record)
+        with self._lock:
+            self.records.append(record)
+        emit("batch.done", f"{'✅' if status == 'answered' else '❌'} [{question_id}] {status} "
+                           f"{record['latency_s']:.2f}s", id=question_id, status=status)
+        return record
+
+    def _run_one(self, question_id: str, question: str):
+        timings = QuestionTimings()
+        token = _current_timings.set(timings)
+        started_at, started = time.time(), time.perf_counter()
+        try:
+            answer = self.make_agent().run(question)
+        except Exception as e:
+            self._finish(question_id, question, started_at, started, timings, error=e)
+        else:
+            self._finish(question_id, question, started_at, started, timings, answer)
+        finally:
+            _current_timings.reset(token)
+
+    async def _arun_one(self, question_id: str, question: str):
+        timings = QuestionTimings()
+        token = _current_timings.set(timings)
+        started_at, started = time.time(), time.perf_counter()
+        try:
+            answer = await self.make_agent().arun(question)
+        except Exception as e:
+            self._finish(question_id, question, started_at, started, timings, error=e)
+        else:
+            self._finish(question_id, question, started_at, started, timings, answer)
+        finally:
+            _current_timings.reset(token)
+
+    def _thread_worker(self):
+        while (item := self._next_question()) is not None:
+            contextvars.copy_context().run(self._run_one, *item)
+
+    async def _task_worker(self):
+        while (item := self._next_question()) is not None:
+            await self._arun_one(*item)
+
+    def run(self, questions: Iterator[Tuple[str, str]]) -> List[Dict]:
+        """
+        运行所有问题，返回本次运行完成的记录。被 Ctrl+C 中断时不再取新的问题，已写入的记录保留在输出文件中。
+        """
+        self._questions = iter(questions)
+        self._stop.clear()
+        if self.mode == "asyncio":
+            async def main():
+                await asyncio.gather(*[self._task_worker() for _ in range(self.workers)])
+            try:
+                asyncio.run(main())
+            except KeyboardInterrupt:
+                self._stop.set()
+                raise
+            return self.records
+
+        # 守护线程：Ctrl+C 时主线程不必等待正在运行的问题结束
+        threads = [threading.Thread(target=self._thread_worker, daemon=True) for _ in range(self.workers)]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(0.5)
+        except KeyboardInterrupt:
+            self._stop.set()
+            raise
+        return self.records
+
+# --- 统计 ---
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+def print_summary(records: List[Dict], wall_s: float, skipped: int):
+    statuses = {}
+    for record in records:
+        statuses[record["status"]] = statuses.get(record["status"], 0) + 1
+    latencies = [record["latency_s"] for record in records]
+    steps = sum(record["steps"] for record in records)
+    print(f"\n--- 批量运行统计 ---")
+    print(f"完成 {len(records)} 个问题（{', '.join(f'{k} {v}' for k, v in sorted(statuses.items())) or '无'}），"
+          f"跳过输出文件中已有的 {skipped} 个，耗时 {wall_s:.1f}s")
+    if not records:
+        return
+    print(f"吞吐量: {len(records) / wall_s:.2f} 问题/s, {steps / wall_s:.2f} 步/s")
+    print(f"延迟: 平均 {sum(latencies) / len(latencies):.2f}s, p50 {percentile(latencies, 0.5):.2f}s, "
+          f"p90 {percentile(latencies, 0.9):.2f}s, p99 {percentile(latencies, 0.99):.2f}s, 最大 {max(latencies):.2f}s")
+    llm_s = sum(record["llm_s"] for record in records)
+    tools_s = sum(record["tools_s"] for record in records)
+    ttfts = [record["ttft_s"] for record in records if record["ttft_s"] is not None]
+    print(f"每个问题: 平均 {steps / len(records):.1f} 步, LLM {llm_s / len(records):.2f}s, 工具 {tools_s / len(records):.2f}s"
+          + (f", 首 Token 延迟 p50 {percentile(ttfts, 0.5):.2f}s" if ttfts else ""))
+
+# --- 命令行 ---
+
+def build_tools(names: List[str], cassette: Cassette = None) -> ToolExecutor:
+    executor = ToolExecutor(cassette=cassette)
+    for name in names:
+        module_name, description = TOOLS[name]
+        executor.registerTool(getattr(importlib.import_module(module_name), name), description)
+    return executor
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="从 JSONL 文件批量运行 ReActAgent，可中断后续跑")
+    parser.add_argument("input", help="问题文件（JSONL）")
+    parser.add_argument("output", help="结果文件（JSONL，只追加），同时作为检查点")
+    parser.add_argument("--workers", type=int, default=4, help="并发运行的问题数")
+    parser.add_argument("--mode", choices=["threads", "asyncio"], default="threads")
+    parser.add_argument("--backend", help="LLM 后端，默认读取 LLM_BACKEND；asyncio 模式下固定为 openai-async")
+    parser.add_argument("--tools", nargs="+", choices=list(TOOLS), default=["search"])
+    parser.add_argument("--max-steps", type=int, default=5)
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--question-field", default="question")
+    parser.add_argument("--retry-errors", action="store_true", help="重新运行输出文件中状态为 error 的问题")
+    parser.add_argument("--cassette", help="cassette 文件；配合 --record 录制，否则回放")
+    parser.add_argument("--record", action="store_true", help="把本次运行的 LLM 与工具流量录制到 --cassette")
+    parser.add_argument("--replay-speed", type=float, default=0, help="回放速度倍率，0 表示尽快回放")
+    parser.add_argument("--verbose", action="store_true", help="打印每个智能体的运行过程（并发时各问题的输出会交错）")
+    args = parser.parse_args()
+
+    # 默认只打印每个问题的完成情况
+    if not args.verbose:
+        set_event_sink(lambda event, message, end, fields:
+                       print(message, flush=True) if event.startswith("batch.") else None)
+
+    cassette = None
+    if args.cassette:
+        cassette = Cassette(args.cassette, mode="record" if args.record else "replay", speed=args.replay_speed)
+
+    backend = "openai-async" if args.mode == "asyncio" else args.backend or os.getenv("LLM_BACKEND", "openai")
+    if backend == "local" and args.workers > 1:
+        # 同一个本地模型不能被多个线程同时调用；并发评测请用 LocalLLMServer 启动服务，以 openai 后端连接
+        print("⚠️ local 后端不支持并发调用，workers 改为 1；并发评测请使用 LocalLLMServer 与 openai 后端。")
+        args.workers = 1
+    llm_options = {} if backend == "local" else {"cassette": cassette}
+    if backend == "openai-async":
+        llm_options["max_connections"] = args.workers # 每个并发的问题一条连接
+    llm = get_llm(backend, **llm_options)
+    tools = build_tools(args.tools, cassette)
+
+    writer = ResultWriter(args.output)
+    existing = writer.load()
+    done_ids = {question_id for question_id, record in existing.items()
+                if not (args.retry_errors and record.get("status") == "error")}
+    if done_ids:
+        print(f"📌 从检查点恢复: {args.output} 中已有 {len(done_ids)} 个问题，将被跳过。")
+
+    enable_tracing(TimingTracer())
+    runner = BatchRunner(lambda: ReActAgent(llm, tools, max_steps=args.max_steps), writer, args.workers, args.mode)
+    start = time.perf_counter()
+    interrupted = False
+    skipped: Set[str] = set() # 输入中实际被跳过的问题，输出文件中可能还有输入里已不存在的记录
+    try:
+        runner.run(read_questions(args.input, done_ids, args.id_field, args.question_field, skipped))
+    except KeyboardInterrupt:
+        interrupted = True
+    finally:
+        wall_s = time.perf_counter() - start
+        writer.close()
+        tools.shutdown()
+        if cassette is not None:
+            cassette.close()
+
+    print_summary(list(runner.records), wall_s, len(skipped))
+    if interrupted:
+        print(f"⚠️ 运行被中断，以相同的参数重新运行即可从 {args.output} 继续。")
+        sys.exit(130)
@@ -0,0 +1,260 @@
+import asyncio
+import functools
+import gzip
+import hashlib
+import inspect
+import json
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Tuple
+
+try:
+    from .tools.ToolCache import ErrorResult
+except ImportError: # 在 agent_experiment 目录下直接导入时
+    from tools.ToolCache import ErrorResult
+
+class CassetteMiss(KeyError):
+    """回放时找不到与请求对应的录制记录。"""
+
+class RecordedToolError(Exception):
+    """回放录制时抛出过异常的工具调用，消息与原异常相同。"""
+
+class Cassette:
+    """
+    LLM 与工具流量的录制/回放层。
+
+    录制模式下，HelloAgentsLLM 的每次流式调用（每个片段及其到达的时间间隔）与每次工具调用（参数、结果与耗时）
+    都按请求内容计算键，逐条追加到 cassette 文件中（JSONL，路径以 .gz 结尾时使用 gzip 压缩）；
+    回放模式下按同样的键取出记录返回，不再访问任何服务，整次 ReActAgent 运行因此可以确定地重现。
+
+    同一个键有多条记录时（如同一个问题录制了多次）依次轮流使用。
+
+    :param path: cassette 文件路径；录制时追加到已有文件之后
+    :param mode: "record" 录制真实流量，"replay" 回放
+    :param speed: 回放速度的倍率，1.0 按录制时的节奏（首 Token 延迟、片段间隔、工具耗时），
+        2.0 为两倍速，0 表示不等待、尽快回放
+    """
+    VERSION = 1
+
+    def __init__(self, path, mode: str = "replay", speed: float = 1.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"未知的 cassette 模式: {mode}")
+        self.path = Path(path)
+        self.mode = mode
+        self.speed = speed
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[str, str], List[Dict]] = {}
+        self._cursors: Dict[Tuple[str, str], int] = {}
+        self.stats = {"recorded": 0, "replayed": 0, "misses": 0}
+        self._file = None
+        if mode == "record":
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            opener = gzip.open if self.path.suffix == ".gz" else open
+            self._file = opener(self.path, "at", encoding="utf-8")
+            self._write({"kind": "meta", "version": self.VERSION, "created": time.time()})
+        else:
+            self._load()
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self):
+        opener = gzip.open if self.path.suffix == ".gz" else open
+        with opener(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if entry["kind"] == "meta":
+                    continue
+                self._entries.setdefault((entry["kind"], entry["key"]), []).append(entry)
+
+    def _write(self, entry: Dict):
+        line = json.dumps(entry, ensure_ascii=False, separators=(",", ":"), default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+            if entry["kind"] != "meta":
+                self.stats["recorded"] += 1
+
+    def _next(self, kind: str, key: str) -> Dict:
+        with self._lock:
+            entries = self._entries.get((kind, key))
+            if not entries:
+                self.stats["misses"] += 1
+                raise CassetteMiss(f"cassette {self.path} 中没有对应的{'LLM 调用' if kind == 'llm' else '工具调用'}记录 ({key[:12]})")
+            cursor = self._cursors.get((kind, key), 0)
+            self._cursors[(kind, key)] = cursor + 1
+            self.stats["replayed"] += 1
+            return entries[cursor % len(entries)]
+
+    def _delay(self, seconds: float) -> float:
+        return seconds / self.speed if self.speed else 0.0
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- LLM ---
+
+    @staticmethod
+    def llm_key(messages: List[Dict[str, str]], **params) -> str:
+        """
+        LLM 调用的键：messages 与所有影响输出的参数。不含模型ID，回放时无需与录制时使用相同的配置。
+        """
+        payload = json.dumps({"messages": messages, "params": params}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def record_stream(self, key: str, contents, started: float, **meta):
+        """
+        包装片段迭代器，原样产出的同时记录每个片段距上一个片段（首个片段距 started）的时间间隔。
+        流结束或被提前关闭时写入一条记录，出错的流不记录。
+
+        :param started: 发起请求的时刻（time.perf_counter()），首个间隔即首 Token 延迟
+        """
+        chunks, last, complete = [], started, False
+        try:
+            for content in contents:
+                now = time.perf_counter()
+                chunks.append([round(now - last, 4), content])
+                last = now
+                yield content
+            complete = True
+        except Exception:
+            chunks = None
+            raise
+        finally:
+            if chunks is not None:
+                self._write({"kind": "llm", "key": key, **meta, "complete": complete, "chunks": chunks})
+
+    async def arecord_stream(self, key: str, contents, started: float, **meta):
+        """record_stream 的异步版本。"""
+        chunks, last, complete = [], started, False
+        try:
+            async for content in contents:
+                now = time.perf_counter()
+                chunks.append([round(now - last, 4), content])
+                last = now
+                yield content
+            complete = True
+        except Exception:
+            chunks = None
+            raise
+        finally:
+            if chunks is not None:
+                self._write({"kind": "llm", "key": key, **meta, "complete": complete, "chunks": chunks})
+
+    def replay_stream(self, key: str):
+        """按录制的间隔（乘以速度倍率）逐段产出；没有记录时立即抛出 CassetteMiss。"""
+        chunks = self._next("llm", key)["chunks"]
+
+        def play():
+            for delay, content in chunks:
+                if self._delay(delay):
+                    time.sleep(self._delay(delay))
+                yield content
+        return play()
+
+    def areplay_stream(self, key: str):
+        """replay_stream 的异步版本。"""
+        chunks = self._next("llm", key)["chunks"]
+
+        async def play():
+            for delay, content in chunks:
+                await asyncio.sleep(self._delay(delay))
+                yield content
+        return play()
+
+    # --- 工具 ---
+
+    @staticmethod
+    def tool_key(name: str, arguments: Dict) -> str:
+        """工具调用的键：工具名与参数名 -> 值（与 ToolResultCache 一样先绑定到函数签名）。"""
+        payload = json.dumps({"tool": name, "arguments": arguments}, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def wrap_tool(self, func: Callable) -> Callable:
+        """
+        包装工具函数：录制模式下记录每次调用的参数、结果（或异常）与耗时，回放模式下直接返回录制的结果（或抛出同样消息的异常）。
+        包装后的函数保留原函数的名称与签名（ToolExecutor 按名称注册，参数检查依赖签名），协程函数包装后仍是协程函数。
+        """
+        name = func.__name__
+        signature = inspect.signature(func)
+
+        def make_key(args, kwargs):
+            # 绑定到签名后 search("x") 与 search(query="x") 得到同一个键
+            try:
+                bound = signature.bind(*args, **kwargs)
+            except TypeError: # 参数与签名不匹配，照常调用，由原函数抛出同样的异常
+                return self.tool_key(name, {"args": args, "kwargs": kwargs})
+            bound.apply_defaults()
+            return self.tool_key(name, bound.arguments)
+
+        def record(key, args, kwargs, started, result=None, error: Exception = None):
+            entry = {"kind": "tool", "key": key, "tool": name, "args": args, "kwargs": kwargs,
+                     "latency": round(time.perf_counter() - started, 4)}
+            if error is not None:
+                entry["error"] = str(error)
+            else:
+                entry["result"] = result
+                if isinstance(result, ErrorResult): # 回放时还原，使结果缓存同样不缓存它
+                    entry["error_result"] = True
+            self._write(entry)
+
+        def replayed(entry):
+            if "error" in entry:
+                raise RecordedToolError(entry["error"])
+            return ErrorResult(entry["result"]) if entry.get("error_result") else entry["result"]
+
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = make_key(args, kwargs)
+                if self.replaying:
+                    entry = self._next("tool", key)
+                    await asyncio.sleep(self._delay(entry["latency"]))
+                    return replayed(entry)
+                started = time.perf_counter()
+                try:
+                    result = await func(*args, **kwargs)
+                except Exception as e:
+                    record(key, args, kwargs, started, error=e)
+                    raise
+                record(key, args, kwargs, started, result)
+                return result
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = make_key(args, kwargs)
+            if self.replaying:
+                entry = self._next("tool", key)
+                if self._delay(entry["latency"]):
+                    time.sleep(self._delay(entry["latency"]))
+                return replayed(entry)
+            started = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                record(key, args, kwargs, started, error=e)
+                raise
+            record(key, args, kwargs, started, result)
+            return result
+        return wrapper
+
+    def report(self) -> Dict:
+        """录制/回放的条目数，以及文件中各类记录的数量。"""
+        with self._lock:
+            report = dict(self.stats)
+            report["llm_entries"] = sum(len(entries) for (kind, _), entries in self._entries.items() if kind == "llm")
+            report["tool_entries"] = sum(len(entries) for (kind, _), entries in self._entries.items() if kind == "tool")
+        return report
@@ -0,0 +1,202 @@
+import threading
+import time
+from typing import Dict, List, Optional, Union
+
+try:
+    from .Tracing import emit
+except ImportError: # 在 agent_experiment 目录下直接导入时
+    from Tracing import emit
+
+class Endpoint:
+    """
+    一个兼容 OpenAI 接口的服务端点及其运行统计。
+
+    :param model: 该端点使用的模型ID，None 表示使用客户端的默认模型
+    :param api_key: 该端点的API密钥，None 表示使用客户端的默认密钥
+    :param name: 统计中显示的名称，默认为 base_url
+    """
+    def __init__(self, base_url: str, model: str = None, api_key: str = None, name: str = None):
+        self.base_url = base_url
+        self.model = model
+        self.api_key = api_key
+        self.name = name or base_url
+        self.ewma_ttft: Optional[float] = None # 首 Token 延迟的指数移动平均（秒），尚无样本时为 None
+        self.in_flight = 0
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.ejections = 0
+        self.ejected_until = 0.0
+        self.last_used = 0.0
+
+class EndpointLease:
+    """
+    一次请求对端点的占用：记录首 Token 延迟与失败，结束时归还（可重复调用 release）。
+    """
+    def __init__(self, pool: "EndpointPool", endpoint: Endpoint):
+        self.pool = pool
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self._released = False
+        self._first_seen = False
+
+    def release(self):
+        if not self._released:
+            self._released = True
+            self.pool._release(self.endpoint)
+
+    def fail(self, error: Exception):
+        """请求失败：记录失败并归还端点。"""
+        if not self._first_seen:
+            self.pool._record_failure(self.endpoint, error)
+        self.release()
+
+    def _on_content(self, content: str):
+        if content and not self._first_seen:
+            self._first_seen = True
+            self.pool._record_ttft(self.endpoint, time.perf_counter() - self.started)
+
+    def track(self, contents):
+        """包装片段迭代器：收到首个非空片段时记录延迟，迭代出错时记录失败，结束时归还端点。"""
+        try:
+            for content in contents:
+                self._on_content(content)
+                yield content
+        except Exception as e:
+            self.fail(e)
+            raise
+        finally:
+            self.release()
+
+    async def atrack(self, contents):
+        """track 的异步版本。"""
+        try:
+            async for content in contents:
+                self._on_content(content)
+                yield content
+        except Exception as e:
+            self.fail(e)
+            raise
+        finally:
+            self.release()
+
+class PooledResponse:
+    """经由端点池的流式响应，关闭时同时归还端点。"""
+    def __init__(self, response, lease: EndpointLease):
+        self.response = response
+        self.lease = lease
+
+    def close(self):
+        try:
+            self.response.close()
+        finally:
+            self.lease.release()
+
+class AsyncPooledResponse(PooledResponse):
+    async def close(self):
+        try:
+            await self.response.close()
+        finally:
+            self.lease.release()
+
+class EndpointPool:
+    """
+    多个等价端点（如同一模型的多个副本）组成的池，每次请求按 首 Token 延迟的移动平均 × (在途请求数 + 1)
+    选择预计等待最短的端点；连续失败的端点被暂时剔除，冷却期过后重新参与选择。
+    长时间未被选中的端点会被优先选中一次，以刷新它的延迟估计。线程安全，可被同步与异步客户端共用。
+
+    :param endpoints: Endpoint、Endpoint 的参数字典或 base_url 字符串组成的列表
+    :param ewma_alpha: 移动平均中新样本的权重
+    :param failure_threshold: 连续失败多少次后剔除
+    :param cooldown: 剔除的时长（秒）
+    :param probe_interval: 超过该时长（秒）未被使用的空闲端点会被优先选中一次
+    """
+    def __init__(self, endpoints: List[Union[Endpoint, Dict, str]], ewma_alpha: float = 0.3,
+                 failure_threshold: int = 3, cooldown: float = 30.0, probe_interval: float = 30.0):
+        if not endpoints:
+            raise ValueError("端点池至少需要一个端点。")
+        self.endpoints: List[Endpoint] = [self._as_endpoint(endpoint) for endpoint in endpoints]
+        names = [endpoint.name for endpoint in self.endpoints]
+        if len(set(names)) != len(names):
+            raise ValueError("端点池中的端点名称不能重复。")
+        self.ewma_alpha = ewma_alpha
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.probe_interval = probe_interval
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _as_endpoint(endpoint: Union[Endpoint, Dict, str]) -> Endpoint:
+        if isinstance(endpoint, Endpoint):
+            return endpoint
+        if isinstance(endpoint, dict):
+            return Endpoint(**endpoint)
+        return Endpoint(endpoint)
+
+    def _expected_wait(self, endpoint: Endpoint, default_ttft: float) -> tuple:
+        ttft = endpoint.ewma_ttft if endpoint.ewma_ttft is not None else default_ttft
+        return ttft * (endpoint.in_flight + 1), endpoint.in_flight
+
+    def _select(self, now: float) -> Endpoint:
+        available = [endpoint for endpoint in self.endpoints if endpoint.ejected_until <= now]
+        if not available:
+            # 全部被剔除时不直接失败，选冷却最先结束的那个
+            return min(self.endpoints, key=lambda endpoint: endpoint.ejected_until)
+        for endpoint in available:
+            if endpoint.in_flight == 0 and endpoint.last_used and now - endpoint.last_used > self.probe_interval:
+                return endpoint
+        # 尚无样本的端点按已知的最小延迟估计，使其能尽快被试用
+        known = [endpoint.ewma_ttft for endpoint in available if endpoint.ewma_ttft is not None]
+        default_ttft = min(known, default=0.0)
+        return min(available, key=lambda endpoint: self._expected_wait(endpoint, default_ttft))
+
+    def acquire(self) -> EndpointLease:
+        """为一次请求选择端点并占用它。"""
+        with self._lock:
+            now = time.monotonic()
+            endpoint = self._select(now)
+            endpoint.in_flight += 1
+            endpoint.requests += 1
+            endpoint.last_used = now
+        return EndpointLease(self, endpoint)
+
+    def _release(self, endpoint: Endpoint):
+        with self._lock:
+            endpoint.in_flight -= 1
+
+    def _record_ttft(self, endpoint: Endpoint, seconds: float):
+        with self._lock:
+            if endpoint.ewma_ttft is None:
+                endpoint.ewma_ttft = seconds
+            else:
+                endpoint.ewma_ttft += self.ewma_alpha * (seconds - endpoint.ewma_ttft)
+            endpoint.consecutive_failures = 0
+
+    def _record_failure(self, endpoint: Endpoint, error: Exception):
+        with self._lock:
+            endpoint.failures += 1
+            endpoint.consecutive_failures += 1
+            if endpoint.consecutive_failures < self.failure_threshold:
+                return
+            endpoint.ejections += 1
+            endpoint.ejected_until = time.monotonic() + self.cooldown
+        emit("llm.endpoint_ejected",
+             f"🚫 端点 {endpoint.name} 连续失败 {endpoint.consecutive_failures} 次，暂停使用 {self.cooldown:.0f} 秒 ({error})",
+             endpoint=endpoint.name, error=str(error))
+
+    def stats(self) -> Dict[str, Dict]:
+        """每个端点的运行统计。"""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                endpoint.name: {
+                    "model": endpoint.model,
+                    "ewma_ttft_ms": None if endpoint.ewma_ttft is None else endpoint.ewma_ttft * 1000,
+                    "in_flight": endpoint.in_flight,
+                    "requests": endpoint.requests,
+                    "failures": endpoint.failures,
+                    "ejections": endpoint.ejections,
+                    "cooldown_remaining": max(0.0, endpoint.ejected_until - now),
+                }
+                for endpoint in self.endpoints
+            }
@@ -0,0 +1,226 @@
+from typing import Callable, Dict, List, Optional
+
+try:
+    from .Tracing import emit, span
+except ImportError: # 在 agent_experiment 目录下直接导入时
+    from Tracing import emit, span
+
+# 压缩较早步骤时使用的摘要提示词
+SUMMARY_PROMPT_TEMPLATE = """
+以下是智能体之前若干步的工具调用记录（Action 与 Observation）。
+请用简短的几句话总结其中对回答问题有用的事实，保留具体的数字、名称与结论，不要添加记录中没有的内容。
+
+{history}
+
+摘要:
+"""
+
+def estimate_tokens(text: str) -> int:
+    """
+    没有分词器时的粗略估算：中日韩字符按 1 个 Token 计，其余字符按 4 个字符 1 个 Token 计。
+    """
+    cjk = sum(1 for char in text if "⺀" <= char <= "鿿" or "가" <= char <= "힯")
+    return cjk + (len(text) - cjk + 3) // 4
+
+def llm_summarizer(llm_client, max_new_tokens: int = 256) -> Callable[[str], Optional[str]]:
+    """
+    用同步的 LLM 客户端构造摘要函数，每次压缩只调用一次。
+    可以传入比智能体主模型更便宜的客户端。
+    """
+    def summarize(history_text: str) -> Optional[str]:
+        return llm_client.think(
+            messages=[{"role": "user", "content": SUMMARY_PROMPT_TEMPLATE.format(history=history_text)}],
+            max_new_tokens=max_new_tokens
+        )
+    return summarize
+
+class HistoryStep:
+    """
+    一次工具调用的记录。observation 为原文，rendered_observation 为压缩后放入提示词的内容。
+    tokens / rendered_tokens 为两者对应的两行文本的 Token 数，由 HistoryManager 在添加或截断时计算并缓存。
+    """
+    def __init__(self, action: str, observation: str):
+        self.action = action
+        self.observation = observation
+        self.rendered_observation = observation
+        self.truncated = False
+        self.observation_tokens = 0
+        self.tokens = 0
+        self.rendered_tokens = 0
+
+    def lines(self, rendered: bool = True) -> List[str]:
+        observation = self.rendered_observation if rendered else self.observation
+        return [f"Action: {self.action}", f"Observation: {observation}"]
+
+class HistoryManager:
+    """
+    按 Token 预算管理 ReActAgent 的历史记录。
+    最近 keep_recent_steps 步尽量保持原文；超出预算时依次：
+      1. 从最早的步骤开始截断较早步骤的 Observation；
+      2. 若提供了 summarizer，把较早的步骤合并为一段摘要（一次调用）；
+      3. 最近的步骤本身就超出预算时，同样从最早的开始截断；
+      4. 仍然超出时丢弃最早的步骤，最后一步始终保留。
+    压缩结果会保留下来，后续步骤不会重复压缩，也让提示词前缀尽量保持不变。
+
+    :param token_budget: 整个提示词的 Token 预算（包括模板、工具描述与问题），为 None 时不做任何压缩
+    :param tokenizer: 用于计数的分词器（如 HelloAgentsLLM_Local.tokenizer），未提供时使用 estimate_tokens 估算
+    :param observation_tokens: 截断后每个 Observation 保留的 Token 数
+    :param summarizer: 将一段历史文本压缩为摘要的函数，返回 None 表示失败
+    """
+    def __init__(self, token_budget: int = None, tokenizer=None, keep_recent_steps: int = 2,
+                 observation_tokens: int = 64, summarizer: Callable[[str], Optional[str]] = None):
+        self.token_budget = token_budget
+        self.tokenizer = tokenizer
+        self.keep_recent_steps = keep_recent_steps
+        self.observation_tokens = observation_tokens
+        self.summarizer = summarizer
+        self.reset()
+
+    def reset(self):
+        """开始新的一次运行时调用，清空历史与统计。"""
+        self.all_steps: List[HistoryStep] = [] # 全部步骤，用于统计节省的 Token
+        self.steps: List[HistoryStep] = []     # 仍以原文或截断形式出现在提示词中的步骤
+        self.summary: Optional[str] = None
+        self.dropped_steps = 0
+        self.full_tokens = 0 # all_steps 原文的 Token 数之和
+        self._header_tokens = ([], 0) # 省略说明与摘要两行及其 Token 数
+        self.stats = {"renders": 0, "full_tokens": 0, "rendered_tokens": 0, "truncations": 0, "summaries": 0}
+
+    def count_tokens(self, text: str) -> int:
+        if not text:
+            return 0
+        if self.tokenizer is None:
+            return estimate_tokens(text)
+        return len(self.tokenizer.encode(text, add_special_tokens=False))
+
+    def add(self, action: str, observation: str):
+        step = HistoryStep(action, str(observation))
+        step.observation_tokens = self.count_tokens(step.observation)
+        step.tokens = step.rendered_tokens = self.count_tokens(f"Action: {step.action}\nObservation: ") + step.observation_tokens
+        self.full_tokens += step.tokens
+        self.all_steps.append(step)
+        self.steps.append(step)
+
+    @property
+    def lines(self) -> List[str]:
+        """所有步骤的原文，与压缩无关。"""
+        return [line for step in self.all_steps for line in step.lines(rendered=False)]
+
+    def load_lines(self, lines: List[str]):
+        """
+        清空历史后按 lines 的原文重建，lines 的格式与 self.lines 相同（"Action: ..." 与 "Observation: ..." 交替）。
+        """
+        if len(lines) % 2:
+            raise ValueError("历史记录应由成对的 Action 与 Observation 行组成。")
+        steps = []
+        for action_line, observation_line in zip(lines[::2], lines[1::2]):
+            if not (action_line.startswith("Action: ") and observation_line.startswith("Observation: ")):
+                raise ValueError(f"无法解析的历史记录: {action_line!r}, {observation_line!r}")
+            steps.append((action_line[len("Action: "):], observation_line[len("Observation: "):]))
+        self.reset()
+        for action, observation in steps:
+            self.add(action, observation)
+
+    def _rendered_lines(self) -> List[str]:
+        lines = []
+        if self.dropped_steps:
+            lines.append(f"（更早的 {self.dropped_steps} 个步骤已省略）")
+        if self.summary:
+            lines.append(f"Summary: {self.summary}")
+        for step in self.steps:
+            lines.extend(step.lines())
+        return lines
+
+    def _rendered_token_count(self) -> int:
+        """
+        由各步骤缓存的 Token 数求和得到的历史文本 Token 数，不重新分词。
+        分隔的换行按 1 个 Token 计，因此与对整段文本分词的结果可能略有出入。
+        """
+        header = [f"（更早的 {self.dropped_steps} 个步骤已省略）"] if self.dropped_steps else []
+        if self.summary:
+            header.append(f"Summary: {self.summary}")
+        if self._header_tokens[0] != header:
+            self._header_tokens = (header, sum(self.count_tokens(line) for line in header))
+        parts = len(header) + 2 * len(self.steps)
+        return self._header_tokens[1] + sum(step.rendered_tokens for step in self.steps) + max(0, parts - 1 - len(self.steps))
+
+    def _truncate(self, text: str, max_tokens: int) -> str:
+        """不超过 max_tokens 的最长前缀。有分词器时直接截取 Token，否则二分查找。"""
+        if self.tokenizer is not None:
+            ids = self.tokenizer.encode(text, add_special_tokens=False)
+            # 截断处可能落在多字节字符中间，去掉解码出的替换字符
+            return self.tokenizer.decode(ids[:max_tokens]).rstrip("\ufffd")
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.count_tokens(text[:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        return text[:low]
+
+    def _truncate_steps(self, steps: List[HistoryStep], over_budget: Callable[[], bool]):
+        for step in steps:
+            if not over_budget():
+                return
+            if step.truncated or step.observation_tokens <= self.observation_tokens:
+                continue
+            kept = self._truncate(step.observation, self.observation_tokens)
+            step.rendered_observation = f"{kept}…（已截断，原文 {step.observation_tokens} 个 Token）"
+            step.rendered_tokens = self.count_tokens("\n".join(step.lines()))
+            step.truncated = True
+            self.stats["truncations"] += 1
+
+    def _compact(self, budget: int):
+        older = self.steps[:max(0, len(self.steps) - self.keep_recent_steps)]
+        over_budget = lambda: self._rendered_token_count() > budget
+
+        # 1. 从最早的步骤开始截断 Observation
+        self._truncate_steps(older, over_budget)
+
+        # 2. 把较早的步骤合并为一段摘要
+        if older and self.summarizer and over_budget():
+            history_text = "\n".join(([f"Summary: {self.summary}"] if self.summary else []) +
+                                     [line for step in older for line in step.lines(rendered=False)])
+            summary = self.summarizer(history_text)
+            if summary:
+                self.summary = summary.strip()
+                self.steps = self.steps[len(older):]
+                self.stats["summaries"] += 1
+                emit("history.summarize", f"🧹 已将 {len(older)} 个较早的步骤压缩为摘要", steps=len(older))
+
+        # 3. 截断最近的步骤
+        self._truncate_steps(self.steps, over_budget)
+
+        # 4. 丢弃最早的步骤，至少保留最后一步
+        while len(self.steps) > 1 and over_budget():
+            self.steps.pop(0)
+            self.dropped_steps += 1
+
+    def render(self, reserved_tokens: int = 0) -> str:
+        """
+        生成放入提示词的历史文本。
+
+        :param reserved_tokens: 提示词中历史以外部分的 Token 数，历史只能使用剩余的预算
+        """
+        with span("history.render", steps=len(self.all_steps)):
+            budget = None if self.token_budget is None else self.token_budget - reserved_tokens
+            # 先用缓存的 Token 数判断，未超出预算时不进入压缩，也不记录 history.compact
+            if budget is not None and self.steps and self._rendered_token_count() > max(0, budget):
+                with span("history.compact", budget=budget):
+                    self._compact(max(0, budget))
+            history = "\n".join(self._rendered_lines())
+
+            self.stats["renders"] += 1
+            if budget is not None:
+                self.stats["full_tokens"] += self.full_tokens + max(0, len(self.all_steps) - 1) # 步骤之间的换行
+                self.stats["rendered_tokens"] += self._rendered_token_count()
+            return history
+
+    @property
+    def tokens_saved(self) -> int:
+        """本次运行中，与每次都放入全部原文相比，所有调用累计少送入的 Token 数。"""
+        return self.stats["full_tokens"] - self.stats["rendered_tokens"]
+
+    def report(self) -> Dict[str, int]:
+        return {**self.stats, "tokens_saved": self.tokens_saved}
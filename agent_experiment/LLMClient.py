@@ -1,114 +1,576 @@
 import os
-from openai import OpenAI
+import asyncio
+import re
+import time
+import itertools
+import importlib
 from dotenv import load_dotenv
 from typing import List, Dict
 
+try:
+    from .ResponseCache import ResponseCache
+    from .RequestPolicy import RequestPolicy
+    from .EndpointPool import EndpointPool, PooledResponse, AsyncPooledResponse
+    from .Tracing import emit, start_span
+    from .Cassette import Cassette
+except ImportError: # 在 agent_experiment 目录下直接导入时
+    from ResponseCache import ResponseCache
+    from RequestPolicy import RequestPolicy
+    from EndpointPool import EndpointPool, PooledResponse, AsyncPooledResponse
+    from Tracing import emit, start_span
+    from Cassette import Cassette
+
 # 加载 .env 文件中的环境变量
 load_dotenv()
 
+# 一行完整的 Action（以换行结尾），ReActAgent 只需要第一组 Thought/Action
+ACTION_LINE_PATTERN = re.compile(r"Action: [^\n]*\n")
+
+class StopMatcher:
+    """
+    增量检测生成文本中的停止序列。
+    每次只在新增文本附近查找，命中后 output 为截断到停止位置的文本（不含停止序列本身）。
+    """
+    def __init__(self, stop_sequences: List[str] = None, stop_on_action: bool = False):
+        self.stop_sequences = [stop for stop in (stop_sequences or []) if stop]
+        self.stop_on_action = stop_on_action
+        self._max_stop_len = max((len(stop) for stop in self.stop_sequences), default=0)
+        self.text = ""
+        self.stop_index = -1
+
+    @property
+    def stopped(self) -> bool:
+        return self.stop_index >= 0
+
+    @property
+    def output(self) -> str:
+        return self.text[:self.stop_index] if self.stopped else self.text
+
+    @property
+    def settled_output(self) -> str:
+        """
+        不会再被后续停止序列截断的部分，用于流式打印时避免输出停止序列的前半段。
+        """
+        if self.stopped or not self._max_stop_len:
+            return self.output
+        return self.text[:max(0, len(self.text) - self._max_stop_len + 1)]
+
+    def feed(self, new_text: str) -> bool:
+        """
+        追加一段新生成的文本，返回是否已命中停止条件。
+        """
+        if self.stopped or not new_text:
+            return self.stopped
+        old_len = len(self.text)
+        self.text += new_text
+
+        candidates = []
+        # 停止序列可能横跨新旧文本的边界
+        search_from = max(0, old_len - self._max_stop_len + 1)
+        for stop in self.stop_sequences:
+            index = self.text.find(stop, search_from)
+            if index >= 0:
+                candidates.append(index)
+        if self.stop_on_action:
+            # 从旧文本最后一行的行首开始找，Action 行可能在之前的片段中就已开始
+            line_start = self.text.rfind("\n", 0, old_len) + 1
+            match = ACTION_LINE_PATTERN.search(self.text, line_start)
+            if match:
+                candidates.append(match.end() - 1) # 保留 Action 行，去掉行尾换行
+
+        if candidates:
+            self.stop_index = min(candidates)
+        return self.stopped
+
+def _read_usage(chunk, usage: Dict):
+    if usage is not None and getattr(chunk, "usage", None):
+        usage["prompt_tokens"] = chunk.usage.prompt_tokens
+        usage["completion_tokens"] = chunk.usage.completion_tokens
+
+def _stream_contents(response, usage: Dict = None):
+    """
+    从 OpenAI 流式响应中逐个取出文本片段。
+
+    :param usage: 提供时，流末尾若带有 Token 用量，写入其中的 prompt_tokens / completion_tokens
+    """
+    for chunk in response:
+        _read_usage(chunk, usage)
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
+async def _astream_contents(response, usage: Dict = None):
+    """_stream_contents 的异步版本。"""
+    async for chunk in response:
+        _read_usage(chunk, usage)
+        if chunk.choices:
+            yield chunk.choices[0].delta.content or ""
+
+async def _replay_contents(chunks: List[str]):
+    """以异步迭代的方式回放缓存中的文本片段。"""
+    for content in chunks:
+        yield content
+
+async def _aprepend(first: str, contents):
+    """在异步片段迭代器前补上已经取出的首个片段。"""
+    yield first
+    async for content in contents:
+        yield content
+
+def truncate_at_stop(text: str, stop_sequences: List[str] = None, stop_on_action: bool = False) -> str:
+    """
+    将完整文本截断到第一个停止位置。
+    """
+    matcher = StopMatcher(stop_sequences, stop_on_action)
+    matcher.feed(text)
+    return matcher.output
+
+class _ThinkCall:
+    """
+    一次 think_stream 调用的状态，以及同步与异步版本共用的步骤：计算缓存键、选择响应来源（缓存/回放/请求）、
+    按停止序列逐段截取输出，以及把耗时与用量记录到 span 中。两个版本只在取片段与 I/O 的方式上不同。
+    """
+    def __init__(self, llm: "HelloAgentsLLM", messages: List[Dict[str, str]], temperature: float,
+                 stop: List[str], max_new_tokens: int, stop_on_action: bool, backend: str):
+        self.llm = llm
+        self.messages = messages
+        self.temperature = temperature
+        stop, self.max_new_tokens, stop_on_action = llm._resolve_options(stop, max_new_tokens, stop_on_action)
+        self.cache_key = llm._cache_key(messages, temperature, stop, self.max_new_tokens, stop_on_action)
+        self.cassette_key = llm._cassette_key(messages, temperature, stop, self.max_new_tokens, stop_on_action)
+        self.matcher = StopMatcher(stop, stop_on_action)
+        self.emitted_len = 0
+        self.chunks: List[str] = []
+        self.usage: Dict = {}
+
+        emit("llm.start", f"🧠 正在调用 {llm.model} 模型...", model=llm.model)
+        self.span = start_span("llm.think", "llm", model=llm.model, backend=backend)
+        self.started, self.first_content_at = time.perf_counter(), None
+
+    def lookup_cache(self) -> List[str]:
+        return self.llm.response_cache.get(self.cache_key) if self.cache_key else None
+
+    def select_source(self, cached_chunks: List[str]) -> str:
+        """返回 "cache"（命中响应缓存）、"replay"（回放 cassette）或 "live"（发起请求）。"""
+        self.span.set(cache_hit=cached_chunks is not None)
+        if cached_chunks is not None:
+            emit("llm.cache_hit", "✅ 命中响应缓存:")
+            return "cache"
+        if self.llm.cassette is not None and self.llm.cassette.replaying:
+            self.span.set(replayed=True)
+            emit("llm.replay", "📼 回放录制的响应:")
+            return "replay"
+        return "live"
+
+    def request_params(self) -> Dict:
+        return self.llm._request_params(self.messages, self.temperature, self.max_new_tokens)
+
+    def feed(self, content: str):
+        """处理一个片段，返回 (可以产出的文本, 是否已遇到停止序列)。"""
+        if self.first_content_at is None and content:
+            self.first_content_at = time.perf_counter()
+        self.chunks.append(content)
+        stopped = self.matcher.feed(content)
+        delta = self.matcher.settled_output[self.emitted_len:]
+        emit("llm.delta", delta, end="", trace=False)
+        self.emitted_len += len(delta)
+        if stopped:
+            self.span.set(stopped=True)
+        return delta, stopped
+
+    def rest(self) -> str:
+        """流结束后尚未产出的剩余内容。"""
+        rest = self.matcher.output[self.emitted_len:]
+        emit("llm.delta", rest, trace=False)  # 输出剩余内容，并在流式输出结束后换行
+        return rest
+
+    def should_cache(self, response) -> bool:
+        """只缓存真实请求得到的响应。"""
+        return bool(self.cache_key) and response is not None
+
+    def fail(self, error: Exception):
+        self.span.set(error=str(error))
+
+    def finish(self):
+        self.llm._record_llm_span(self.span, self.started, self.first_content_at, len(self.chunks), self.usage)
+        self.span.finish()
+
 class HelloAgentsLLM:
     """
     为本书 "Hello Agents" 定制的LLM客户端。
     它用于调用任何兼容OpenAI接口的服务，并默认使用流式响应。
     """
-    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None):
+    def __init__(self, model: str = None, apiKey: str = None, baseUrl: str = None, timeout: int = None,
+                 stop_sequences: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = False,
+                 response_cache: ResponseCache = None, request_policy: RequestPolicy = None,
+                 endpoints=None, stream_usage: bool = False, cassette: Cassette = None):
         """
         初始化客户端。优先使用传入参数，如果未提供，则从环境变量加载。
+
+        :param stop_sequences: 默认的停止序列，流中出现任一序列即关闭连接
+        :param max_new_tokens: 默认的单次调用 Token 预算（None 表示由服务端决定）
+        :param stop_on_action: 出现第一行完整的 Action 后即停止
+        :param response_cache: 响应缓存，仅缓存 temperature 为 0 的确定性调用
+        :param request_policy: 重试、首 Token 截止时间与对冲策略；提供时关闭 openai 库自带的重试
+        :param endpoints: 多个等价的服务端点（EndpointPool，或 EndpointPool 接受的端点列表），
+            每次请求按首 Token 延迟与在途请求数选择；提供时不再使用 baseUrl 与 LLM_BASE_URL。
+            未提供 request_policy 时使用默认的 RequestPolicy，失败的请求会重新选择端点重试
+        :param stream_usage: 请求服务端在流末尾附带 Token 用量（stream_options.include_usage），记录到追踪的 span 中；
+            并非所有兼容 OpenAI 接口的服务都支持，因提前停止而关闭的流也拿不到用量
+        :param cassette: 录制模式下记录每次调用的片段与时间间隔；回放模式下直接回放录制的响应，不访问服务，
+            此时模型ID、API密钥和服务地址都可以不提供
         """
         self.model = model or os.getenv("LLM_MODEL_ID")
+        self.response_cache = response_cache
+        self.request_policy = request_policy
+        if endpoints is not None and not isinstance(endpoints, EndpointPool):
+            endpoints = EndpointPool(endpoints)
+        self.endpoint_pool = endpoints
+        if self.endpoint_pool is not None and self.request_policy is None:
+            self.request_policy = RequestPolicy()
+        self.stop_sequences = stop_sequences or []
+        self.max_new_tokens = max_new_tokens
+        self.stop_on_action = stop_on_action
+        self.stream_usage = stream_usage
+        self.cassette = cassette
         apiKey = apiKey or os.getenv("LLM_API_KEY")
         baseUrl = baseUrl or os.getenv("LLM_BASE_URL")
         timeout = timeout or int(os.getenv("LLM_TIMEOUT", 60))
-        
+
+        if cassette is not None and cassette.replaying and not all([self.model, apiKey, baseUrl]):
+            # 纯回放，不会发出任何请求
+            self.model = self.model or "cassette"
+            self.client, self.clients = None, {}
+            return
+
+        if self.endpoint_pool is not None:
+            self.model = self.model or self.endpoint_pool.endpoints[0].model
+            if not all((endpoint.model or self.model) and (endpoint.api_key or apiKey)
+                       for endpoint in self.endpoint_pool.endpoints):
+                raise ValueError("每个端点都需要模型ID与API密钥（在端点中单独指定，或提供默认值）。")
+            # 每个端点一个客户端（各自的连接池）
+            self.clients = {
+                endpoint.name: self._create_client(endpoint.api_key or apiKey, endpoint.base_url, timeout)
+                for endpoint in self.endpoint_pool.endpoints
+            }
+            self.client = self.clients[self.endpoint_pool.endpoints[0].name]
+            return
+
         if not all([self.model, apiKey, baseUrl]):
             raise ValueError("模型ID、API密钥和服务地址必须被提供或在.env文件中定义。")
 
-        self.client = OpenAI(api_key=apiKey, base_url=baseUrl, timeout=timeout)
+        self.client = self._create_client(apiKey, baseUrl, timeout)
+        self.clients = {baseUrl: self.client}
 
-    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+    def _create_client(self, apiKey: str, baseUrl: str, timeout: int):
+        from openai import OpenAI # 惰性导入，仅在创建客户端时加载
+        return OpenAI(api_key=apiKey, base_url=baseUrl, timeout=timeout, **self._client_options())
+
+    def _client_options(self) -> Dict:
+        # 由 RequestPolicy 负责重试时，openai 库不再自行重试，避免两层重试叠加
+        return {"max_retries": 0} if self.request_policy is not None else {}
+
+    def _resolve_options(self, stop: List[str], max_new_tokens: int, stop_on_action: bool):
         """
-        调用LLM进行思考，并返回其响应。
+        合并单次调用参数与初始化时的默认值。
+        """
+        stop = self.stop_sequences if stop is None else stop
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        stop_on_action = self.stop_on_action if stop_on_action is None else stop_on_action
+        return stop, max_new_tokens, stop_on_action
+
+    def _cache_key(self, messages: List[Dict[str, str]], temperature: float,
+                   stop: List[str], max_new_tokens: int, stop_on_action: bool) -> str:
+        """
+        计算本次调用的响应缓存键；未启用缓存或调用不确定（temperature > 0）时返回 None。
         """
-        print(f"🧠 正在调用 {self.model} 模型...")
+        if self.response_cache is None or temperature:
+            return None
+        return ResponseCache.make_key(
+            self.model, messages,
+            temperature=temperature, stop=stop, max_new_tokens=max_new_tokens, stop_on_action=stop_on_action
+        )
+
+    def _cassette_key(self, messages: List[Dict[str, str]], temperature: float,
+                      stop: List[str], max_new_tokens: int, stop_on_action: bool) -> str:
+        if self.cassette is None:
+            return None
+        return Cassette.llm_key(
+            messages, temperature=temperature, stop=stop, max_new_tokens=max_new_tokens, stop_on_action=stop_on_action
+        )
+
+    def _request_params(self, messages: List[Dict[str, str]], temperature: float, max_new_tokens: int) -> Dict:
+        params = {
+            "model": self.model,
+            "messages": messages,
+            "temperature": temperature,
+            "stream": True,
+        }
+        if max_new_tokens:
+            params["max_tokens"] = max_new_tokens
+        if self.stream_usage:
+            params["stream_options"] = {"include_usage": True}
+        return params
+
+    def _record_llm_span(self, llm_span, started: float, first_content_at: float, num_chunks: int, usage: Dict):
+        """把首 Token 延迟、Token 用量与生成速度记录到本次调用的 span 中。"""
+        llm_span.set(chunks=num_chunks, **usage)
+        if first_content_at is None:
+            return
+        llm_span.set(ttft_s=first_content_at - started)
+        decode_s = time.perf_counter() - first_content_at
+        if usage.get("completion_tokens") and decode_s > 0:
+            llm_span.set(tokens_per_s=usage["completion_tokens"] / decode_s)
+
+    def _open_stream(self, params: Dict, usage: Dict = None):
+        """
+        发起流式请求，返回 (response, 片段迭代器)；设置了 request_policy 时按策略重试与对冲。
+        使用端点池时，每次尝试（包括重试与对冲请求）都重新选择端点。
+        """
+        def open_fn():
+            if self.endpoint_pool is None:
+                response = self.client.chat.completions.create(**params)
+                return response, _stream_contents(response, usage)
+            lease = self.endpoint_pool.acquire()
+            endpoint = lease.endpoint
+            try:
+                response = self.clients[endpoint.name].chat.completions.create(
+                    **dict(params, model=endpoint.model or self.model)
+                )
+            except Exception as e:
+                lease.fail(e)
+                raise
+            return PooledResponse(response, lease), lease.track(_stream_contents(response, usage))
+
+        if self.request_policy is None:
+            return open_fn()
+        response, first, contents = self.request_policy.open_stream(open_fn)
+        return response, itertools.chain([first], contents)
+
+    def think_stream(self, messages: List[Dict[str, str]], temperature: float = 0,
+                     stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None):
+        """
+        think 的流式版本：逐段产出回答文本，拼接起来与 think 的返回值相同（不含停止序列及之后的内容）。
+        调用方提前关闭生成器时会同时关闭连接；出错时抛出异常。
+        """
+        call = _ThinkCall(self, messages, temperature, stop, max_new_tokens, stop_on_action, backend="openai")
+        response = None
+        recording = None
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=messages,
-                temperature=temperature,
-                stream=True,
-            )
-            
-            # 处理流式响应
-            print("✅ LLM响应成功:")
-            collected_content = []
-            for chunk in response:
-                content = chunk.choices[0].delta.content or ""
-                print(content, end="", flush=True)
-                collected_content.append(content)
-            print()  # 在流式输出结束后换行
-            return "".join(collected_content)
+            cached_chunks = call.lookup_cache()
+            source = call.select_source(cached_chunks)
+            if source == "cache":
+                contents = iter(cached_chunks)
+            elif source == "replay":
+                contents = self.cassette.replay_stream(call.cassette_key)
+            else:
+                response, contents = self._open_stream(call.request_params(), call.usage)
+                if self.cassette is not None:
+                    contents = recording = self.cassette.record_stream(call.cassette_key, contents, call.started,
+                                                                       model=self.model)
+                emit("llm.response", "✅ LLM响应成功:")
+
+            # 处理流式响应，缓存的响应也按同样的路径回放
+            for content in contents:
+                delta, stopped = call.feed(content)
+                if delta:
+                    yield delta
+                if stopped:
+                    break
+            rest = call.rest()
 
+            if call.should_cache(response):
+                self.response_cache.put(call.cache_key, call.chunks)
+            if rest:
+                yield rest
         except Exception as e:
-            print(f"❌ 调用LLM API时发生错误: {e}")
-            return None
+            call.fail(e)
+            raise
+        finally:
+            if recording is not None:
+                recording.close() # 提前停止时也写入已收到的片段
+            if response is not None:
+                # 已拿到需要的内容（或调用方不再需要），关闭连接，不再为多余的 Token 付费
+                response.close()
+            call.finish()
 
-DEFAULT_SYSTEM_PROMT = "你是一個人工智能助手"
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0,
+              stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None) -> str:
+        """
+        调用LLM进行思考，并返回其响应。
 
-from transformers import AutoModelForCausalLM, AutoTokenizer
+        :param stop: 本次调用的停止序列，未提供时使用初始化时的默认值
+        :param max_new_tokens: 本次调用的 Token 预算
+        :param stop_on_action: 出现第一行完整的 Action 后即关闭流
+        """
+        try:
+            return "".join(self.think_stream(messages, temperature, stop, max_new_tokens, stop_on_action))
+        except Exception as e:
+            emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", error=str(e))
+            return None
 
-class HelloAgentsLLM_Local:
+class HelloAgentsLLM_Async(HelloAgentsLLM):
     """
-    为本书 "Hello Agents" 定制的本地LLM客户端。
-    它用于调用本地加载的大语言模型（如Qwen）。
+    HelloAgentsLLM 的 asyncio 版本，基于 AsyncOpenAI。
+    think 的参数与返回值与同步版本一致，但需要 await；多个智能体可以在同一个事件循环中
+    共用一个客户端实例，从而共用同一个连接池。
     """
+    def __init__(self, *args, max_connections: int = None, **kwargs):
+        """
+        :param max_connections: 连接池的最大连接数（None 表示使用 openai 库的默认值）
+        """
+        self.max_connections = max_connections
+        super().__init__(*args, **kwargs)
 
-    def __init__(self, model_name: str = "Qwen/Qwen3-0.6B"):
+    def _create_client(self, apiKey: str, baseUrl: str, timeout: int):
+        from openai import AsyncOpenAI
+        http_client = None
+        if self.max_connections:
+            import httpx
+            from openai import DefaultAsyncHttpxClient
+            http_client = DefaultAsyncHttpxClient(
+                limits=httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+            )
+        return AsyncOpenAI(api_key=apiKey, base_url=baseUrl, timeout=timeout, http_client=http_client,
+                           **self._client_options())
+
+    async def _open_stream(self, params: Dict, usage: Dict = None):
         """
-        初始化客户端。加载本地模型。
+        _open_stream 的协程版本。
         """
-        self.model_name = model_name
-        self.tokenizer = AutoTokenizer.from_pretrained(self.model_name)
-        self.model = AutoModelForCausalLM.from_pretrained(self.model_name)
+        async def open_fn():
+            if self.endpoint_pool is None:
+                response = await self.client.chat.completions.create(**params)
+                return response, _astream_contents(response, usage)
+            lease = self.endpoint_pool.acquire()
+            endpoint = lease.endpoint
+            try:
+                response = await self.clients[endpoint.name].chat.completions.create(
+                    **dict(params, model=endpoint.model or self.model)
+                )
+            except Exception as e:
+                lease.fail(e)
+                raise
+            except BaseException: # 被取消（如对冲请求的另一方已胜出）不算端点失败
+                lease.release()
+                raise
+            return AsyncPooledResponse(response, lease), lease.atrack(_astream_contents(response, usage))
 
-        print(f"🔄 加载本地模型: {self.model_name}")
-        print(f"📱 使用设备: {self.model.device}")
+        if self.request_policy is None:
+            return await open_fn()
+        response, first, contents = await self.request_policy.aopen_stream(open_fn)
+        return response, _aprepend(first, contents)
 
-    def think(self, messages: List[Dict[str, str]], temperature: float = 0) -> str:
+    async def think_stream(self, messages: List[Dict[str, str]], temperature: float = 0,
+                           stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None):
         """
-        HelloAgent LLM API, 调用LLM进行思考，并返回其响应。
+        think_stream 的异步生成器版本。响应缓存的读写（可能是 SQLite 磁盘 I/O）放到线程中执行，不阻塞事件循环。
         """
-        print(f"🧠 本地模型 {self.model_name} 正在生成回答...")
+        call = _ThinkCall(self, messages, temperature, stop, max_new_tokens, stop_on_action, backend="openai-async")
+        response = None
+        recording = None
         try:
-            text = self.tokenizer.apply_chat_template(
-                messages,
-                tokenize=False,
-                add_generation_prompt=True,
-                enable_thinking=False
-            )
+            cached_chunks = await asyncio.to_thread(call.lookup_cache) if call.cache_key else None
+            source = call.select_source(cached_chunks)
+            if source == "cache":
+                contents = _replay_contents(cached_chunks)
+            elif source == "replay":
+                contents = self.cassette.areplay_stream(call.cassette_key)
+            else:
+                response, contents = await self._open_stream(call.request_params(), call.usage)
+                if self.cassette is not None:
+                    contents = recording = self.cassette.arecord_stream(call.cassette_key, contents, call.started,
+                                                                        model=self.model)
+                emit("llm.response", "✅ LLM响应成功:")
 
-            # 编码输入文本
-            model_inputs = self.tokenizer(text, return_tensors="pt").to(self.model.device)
+            # 处理流式响应，缓存的响应也按同样的路径回放
+            async for content in contents:
+                delta, stopped = call.feed(content)
+                if delta:
+                    yield delta
+                if stopped:
+                    break
+            rest = call.rest()
 
-            # 使用模型生成回答
-            response_ids = self.model.generate(
-                **model_inputs,
-                max_new_tokens=32768
-            )[0][len(model_inputs.input_ids[0]):].tolist()
-
-            # 解码生成的 Token ID
-            response = self.tokenizer.decode(response_ids, skip_special_tokens=True)
-            
-            return response
+            if call.should_cache(response):
+                await asyncio.to_thread(self.response_cache.put, call.cache_key, call.chunks)
+            if rest:
+                yield rest
+        except Exception as e:
+            call.fail(e)
+            raise
+        finally:
+            if recording is not None:
+                await recording.aclose()
+            if response is not None:
+                await response.close()
+            call.finish()
 
+    async def think(self, messages: List[Dict[str, str]], temperature: float = 0,
+                    stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None) -> str:
+        """
+        调用LLM进行思考，并返回其响应（协程版本）。
+        """
+        try:
+            return "".join([
+                delta async for delta in self.think_stream(messages, temperature, stop, max_new_tokens, stop_on_action)
+            ])
         except Exception as e:
-            print(f"❌ 调用LLM API时发生错误: {e}")
+            emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", error=str(e))
             return None
 
+    async def close(self):
+        """
+        关闭底层连接池。
+        """
+        for client in self.clients.values():
+            await client.close()
+
+DEFAULT_SYSTEM_PROMT = "你是一個人工智能助手"
+
+# --- 后端注册表 ---
+# 后端名称 -> (模块名, 类名)。模块在第一次使用时才导入，只用远程客户端时不会加载 torch/transformers
+LLM_BACKENDS = {
+    "openai": ("LLMClient", "HelloAgentsLLM"),
+    "openai-async": ("LLMClient", "HelloAgentsLLM_Async"),
+    "local": ("LocalLLMClient", "HelloAgentsLLM_Local"),
+}
+
+# 已迁移到 LocalLLMClient 的名称，仍可以通过 from LLMClient import ... 惰性获取
+_LOCAL_NAMES = {"HelloAgentsLLM_Local", "StopSequenceCriteria", "BatchSequence", "DecodeBatch", "ModelRegistry", "MODEL_REGISTRY"}
+
+def _import_sibling(module_name: str):
+    """导入与本文件同目录的模块，兼容包内导入（agent_experiment.LLMClient）与直接导入（LLMClient）。"""
+    if __package__:
+        return importlib.import_module(f".{module_name}", __package__)
+    return importlib.import_module(module_name)
+
+def get_llm_class(backend: str):
+    """
+    根据后端名称获取LLM客户端类，按需导入对应模块。
+    """
+    if backend not in LLM_BACKENDS:
+        raise ValueError(f"未知的LLM后端 '{backend}'，可选: {', '.join(LLM_BACKENDS)}")
+    module_name, class_name = LLM_BACKENDS[backend]
+    return getattr(_import_sibling(module_name), class_name)
+
+def get_llm(backend: str = None, **kwargs):
+    """
+    创建LLM客户端，如 get_llm("openai") / get_llm("local", use_prefix_cache=True)。
+    未指定后端时读取环境变量 LLM_BACKEND，默认为 "openai"。
+    """
+    backend = backend or os.getenv("LLM_BACKEND", "openai")
+    return get_llm_class(backend)(**kwargs)
+
+def __getattr__(name: str):
+    if name in _LOCAL_NAMES:
+        return getattr(_import_sibling("LocalLLMClient"), name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # --- 客户端使用示例 ---
 if __name__ == '__main__':
     
-    # llmClient = HelloAgentsLLM()
-    llmClient = HelloAgentsLLM_Local()
+    # llmClient = get_llm("openai")
+    llmClient = get_llm("local")
     
     user_input = input("You: ")
     messages = [{"role": "user", "content": user_input}]
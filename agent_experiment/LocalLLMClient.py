@@ -0,0 +1,1013 @@
+import time
+import threading
+import contextvars
+import torch
+from collections import OrderedDict
+from typing import List, Dict
+from transformers import (
+    AutoModelForCausalLM, AutoTokenizer, BatchEncoding, LogitsProcessorList, StoppingCriteria, StoppingCriteriaList,
+    TextIteratorStreamer
+)
+
+try:
+    from .LLMClient import StopMatcher, truncate_at_stop
+    from .ResponseCache import ResponseCache
+    from .ReActGrammar import ReActGrammar, ReActLogitsProcessor, TokenVocabulary
+    from .Tracing import NOOP_SPAN, current_span, emit, span
+except ImportError: # 在 agent_experiment 目录下直接导入时
+    from LLMClient import StopMatcher, truncate_at_stop
+    from ResponseCache import ResponseCache
+    from ReActGrammar import ReActGrammar, ReActLogitsProcessor, TokenVocabulary
+    from Tracing import NOOP_SPAN, current_span, emit, span
+
+# 固定提示词前缀时用来定位消息内容在对话模板中位置的占位符
+PROMPT_SENTINEL = "\u0000PROMPT_SENTINEL\u0000"
+MAX_PINNED_PREFIXES = 8
+
+# 支持的加载精度 -> 加载权重时使用的 dtype；int8 先以 fp32 加载，再对 Linear 层做动态量化；
+# auto 沿用检查点保存时的 dtype，不做转换
+PRECISIONS = {
+    "fp32": torch.float32,
+    "bf16": torch.bfloat16,
+    "int8": torch.float32,
+    "auto": "auto",
+}
+
+def load_model(model_name: str, precision: str = "fp32"):
+    """
+    按指定精度加载模型。权重从 safetensors 以 mmap 方式读取，并跳过随机初始化。
+    只有加载的 dtype 与检查点一致时（precision="auto"，或检查点本身就是该精度），参数才直接引用 mmap 的页面，
+    同一主机上的多个进程共享操作系统的页缓存；需要转换 dtype（如 bf16 检查点以 fp32 加载）或做 int8 量化时，
+    权重会被复制，每个进程各持有一份私有副本。
+    """
+    if precision not in PRECISIONS:
+        raise ValueError(f"不支持的精度 '{precision}'，可选: {', '.join(PRECISIONS)}")
+    model = AutoModelForCausalLM.from_pretrained(
+        model_name,
+        dtype=PRECISIONS[precision],
+        use_safetensors=True,
+        low_cpu_mem_usage=True
+    )
+    if precision == "int8":
+        # 权重以 int8 存储，激活值在运行时动态量化，仅作用于 CPU 上的 Linear 层
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    model.eval()
+    return model
+
+class ModelRegistry:
+    """
+    进程内共享的模型注册表：每个 (模型, 精度) 只加载一次分词器与权重，
+    多个 HelloAgentsLLM_Local 实例共用同一份，各实例只保留自己的会话状态（前缀缓存、统计等）。
+    """
+    def __init__(self):
+        self._models: Dict[tuple, tuple] = {}
+        self._refcounts: Dict[tuple, int] = {}
+        self._lock = threading.Lock()
+        self._loading: Dict[tuple, threading.Lock] = {}
+
+    def acquire(self, model_name: str, precision: str = "fp32"):
+        """
+        获取 (tokenizer, model)，首次获取时加载；并发获取同一个模型时只会加载一次。
+        """
+        key = (model_name, precision)
+        with self._lock:
+            load_lock = self._loading.setdefault(key, threading.Lock())
+        with load_lock:
+            with self._lock:
+                loaded = self._models.get(key)
+            if loaded is None:
+                emit("llm.load", f"🔄 加载本地模型: {model_name} ({precision})", model=model_name, precision=precision)
+                loaded = (AutoTokenizer.from_pretrained(model_name), load_model(model_name, precision))
+            with self._lock:
+                self._models[key] = loaded
+                self._refcounts[key] = self._refcounts.get(key, 0) + 1
+        return loaded
+
+    def release(self, model_name: str, precision: str = "fp32"):
+        """
+        归还一次 acquire；引用数归零时卸载模型。
+        """
+        key = (model_name, precision)
+        with self._lock:
+            if key not in self._refcounts:
+                return
+            self._refcounts[key] -= 1
+            if self._refcounts[key] <= 0:
+                del self._refcounts[key]
+                del self._models[key]
+                self._loading.pop(key, None)
+
+    def loaded(self) -> Dict[tuple, int]:
+        """
+        当前已加载的 (模型, 精度) 及其引用数。
+        """
+        with self._lock:
+            return dict(self._refcounts)
+
+# 进程级的默认注册表
+MODEL_REGISTRY = ModelRegistry()
+
+def special_token_ids(model, tokenizer):
+    """
+    返回批量解码所需的 (eos_token_ids 列表, pad_token_id)，没有 pad Token 的模型以 EOS 代替。
+    """
+    eos_token_ids = model.generation_config.eos_token_id
+    if not isinstance(eos_token_ids, list):
+        eos_token_ids = [eos_token_ids]
+    pad_token_id = tokenizer.pad_token_id
+    if pad_token_id is None:
+        pad_token_id = eos_token_ids[0]
+    return eos_token_ids, pad_token_id
+
+class StopSequenceCriteria(StoppingCriteria):
+    """
+    供 model.generate 使用的停止条件：逐步增量解码新生成的 Token，并交给 StopMatcher 检查。
+    """
+    def __init__(self, tokenizer, prompt_length: int, stop_sequences: List[str] = None, stop_on_action: bool = False):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_sequences = stop_sequences
+        self.stop_on_action = stop_on_action
+        self._matchers: List[StopMatcher] = []
+        self._decoded_upto: List[int] = [] # 每行已解码到的位置（相对于完整序列）
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if not self._matchers:
+            self._matchers = [StopMatcher(self.stop_sequences, self.stop_on_action) for _ in range(input_ids.shape[0])]
+            self._decoded_upto = [self.prompt_length] * input_ids.shape[0]
+
+        is_done = []
+        for row, matcher in enumerate(self._matchers):
+            if not matcher.stopped:
+                pending_ids = input_ids[row, self._decoded_upto[row]:].tolist()
+                pending_text = self.tokenizer.decode(pending_ids, skip_special_tokens=True)
+                # 多字节字符可能被拆到多个 Token 中，等凑齐后再送去匹配
+                if not pending_text.endswith("\ufffd"):
+                    matcher.feed(pending_text)
+                    self._decoded_upto[row] = input_ids.shape[1]
+            is_done.append(matcher.stopped)
+        return torch.tensor(is_done, dtype=torch.bool, device=input_ids.device)
+
+class FirstTokenTimer(StoppingCriteria):
+    """
+    不停止生成，只记录第一个新 Token 生成完成的时刻（generate 每生成一步都会检查停止条件），用于追踪首 Token 延迟。
+    """
+    def __init__(self):
+        self.first_token_at = None
+
+    def __call__(self, input_ids, scores, **kwargs):
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+        return torch.zeros(input_ids.shape[0], dtype=torch.bool, device=input_ids.device)
+
+class CancelCriteria(StoppingCriteria):
+    """
+    调用方设置 cancel_event 后，在下一个 Token 处停止生成（用于流式输出被提前关闭时）。
+    """
+    def __init__(self, cancel_event: threading.Event):
+        self.cancel_event = cancel_event
+
+    def __call__(self, input_ids, scores, **kwargs):
+        return torch.full((input_ids.shape[0],), self.cancel_event.is_set(), dtype=torch.bool, device=input_ids.device)
+
+class BatchSequence:
+    """
+    批量解码中的一条序列：记录 prompt、已生成的 Token 以及停止状态。
+    """
+    def __init__(self, prompt_ids: List[int], max_new_tokens: int, stop_matcher: StopMatcher,
+                 temperature: float = None):
+        self.prompt_ids = prompt_ids
+        self.max_new_tokens = max_new_tokens
+        self.stop_matcher = stop_matcher
+        self.temperature = temperature # 为 None 时使用批次的 temperature
+        self.generated_ids: List[int] = []
+        self.finished = False
+        self._decoded_upto = 0 # 已送入 stop_matcher 的生成 Token 数
+
+    def append(self, token_id: int, tokenizer, eos_token_ids: List[int]):
+        """
+        追加一个新 Token，并更新是否结束（EOS、停止序列或 Token 预算用完）。
+        """
+        if token_id in eos_token_ids:
+            self.finished = True
+            return
+        self.generated_ids.append(token_id)
+
+        pending_text = tokenizer.decode(self.generated_ids[self._decoded_upto:], skip_special_tokens=True)
+        # 多字节字符可能被拆到多个 Token 中，等凑齐后再送去匹配
+        if not pending_text.endswith("\ufffd"):
+            self.stop_matcher.feed(pending_text)
+            self._decoded_upto = len(self.generated_ids)
+
+        if self.stop_matcher.stopped or len(self.generated_ids) >= self.max_new_tokens:
+            self.finished = True
+
+class DecodeBatch:
+    """
+    手动驱动的批量解码：左填充后一次 prefill，随后每步对所有未结束的行做一次前向计算。
+    已结束的序列会立即从 KV 缓存与批次中移除，后续步骤不再为它们付出计算量。
+    """
+    def __init__(self, model, pad_token_id: int, eos_token_ids: List[int], temperature: float = 0):
+        self.model = model
+        self.pad_token_id = pad_token_id
+        self.eos_token_ids = eos_token_ids
+        self.temperature = temperature
+        self.sequences: List[BatchSequence] = []
+        self.past_key_values = None
+        self.attention_mask = None # (batch, 已缓存长度 + 1)
+        self.next_positions = None # 每行下一个 Token 的位置编号
+        self.next_tokens = None    # 每行待送入模型的 Token
+
+    def _sample(self, logits):
+        temperatures = torch.tensor(
+            [(self.temperature if sequence.temperature is None else sequence.temperature) or 0
+             for sequence in self.sequences],
+            dtype=logits.dtype, device=logits.device
+        )
+        tokens = torch.argmax(logits, dim=-1)
+        sampled = temperatures > 0
+        if sampled.any():
+            probs = torch.softmax(logits[sampled] / temperatures[sampled].unsqueeze(-1), dim=-1)
+            tokens[sampled] = torch.multinomial(probs, num_samples=1).squeeze(-1)
+        return tokens
+
+    def _accept(self, tokens, tokenizer):
+        for sequence, token_id in zip(self.sequences, tokens.tolist()):
+            sequence.append(token_id, tokenizer, self.eos_token_ids)
+        self.next_tokens = tokens
+
+    @torch.no_grad()
+    def prefill(self, sequences: List[BatchSequence], tokenizer):
+        """
+        左填充所有 prompt，一次前向计算完成 prefill 并得到每行的第一个 Token。
+        """
+        device = self.model.device
+        max_len = max(len(sequence.prompt_ids) for sequence in sequences)
+        input_ids = torch.full((len(sequences), max_len), self.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros((len(sequences), max_len), dtype=torch.long)
+        for row, sequence in enumerate(sequences):
+            length = len(sequence.prompt_ids)
+            input_ids[row, max_len - length:] = torch.tensor(sequence.prompt_ids, dtype=torch.long)
+            attention_mask[row, max_len - length:] = 1
+        input_ids, attention_mask = input_ids.to(device), attention_mask.to(device)
+        # 左填充时位置编号需从每行第一个真实 Token 开始计数
+        position_ids = (attention_mask.cumsum(dim=-1) - 1).clamp(min=0)
+
+        outputs = self.model(
+            input_ids=input_ids,
+            attention_mask=attention_mask,
+            position_ids=position_ids,
+            use_cache=True,
+        )
+        self.sequences = list(sequences)
+        self.past_key_values = outputs.past_key_values
+        self.attention_mask = torch.cat([attention_mask, attention_mask.new_ones((len(sequences), 1))], dim=-1)
+        self.next_positions = position_ids[:, -1] + 1
+        self._accept(self._sample(outputs.logits[:, -1, :]), tokenizer)
+
+    @torch.no_grad()
+    def step(self, tokenizer):
+        """
+        为批次中的每一行解码一个 Token。
+        """
+        outputs = self.model(
+            input_ids=self.next_tokens.unsqueeze(-1),
+            attention_mask=self.attention_mask,
+            position_ids=self.next_positions.unsqueeze(-1),
+            past_key_values=self.past_key_values,
+            use_cache=True,
+        )
+        self.past_key_values = outputs.past_key_values
+        self.attention_mask = torch.cat([self.attention_mask, self.attention_mask.new_ones((len(self.sequences), 1))], dim=-1)
+        self.next_positions = self.next_positions + 1
+        self._accept(self._sample(outputs.logits[:, -1, :]), tokenizer)
+
+    def evict_finished(self) -> List[BatchSequence]:
+        """
+        将已结束的序列移出批次（包括其 KV 缓存），返回被移除的序列。
+        """
+        keep = [row for row, sequence in enumerate(self.sequences) if not sequence.finished]
+        finished = [sequence for sequence in self.sequences if sequence.finished]
+        if not finished:
+            return []
+
+        self.sequences = [self.sequences[row] for row in keep]
+        if keep:
+            index = torch.tensor(keep, dtype=torch.long, device=self.attention_mask.device)
+            self.past_key_values.batch_select_indices(index)
+            self.attention_mask = self.attention_mask[index]
+            self.next_positions = self.next_positions[index]
+            self.next_tokens = self.next_tokens[index]
+            self._trim_padding()
+        else:
+            self.past_key_values = None
+        return finished
+
+    def _trim_padding(self):
+        """
+        移除所有行都是填充的左侧列：较长的序列离开批次后，其余行的左填充不再需要参与计算。
+        """
+        padded = (self.attention_mask.sum(dim=0) == 0).long()
+        leading = int(padded.cumprod(dim=0).sum())
+        if leading == 0:
+            return
+        for layer in self.past_key_values.layers:
+            layer.keys = layer.keys[..., leading:, :]
+            layer.values = layer.values[..., leading:, :]
+        self.attention_mask = self.attention_mask[:, leading:]
+
+    def merge(self, other: "DecodeBatch"):
+        """
+        将另一个已完成 prefill 的批次并入当前批次，用于连续批处理中让新请求加入正在解码的批次。
+        两边的 KV 缓存长度不同，较短的一方在左侧补零并在 attention_mask 中屏蔽。
+        """
+        if not other.sequences:
+            return
+        if not self.sequences:
+            self.sequences = other.sequences
+            self.past_key_values = other.past_key_values
+            self.attention_mask = other.attention_mask
+            self.next_positions = other.next_positions
+            self.next_tokens = other.next_tokens
+            return
+
+        target = max(self.attention_mask.shape[1], other.attention_mask.shape[1])
+
+        def left_pad(tensor, length, dim):
+            missing = length - tensor.shape[dim]
+            if missing == 0:
+                return tensor
+            shape = list(tensor.shape)
+            shape[dim] = missing
+            return torch.cat([tensor.new_zeros(shape), tensor], dim=dim)
+
+        # attention_mask 比缓存多出一列，对应本步待送入的 Token
+        for mine, theirs in zip(self.past_key_values.layers, other.past_key_values.layers):
+            mine.keys = torch.cat([left_pad(mine.keys, target - 1, -2), left_pad(theirs.keys, target - 1, -2)], dim=0)
+            mine.values = torch.cat([left_pad(mine.values, target - 1, -2), left_pad(theirs.values, target - 1, -2)], dim=0)
+        self.attention_mask = torch.cat([
+            left_pad(self.attention_mask, target, 1), left_pad(other.attention_mask, target, 1)
+        ], dim=0)
+        self.next_positions = torch.cat([self.next_positions, other.next_positions])
+        self.next_tokens = torch.cat([self.next_tokens, other.next_tokens])
+        self.sequences = self.sequences + other.sequences
+
+class PromptLookupDecoder:
+    """
+    基于 n-gram 提示词查找的推测解码（仅贪心解码）。
+    ReAct 的输出常常照抄提示词中的内容（工具名、城市名、Observation 中的片段），
+    因此用当前结尾的 n-gram 在已有 Token 中查找上一次出现的位置，把其后的若干 Token 作为草稿，
+    一次前向计算同时验证所有草稿 Token，接受与模型贪心结果一致的最长前缀，再加上模型自己给出的下一个 Token。
+    输出与逐个 Token 的贪心解码一致。
+
+    :param num_draft_tokens: 每次最多提出的草稿 Token 数
+    :param max_ngram_size: 查找时使用的最长 n-gram，找不到时逐步缩短到 1
+    """
+    def __init__(self, model, tokenizer, num_draft_tokens: int = 10, max_ngram_size: int = 3):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.num_draft_tokens = num_draft_tokens
+        self.max_ngram_size = max_ngram_size
+
+    def _index(self, ids: List[int], index: Dict[tuple, int], start: int):
+        """登记 ids[start:] 中新出现的 n-gram -> 其后续 Token 的位置，后出现的覆盖先出现的。"""
+        for end in range(max(start, 1), len(ids)):
+            for n in range(1, min(self.max_ngram_size, end) + 1):
+                index[tuple(ids[end - n:end])] = end
+
+    def _draft(self, ids: List[int], index: Dict[tuple, int], limit: int) -> List[int]:
+        for n in range(min(self.max_ngram_size, len(ids)), 0, -1):
+            position = index.get(tuple(ids[-n:]))
+            if position is not None:
+                return ids[position:position + limit]
+        return []
+
+    @torch.no_grad()
+    def generate(self, input_ids: List[int], sequence: BatchSequence, eos_token_ids: List[int],
+                 past_key_values=None, streamer=None, cancel_event: threading.Event = None):
+        """
+        为 sequence 生成 Token，直到其结束（EOS、停止序列或 Token 预算用完）。
+
+        :param past_key_values: 已缓存 input_ids 前缀的 KV 缓存（前缀会话模式），没有时从头 prefill
+        :param streamer: 与 model.generate 相同的 streamer，每次前向计算后送入新接受的 Token
+        :param cancel_event: 被设置后在下一次前向计算前停止
+        :return: (最终的 KV 缓存, 统计信息)；缓存中包含除最后一个 Token 以外的全部 Token
+        """
+        ids = list(input_ids)
+        processed = past_key_values.get_seq_length() if past_key_values is not None else 0
+        index: Dict[tuple, int] = {}
+        self._index(ids, index, 0)
+        stats = {"drafted_tokens": 0, "accepted_tokens": 0, "forward_passes": 0, "first_token_at": None}
+        if streamer is not None:
+            streamer.put(torch.tensor(ids)) # 与 generate 一致，第一次送入的是提示词
+
+        while not sequence.finished and not (cancel_event is not None and cancel_event.is_set()):
+            remaining = sequence.max_new_tokens - len(sequence.generated_ids)
+            draft = self._draft(ids, index, min(self.num_draft_tokens, remaining - 1))
+            pending = ids[processed:] + draft
+            outputs = self.model(
+                input_ids=torch.tensor([pending], dtype=torch.long, device=self.model.device),
+                past_key_values=past_key_values,
+                use_cache=True,
+            )
+            past_key_values = outputs.past_key_values
+            predictions = torch.argmax(outputs.logits[0, -(len(draft) + 1):, :], dim=-1).tolist()
+
+            accepted = 0
+            while accepted < len(draft) and draft[accepted] == predictions[accepted]:
+                accepted += 1
+            rejected = len(draft) - accepted
+            if rejected:
+                past_key_values.crop(-rejected) # 去掉未被接受的草稿 Token
+            processed = len(ids) + accepted
+            stats["drafted_tokens"] += len(draft)
+            stats["accepted_tokens"] += accepted
+            stats["forward_passes"] += 1
+            if stats["first_token_at"] is None:
+                stats["first_token_at"] = time.perf_counter()
+
+            start = len(ids)
+            for token_id in draft[:accepted] + [predictions[accepted]]:
+                sequence.append(token_id, self.tokenizer, eos_token_ids)
+                if sequence.finished:
+                    break
+            ids = list(input_ids) + sequence.generated_ids
+            self._index(ids, index, start)
+            if streamer is not None:
+                streamer.put(torch.tensor(ids[start:]))
+
+        if streamer is not None:
+            streamer.end()
+
+        # 提前结束时（如草稿中途出现 EOS）缓存中可能多出未被采用的 Token
+        excess = past_key_values.get_seq_length() - len(ids)
+        if excess > 0:
+            past_key_values.crop(-excess)
+        stats["generated_tokens"] = len(sequence.generated_ids)
+        stats["acceptance_rate"] = stats["accepted_tokens"] / stats["drafted_tokens"] if stats["drafted_tokens"] else 0.0
+        return past_key_values, stats
+
+class HelloAgentsLLM_Local:
+    """
+    为本书 "Hello Agents" 定制的本地LLM客户端。
+    它用于调用本地加载的大语言模型（如Qwen）。
+    模型由 ModelRegistry 统一加载，同一进程中相同 (模型, 精度) 的实例共用一份权重。
+    """
+
+    def __init__(self, model_name: str = "Qwen/Qwen3-0.6B", use_prefix_cache: bool = False,
+                 stop_sequences: List[str] = None, max_new_tokens: int = 32768, stop_on_action: bool = False,
+                 response_cache: ResponseCache = None, precision: str = "fp32",
+                 registry: ModelRegistry = None, speculative: str = None, num_draft_tokens: int = 10,
+                 assistant_model_name: str = None, constrained_decoding: bool = False):
+        """
+        初始化客户端。从注册表获取本地模型，尚未加载时才会加载。
+
+        :param use_prefix_cache: 开启前缀会话模式。相邻两次 think 之间保留最长公共 Token 前缀的
+            past key/values，只对新增的后缀做 prefill（适用于 ReActAgent 这类只在末尾追加历史的提示词）
+        :param stop_sequences: 默认的停止序列，生成文本中出现任一序列即停止
+        :param max_new_tokens: 默认的单次调用 Token 预算
+        :param stop_on_action: 生成第一行完整的 Action 后即停止
+        :param response_cache: 响应缓存（本地模型使用贪心解码，结果是确定的）
+        :param precision: 加载精度，"fp32"、"bf16"（内存减半）、"int8"（Linear 层动态量化）
+            或 "auto"（检查点的 dtype，多进程可共享页缓存中的权重）
+        :param registry: 模型注册表，默认使用进程级的 MODEL_REGISTRY
+        :param speculative: 推测解码模式，仅在 temperature 为 0 时生效。"prompt_lookup" 从提示词中查找草稿；
+            "assistant" 由 assistant_model_name 指定的小模型起草（使用 transformers 的辅助生成）
+        :param num_draft_tokens: prompt_lookup 模式每次最多提出的草稿 Token 数
+        :param assistant_model_name: assistant 模式下的起草模型，需与主模型使用相同的分词器
+        :param constrained_decoding: 约束解码模式，think 传入 tool_names 时只允许生成
+            "Thought: ...\nAction: 工具名[...]" 或 "Action: Finish[...]" 格式的输出
+        """
+        self.model_name = model_name
+        self.precision = precision
+        self.response_cache = response_cache
+        self.stop_sequences = stop_sequences or []
+        self.max_new_tokens = max_new_tokens
+        self.stop_on_action = stop_on_action
+        self.registry = registry or MODEL_REGISTRY
+        self.tokenizer, self.model = self.registry.acquire(self.model_name, precision)
+
+        if speculative not in (None, "prompt_lookup", "assistant"):
+            raise ValueError(f"不支持的推测解码模式 '{speculative}'，可选: prompt_lookup, assistant")
+        if speculative == "assistant" and not assistant_model_name:
+            raise ValueError("assistant 模式需要提供 assistant_model_name")
+        self.speculative = speculative
+        self.assistant_model_name = assistant_model_name
+        self.assistant_model = None
+        if speculative == "assistant":
+            _, self.assistant_model = self.registry.acquire(assistant_model_name, precision)
+        self.prompt_lookup = PromptLookupDecoder(self.model, self.tokenizer, num_draft_tokens)
+        self.speculative_stats: List[Dict[str, float]] = [] # 每次 prompt_lookup 调用的草稿接受统计
+
+        self.constrained_decoding = constrained_decoding
+        self._vocabulary: TokenVocabulary = None # 首次约束解码时构建
+        self._grammar_masks: Dict[tuple, Dict] = {} # 工具名称 -> 各文法状态允许的 Token
+        self.usage = {"calls": 0, "prompt_tokens": 0, "completion_tokens": 0}
+
+        self.use_prefix_cache = use_prefix_cache
+        self.prefix_cache_stats: List[Dict[str, int]] = [] # 每次调用的前缀复用统计
+        self._cached_ids: List[int] = []  # 与 self._past_key_values 一一对应的 Token 序列
+        self._past_key_values = None
+        self.batch_stats: Dict[str, float] = {} # 最近一次 think_batch 的吞吐统计
+        self._pinned_prefixes: "OrderedDict[str, Dict]" = OrderedDict() # pin_prefix 固定的前缀
+
+        emit("llm.device", f"📱 使用设备: {self.model.device}", device=str(self.model.device))
+
+    def close(self):
+        """
+        归还共享的模型；所有实例都关闭后，注册表才会卸载模型。
+        """
+        if self.model is None:
+            return
+        self.reset_prefix_cache()
+        self.tokenizer = self.model = None
+        self.registry.release(self.model_name, self.precision)
+        if self.assistant_model is not None:
+            self.assistant_model = None
+            self.registry.release(self.assistant_model_name, self.precision)
+
+    def reset_prefix_cache(self):
+        """
+        清空前缀会话缓存与统计，开始新的会话时调用。
+        """
+        self._cached_ids = []
+        self._past_key_values = None
+        self.prefix_cache_stats = []
+
+    def _reuse_prefix(self, input_ids: List[int]):
+        """
+        计算本次输入与上次缓存的最长公共 Token 前缀，并将缓存裁剪到该长度。
+
+        :return: 可直接交给 generate 的 past_key_values（无可复用前缀时为 None）与复用的 Token 数
+        """
+        common = 0
+        for cached, new in zip(self._cached_ids, input_ids):
+            if cached != new:
+                break
+            common += 1
+        # generate 至少需要对最后一个 Token 做一次前向计算才能得到下一个 Token 的 logits
+        common = min(common, len(input_ids) - 1)
+
+        if self._past_key_values is None or common <= 0:
+            self._past_key_values = None
+            self._cached_ids = []
+            return None, 0
+
+        surplus = self._past_key_values.get_seq_length() - common
+        if surplus > 0:
+            self._past_key_values.crop(-surplus) # 负数表示从末尾移除的 Token 数
+        self._cached_ids = self._cached_ids[:common]
+        return self._past_key_values, common
+
+    def pin_prefix(self, prefix: str) -> bool:
+        """
+        预先套用对话模板并分词一段不变的提示词前缀（如 ReActAgent 的指令、工具列表与问题）。
+        之后只含一条 user 消息、且内容以 prefix 开头的调用，只需对前缀之后新增的部分分词。
+        分界点取在前缀最后一个换行之后，避免 BPE 合并跨越分界；校验结果与完整分词不一致时放弃固定。
+
+        :return: 是否固定成功
+        """
+        if prefix in self._pinned_prefixes:
+            self._pinned_prefixes.move_to_end(prefix)
+            return True
+
+        render = lambda content: self.tokenizer.apply_chat_template(
+            [{"role": "user", "content": content}],
+            tokenize=False,
+            add_generation_prompt=True,
+            enable_thinking=False
+        )
+        rendered = render(prefix + PROMPT_SENTINEL)
+        if rendered.count(PROMPT_SENTINEL) != 1:
+            return False
+        head, tail = rendered.split(PROMPT_SENTINEL)
+        cut = head.rfind("\n") + 1
+        pinned = {
+            "text": head[:cut], "rest": head[cut:], "tail": tail, "ids": self.tokenizer(head[:cut]).input_ids,
+            "suffix": ("", []) # 上次调用中前缀之后、最后一个安全分界点之前的文本及其 Token
+        }
+
+        # 对话模板需原样插入消息内容，且分段分词的结果与完整分词一致
+        full_text = render(prefix)
+        if cut == 0 or full_text != head + tail or self._encode_pinned(pinned, "") != self.tokenizer(full_text).input_ids:
+            emit("llm.pin_failed", "⚠️ 无法固定该提示词前缀，将按完整提示词分词")
+            return False
+
+        self._pinned_prefixes[prefix] = pinned
+        if len(self._pinned_prefixes) > MAX_PINNED_PREFIXES:
+            self._pinned_prefixes.popitem(last=False)
+        return True
+
+    def _encode_pinned(self, pinned: Dict, content_suffix: str) -> List[int]:
+        """
+        前缀之后的部分（如 ReActAgent 的历史）通常只在末尾追加，上次已分词的部分直接复用，
+        每次只对新增的内容分词。
+        """
+        encode = lambda text: self.tokenizer(text, add_special_tokens=False).input_ids
+        body = pinned["rest"] + content_suffix
+        cached_text, cached_ids = pinned["suffix"]
+        if not (cached_text and body.startswith(cached_text)):
+            cached_text, cached_ids = "", []
+
+        # 在最后一个后面不是空白的换行处分界，分界之前的部分留给下一次调用复用
+        cut = body.rfind("\n") + 1
+        if cut > len(cached_text) and not body[cut:cut + 1].isspace():
+            cached_ids = cached_ids + encode(body[len(cached_text):cut])
+            cached_text = body[:cut]
+            pinned["suffix"] = (cached_text, cached_ids)
+        return pinned["ids"] + cached_ids + encode(body[len(cached_text):] + pinned["tail"])
+
+    def _encode_messages(self, messages: List[Dict[str, str]]) -> List[int]:
+        """
+        套用对话模板并分词，命中 pin_prefix 固定的前缀时只对剩余部分分词。
+        """
+        if len(messages) == 1 and messages[0]["role"] == "user":
+            content = messages[0]["content"]
+            for prefix, pinned in self._pinned_prefixes.items():
+                content_suffix = content[len(prefix):]
+                # 剩余部分以空白开头时可能与前缀末尾合并为同一个 Token
+                if content.startswith(prefix) and not (pinned["rest"] + content_suffix)[:1].isspace():
+                    return self._encode_pinned(pinned, content_suffix)
+
+        text = self.tokenizer.apply_chat_template(
+            messages,
+            tokenize=False,
+            add_generation_prompt=True,
+            enable_thinking=False
+        )
+        return self.tokenizer(text).input_ids
+
+    def think(self, messages: List[Dict[str, str]], temperature: float = 0,
+              stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None,
+              tool_names: List[str] = None) -> str:
+        """
+        HelloAgent LLM API, 调用LLM进行思考，并返回其响应。
+
+        :param stop: 本次调用的停止序列，未提供时使用初始化时的默认值
+        :param max_new_tokens: 本次调用的 Token 预算
+        :param stop_on_action: 生成第一行完整的 Action 后即停止
+        :param tool_names: 开启约束解码时，Action 中允许使用的工具名称
+        """
+        return self._think(messages, temperature, stop, max_new_tokens, stop_on_action, tool_names)
+
+    def think_stream(self, messages: List[Dict[str, str]], temperature: float = 0,
+                     stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None,
+                     tool_names: List[str] = None):
+        """
+        think 的流式版本：在后台线程中生成，逐段产出回答文本，拼接起来与 think 的返回值相同。
+        调用方提前关闭生成器时会在下一个 Token 处停止生成；生成失败时抛出 RuntimeError。
+        """
+        stop = self.stop_sequences if stop is None else stop
+        stop_on_action = self.stop_on_action if stop_on_action is None else stop_on_action
+        streamer = TextIteratorStreamer(self.tokenizer, skip_prompt=True, skip_special_tokens=True)
+        cancel_event = threading.Event()
+        result = {}
+
+        def worker():
+            try:
+                result["response"] = self._think(
+                    messages, temperature, stop, max_new_tokens, stop_on_action, tool_names, streamer, cancel_event
+                )
+            finally:
+                streamer.end() # 命中响应缓存或出错时 streamer 从未收到 Token，保证迭代能结束
+
+        # 在调用方的上下文中运行，使生成的 span 挂在当前的智能体步骤之下
+        thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,), daemon=True)
+        thread.start()
+        # streamer 产出的是原始文本，用 StopMatcher 去掉停止序列，只产出确定不会被截掉的部分
+        matcher = StopMatcher(stop, stop_on_action)
+        emitted_len = 0
+        try:
+            for text in streamer:
+                stopped = matcher.feed(text)
+                delta = matcher.settled_output[emitted_len:]
+                if delta:
+                    emitted_len += len(delta)
+                    yield delta
+                if stopped:
+                    break
+            thread.join()
+            response = result.get("response")
+            if response is None:
+                raise RuntimeError(f"本地模型 {self.model_name} 生成失败")
+            if len(response) > emitted_len:
+                yield response[emitted_len:]
+        finally:
+            cancel_event.set()
+            thread.join()
+
+    def _think(self, messages: List[Dict[str, str]], temperature: float, stop: List[str], max_new_tokens: int,
+               stop_on_action: bool, tool_names: List[str], streamer=None, cancel_event: threading.Event = None) -> str:
+        """
+        think 与 think_stream 共用的生成过程；streamer 与 cancel_event 只在流式输出时提供。
+        """
+        with span("llm.think", "llm", model=self.model_name, backend="local") as llm_span:
+            stop = self.stop_sequences if stop is None else stop
+            max_new_tokens = max_new_tokens or self.max_new_tokens
+            stop_on_action = self.stop_on_action if stop_on_action is None else stop_on_action
+
+            cache_key = None
+            if self.response_cache is not None:
+                cache_key = ResponseCache.make_key(
+                    f"{self.model_name}@{self.precision}", messages,
+                    temperature=temperature, stop=stop, max_new_tokens=max_new_tokens, stop_on_action=stop_on_action,
+                    tool_names=sorted(tool_names) if self.constrained_decoding and tool_names else None
+                )
+                cached_chunks = self.response_cache.get(cache_key)
+                if cached_chunks is not None:
+                    llm_span.set(cache_hit=True)
+                    emit("llm.cache_hit", f"✅ 命中响应缓存: {self.model_name}", model=self.model_name)
+                    return "".join(cached_chunks)
+
+            llm_span.set(cache_hit=False)
+            emit("llm.start", f"🧠 本地模型 {self.model_name} 正在生成回答...", model=self.model_name)
+            try:
+                # 编码输入文本
+                input_ids = torch.tensor([self._encode_messages(messages)], dtype=torch.long)
+                model_inputs = BatchEncoding({
+                    "input_ids": input_ids,
+                    "attention_mask": torch.ones_like(input_ids)
+                }).to(self.model.device)
+
+                generate_kwargs = {"max_new_tokens": max_new_tokens}
+                stopping_criteria = StoppingCriteriaList()
+                if stop or stop_on_action:
+                    stopping_criteria.append(
+                        StopSequenceCriteria(self.tokenizer, len(model_inputs.input_ids[0]), stop, stop_on_action)
+                    )
+                if cancel_event is not None:
+                    stopping_criteria.append(CancelCriteria(cancel_event))
+                first_token_timer = None
+                if llm_span is not NOOP_SPAN:
+                    first_token_timer = FirstTokenTimer()
+                    stopping_criteria.append(first_token_timer)
+                if stopping_criteria:
+                    generate_kwargs["stopping_criteria"] = stopping_criteria
+                if streamer is not None:
+                    generate_kwargs["streamer"] = streamer
+                constrained = self.constrained_decoding and bool(tool_names)
+                if constrained:
+                    generate_kwargs["logits_processor"] = LogitsProcessorList([
+                        self._grammar_processor(tool_names, len(model_inputs.input_ids[0]))
+                    ])
+                if self.speculative == "assistant" and not temperature:
+                    generate_kwargs.update(assistant_model=self.assistant_model, do_sample=False)
+
+                # prompt_lookup 自行验证草稿，不经过 logits processor，约束解码时改用 generate
+                if self.speculative == "prompt_lookup" and not temperature and not constrained:
+                    response_ids = self._generate_prompt_lookup(
+                        input_ids[0].tolist(),
+                        BatchSequence([], max_new_tokens, StopMatcher(stop, stop_on_action)),
+                        streamer, cancel_event
+                    )
+                elif not self.use_prefix_cache:
+                    # 使用模型生成回答
+                    response_ids = self.model.generate(
+                        **model_inputs,
+                        **generate_kwargs
+                    )[0][len(model_inputs.input_ids[0]):].tolist()
+                else:
+                    response_ids = self._generate_with_prefix_cache(model_inputs, generate_kwargs)
+
+                self.usage["calls"] += 1
+                self.usage["prompt_tokens"] += len(model_inputs.input_ids[0])
+                self.usage["completion_tokens"] += len(response_ids)
+                if llm_span is not NOOP_SPAN:
+                    self._record_llm_span(llm_span, len(model_inputs.input_ids[0]), len(response_ids), first_token_timer)
+
+                # 解码生成的 Token ID，并去掉停止序列及之后的内容
+                response = self.tokenizer.decode(response_ids, skip_special_tokens=True)
+                response = truncate_at_stop(response, stop, stop_on_action)
+
+                # 被取消的生成不完整，不写入缓存
+                if cache_key and not (cancel_event is not None and cancel_event.is_set()):
+                    self.response_cache.put(cache_key, [response])
+                return response
+
+            except Exception as e:
+                llm_span.set(error=str(e))
+                emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", error=str(e))
+                return None
+
+
+    @staticmethod
+    def _record_llm_span(llm_span, prompt_tokens: int, completion_tokens: int, first_token_timer):
+        """把 Token 数、首 Token 延迟与生成速度记录到 span 中（前缀缓存与推测解码已各自写入了复用与首 Token 时刻）。"""
+        now = time.perf_counter()
+        first_token_at = llm_span.attributes.pop("first_token_at", None)
+        if first_token_timer is not None and first_token_timer.first_token_at is not None:
+            first_token_at = first_token_timer.first_token_at
+        llm_span.set(prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+        if first_token_at is not None:
+            llm_span.set(ttft_s=first_token_at - llm_span.start)
+            if completion_tokens > 1 and now > first_token_at:
+                llm_span.set(tokens_per_s=(completion_tokens - 1) / (now - first_token_at))
+
+    def _grammar_processor(self, tool_names: List[str], prompt_length: int) -> ReActLogitsProcessor:
+        """
+        构造约束 ReAct 格式的 logits processor，同一组工具的各状态掩码在多次调用间复用。
+        """
+        if self._vocabulary is None:
+            self._vocabulary = TokenVocabulary(self.tokenizer)
+        key = tuple(sorted(tool_names))
+        mask_cache = self._grammar_masks.setdefault(key, {})
+        eos_token_ids, _ = special_token_ids(self.model, self.tokenizer)
+        return ReActLogitsProcessor(ReActGrammar(list(key)), self._vocabulary, prompt_length, eos_token_ids, mask_cache)
+
+    def _generate_with_prefix_cache(self, model_inputs, generate_kwargs: Dict) -> List[int]:
+        """
+        前缀会话模式下的生成：复用上次调用留下的 KV 缓存，只 prefill 新增的后缀。
+        """
+        input_ids = model_inputs.input_ids[0].tolist()
+        past_key_values, reused = self._reuse_prefix(input_ids)
+
+        # 传入完整的 input_ids，generate 会根据缓存长度自动跳过已缓存的部分
+        output = self.model.generate(
+            **model_inputs,
+            past_key_values=past_key_values,
+            return_dict_in_generate=True,
+            **generate_kwargs
+        )
+        sequence = output.sequences[0].tolist()
+
+        self._update_prefix_cache(sequence, output.past_key_values, len(input_ids), reused)
+        return sequence[len(input_ids):]
+
+    def _update_prefix_cache(self, sequence: List[int], past_key_values, prompt_tokens: int, reused: int):
+        # 缓存中包含 prompt 与除最后一个 Token 以外的生成结果，下一轮对话若以此为前缀即可继续复用
+        self._past_key_values = past_key_values
+        self._cached_ids = sequence[:self._past_key_values.get_seq_length()]
+
+        stats = {
+            "prompt_tokens": prompt_tokens,
+            "reused_tokens": reused,
+            "prefilled_tokens": prompt_tokens - reused,
+        }
+        self.prefix_cache_stats.append(stats)
+        current_span().set(reused_tokens=reused)
+        emit("llm.prefix_cache", f"♻️ 前缀缓存: 复用 {stats['reused_tokens']}/{stats['prompt_tokens']} 个 Token", **stats)
+
+    def _generate_prompt_lookup(self, input_ids: List[int], sequence: BatchSequence, streamer=None,
+                                cancel_event: threading.Event = None) -> List[int]:
+        """
+        prompt_lookup 模式下的生成，开启前缀会话模式时同样复用上次调用的 KV 缓存。
+        """
+        past_key_values, reused = None, 0
+        if self.use_prefix_cache:
+            past_key_values, reused = self._reuse_prefix(input_ids)
+
+        eos_token_ids, _ = special_token_ids(self.model, self.tokenizer)
+        past_key_values, stats = self.prompt_lookup.generate(
+            input_ids, sequence, eos_token_ids, past_key_values, streamer, cancel_event
+        )
+        self.speculative_stats.append(stats)
+        current_span().set(first_token_at=stats["first_token_at"], drafted_tokens=stats["drafted_tokens"],
+                           accepted_tokens=stats["accepted_tokens"])
+        emit("llm.speculative", f"🎯 推测解码: 接受 {stats['accepted_tokens']}/{stats['drafted_tokens']} 个草稿 Token, "
+             f"{stats['forward_passes']} 次前向计算生成 {stats['generated_tokens']} 个 Token",
+             accepted_tokens=stats["accepted_tokens"], drafted_tokens=stats["drafted_tokens"])
+
+        if self.use_prefix_cache:
+            self._update_prefix_cache(input_ids + sequence.generated_ids, past_key_values, len(input_ids), reused)
+        return sequence.generated_ids
+
+    def think_batch(self, list_of_messages: List[List[Dict[str, str]]], temperature: float = 0,
+                    stop: List[str] = None, max_new_tokens: int = None, stop_on_action: bool = None) -> List[str]:
+        """
+        一次为多个对话生成回答：左填充后共用同一批次的前向计算，已完成的序列会被提前移出批次。
+
+        :return: 与输入顺序一致的回答列表，出错时每一项均为 None
+        """
+        stop = self.stop_sequences if stop is None else stop
+        max_new_tokens = max_new_tokens or self.max_new_tokens
+        stop_on_action = self.stop_on_action if stop_on_action is None else stop_on_action
+
+        emit("llm.start", f"🧠 本地模型 {self.model_name} 正在批量生成 {len(list_of_messages)} 个回答...",
+             model=self.model_name, batch_size=len(list_of_messages))
+        try:
+            sequences = []
+            for messages in list_of_messages:
+                sequences.append(BatchSequence(
+                    self._encode_messages(messages),
+                    max_new_tokens,
+                    StopMatcher(stop, stop_on_action)
+                ))
+
+            eos_token_ids, pad_token_id = special_token_ids(self.model, self.tokenizer)
+            start = time.perf_counter()
+            batch = DecodeBatch(self.model, pad_token_id, eos_token_ids, temperature)
+            batch.prefill(sequences, self.tokenizer)
+            batch.evict_finished()
+            while batch.sequences:
+                batch.step(self.tokenizer)
+                batch.evict_finished()
+            elapsed = time.perf_counter() - start
+
+            generated_tokens = sum(len(sequence.generated_ids) for sequence in sequences)
+            self.batch_stats = {
+                "batch_size": len(sequences),
+                "generated_tokens": generated_tokens,
+                "elapsed": elapsed,
+                "tokens_per_s": generated_tokens / elapsed if elapsed > 0 else 0.0,
+            }
+            emit("llm.batch_done", f"⚡ 批量生成完成: {generated_tokens} 个 Token, {self.batch_stats['tokens_per_s']:.1f} tokens/s",
+                 **self.batch_stats)
+
+            return [
+                truncate_at_stop(
+                    self.tokenizer.decode(sequence.generated_ids, skip_special_tokens=True),
+                    stop,
+                    stop_on_action
+                )
+                for sequence in sequences
+            ]
+
+        except Exception as e:
+            emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", error=str(e))
+            return [None] * len(list_of_messages)
+
+def _rss_mb() -> float:
+    """当前进程的常驻内存（MB）。"""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def _measure_precision(model_name: str, precision: str, prompts: List[str], max_new_tokens: int) -> Dict:
+    """
+    在当前进程中按指定精度加载模型，测量加载耗时、常驻内存与贪心解码的 tokens/s。
+    """
+    base_rss = _rss_mb()
+    start = time.perf_counter()
+    tokenizer = AutoTokenizer.from_pretrained(model_name)
+    model = load_model(model_name, precision)
+    load_time = time.perf_counter() - start
+    rss = _rss_mb() - base_rss
+
+    outputs, generated_tokens, elapsed = [], 0, 0.0
+    with torch.no_grad():
+        for prompt in prompts:
+            text = tokenizer.apply_chat_template(
+                [{"role": "user", "content": prompt}],
+                tokenize=False,
+                add_generation_prompt=True,
+                enable_thinking=False
+            )
+            model_inputs = tokenizer(text, return_tensors="pt").to(model.device)
+            start = time.perf_counter()
+            output_ids = model.generate(**model_inputs, max_new_tokens=max_new_tokens, do_sample=False)
+            elapsed += time.perf_counter() - start
+            response_ids = output_ids[0][len(model_inputs.input_ids[0]):].tolist()
+            generated_tokens += len(response_ids)
+            outputs.append(response_ids)
+
+    return {
+        "precision": precision,
+        "load_s": load_time,
+        "rss_mb": rss,
+        "tokens_per_s": generated_tokens / elapsed if elapsed > 0 else 0.0,
+        "outputs": outputs,
+    }
+
+def compare_precisions(model_name: str, prompts: List[str], precisions: List[str] = ("fp32", "bf16", "int8"),
+                       max_new_tokens: int = 64) -> List[Dict]:
+    """
+    对比不同加载精度：加载耗时、常驻内存、tokens/s，以及与 fp32 输出的一致程度。
+    每种精度在独立的子进程中测量，互不影响内存统计。
+
+    :return: 每种精度一条记录；exact_match 为输出与 fp32 完全相同的 prompt 比例，
+        token_agreement 为逐位置与 fp32 相同的 Token 比例
+    """
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for precision in dict.fromkeys(["fp32", *precisions]): # fp32 作为基准总是最先测量
+        with context.Pool(1) as pool:
+            results.append(pool.apply(_measure_precision, (model_name, precision, list(prompts), max_new_tokens)))
+
+    reference = results[0]["outputs"]
+    for result in results:
+        matched = total = 0
+        for ref_ids, ids in zip(reference, result["outputs"]):
+            matched += sum(1 for a, b in zip(ref_ids, ids) if a == b)
+            total += max(len(ref_ids), len(ids))
+        result["exact_match"] = sum(ref == out for ref, out in zip(reference, result["outputs"])) / len(reference)
+        result["token_agreement"] = matched / total if total else 1.0
+    return [result for result in results if result["precision"] in precisions]
+
+# --- 本地客户端使用示例 ---
+if __name__ == '__main__':
+    llmClient = HelloAgentsLLM_Local()
+
+    user_input = input("You: ")
+    messages = [{"role": "user", "content": user_input}]
+
+    print("--- 调用LLM ---")
+    responseText = llmClient.think(messages)
+    print(f"Bot: {responseText}")
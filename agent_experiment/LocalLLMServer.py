@@ -0,0 +1,426 @@
+# 兼容 OpenAI /v1/chat/completions 接口的本地推理服务
+# 包装本地模型，调度器以连续批处理（continuous batching）的方式解码：每一步都会把新请求并入
+# 正在运行的批次、把已结束的请求移出批次，多个智能体进程可以共用同一份模型并保持较高的利用率。
+#
+# 用法: python agent_experiment/LocalLLMServer.py [--model Qwen/Qwen3-0.6B] [--port 8000] [--max-batch-size 8]
+# 客户端: 设置 LLM_BASE_URL=http://127.0.0.1:8000/v1 后照常使用 HelloAgentsLLM
+# 监控: GET /metrics 返回排队深度、运行中的请求数以及每个请求的首 Token 延迟 (TTFT)
+
+import argparse
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Dict, List
+
+try:
+    from .LLMClient import StopMatcher
+    from .Tracing import emit
+    from .LocalLLMClient import BatchSequence, DecodeBatch, MODEL_REGISTRY, special_token_ids
+except ImportError: # 在 agent_experiment 目录下直接运行时
+    from LLMClient import StopMatcher
+    from Tracing import emit
+    from LocalLLMClient import BatchSequence, DecodeBatch, MODEL_REGISTRY, special_token_ids
+
+class GenerationRequest:
+    """
+    调度器中的一个生成请求。生成的文本以事件的形式放入 events 队列，供 HTTP 线程读取:
+    ("delta", 文本片段)、("done", finish_reason) 或 ("error", 错误信息)。
+    """
+    def __init__(self, messages: List[Dict[str, str]], max_new_tokens: int, temperature: float,
+                 stop: List[str] = None):
+        self.id = f"chatcmpl-{uuid.uuid4().hex[:24]}"
+        self.messages = messages
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.stop = stop or []
+        self.events: "queue.Queue[tuple]" = queue.Queue()
+        self.sequence: BatchSequence = None
+        self.cancelled = False
+        self.created_at = time.perf_counter()
+        self.admitted_at = None
+        self.first_token_at = None
+        self.finished_at = None
+        self._sent_len = 0
+
+    @property
+    def ttft(self) -> float:
+        """从收到请求到生成首个 Token 的耗时（秒），包括排队时间。"""
+        return self.first_token_at - self.created_at if self.first_token_at else None
+
+    @property
+    def finish_reason(self) -> str:
+        if self.sequence.stop_matcher.stopped or len(self.sequence.generated_ids) < self.max_new_tokens:
+            return "stop"
+        return "length"
+
+    def publish(self):
+        """把尚未发送、且不会再被停止序列截断的文本推送给客户端；请求结束时推送剩余文本。"""
+        matcher = self.sequence.stop_matcher
+        text = matcher.output if self.sequence.finished else matcher.settled_output
+        if len(text) > self._sent_len:
+            self.events.put(("delta", text[self._sent_len:]))
+            self._sent_len = len(text)
+        if self.sequence.finished:
+            self.events.put(("done", self.finish_reason))
+
+class ContinuousBatchScheduler:
+    """
+    在后台线程中驱动 DecodeBatch 的连续批处理调度器。
+    每一轮先为运行中的批次解码一个 Token，移出已结束的请求，再对排队中的新请求做一次 prefill 并并入批次。
+
+    :param max_batch_size: 同时解码的最大请求数，超出的请求在队列中等待
+    """
+    def __init__(self, model, tokenizer, max_batch_size: int = 8):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.max_batch_size = max_batch_size
+        self.eos_token_ids, self.pad_token_id = special_token_ids(model, tokenizer)
+
+        self._queue: "queue.Queue[GenerationRequest]" = queue.Queue()
+        self._batch = DecodeBatch(model, self.pad_token_id, self.eos_token_ids)
+        self._running: Dict[int, GenerationRequest] = {} # id(sequence) -> 请求
+        self._stopped = threading.Event()
+        self._thread = None
+
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.generated_tokens = 0
+        self.recent: deque = deque(maxlen=256) # 最近完成的请求统计
+
+    def start(self) -> "ContinuousBatchScheduler":
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+
+    def submit(self, messages: List[Dict[str, str]], max_new_tokens: int, temperature: float = 0,
+               stop: List[str] = None) -> GenerationRequest:
+        """
+        提交一个请求，立即返回；生成结果通过 request.events 逐步取得。
+        """
+        request = GenerationRequest(messages, max_new_tokens, temperature, stop)
+        self._queue.put(request)
+        return request
+
+    def metrics(self) -> Dict:
+        """
+        当前的排队深度、运行中的请求数、吞吐与首 Token 延迟统计。
+        """
+        with self._lock:
+            recent = list(self.recent)
+            completed, generated_tokens = self.completed, self.generated_tokens
+        ttfts = sorted(item["ttft_ms"] for item in recent)
+        percentile = lambda p: ttfts[min(len(ttfts) - 1, int(p * len(ttfts)))] if ttfts else None
+        return {
+            "queue_depth": self._queue.qsize(),
+            "running": len(self._running),
+            "max_batch_size": self.max_batch_size,
+            "completed": completed,
+            "generated_tokens": generated_tokens,
+            "ttft_ms": {"p50": percentile(0.5), "p95": percentile(0.95)},
+            "requests": recent[-32:],
+        }
+
+    def _loop(self):
+        while not self._stopped.is_set():
+            try:
+                self._run_once()
+            except Exception as e:
+                emit("server.error", f"❌ 调度器发生错误: {e}", error=str(e))
+                self._fail_running(str(e))
+
+    def _run_once(self):
+        if self._batch.sequences:
+            self._drop_cancelled()
+        if self._batch.sequences:
+            self._batch.step(self.tokenizer)
+            self._publish(self._batch)
+
+        new_requests = self._admit(block=not self._batch.sequences)
+        if new_requests:
+            self._prefill(new_requests)
+
+    def _admit(self, block: bool) -> List[GenerationRequest]:
+        """从队列中取出可以加入批次的请求；批次为空时阻塞等待。"""
+        requests = []
+        free_slots = self.max_batch_size - len(self._batch.sequences)
+        try:
+            if block:
+                requests.append(self._queue.get(timeout=0.1))
+            while len(requests) < free_slots:
+                requests.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        return [request for request in requests if not request.cancelled]
+
+    def _prefill(self, requests: List[GenerationRequest]):
+        admitted = []
+        for request in requests:
+            request.admitted_at = time.perf_counter()
+            try:
+                text = self.tokenizer.apply_chat_template(
+                    request.messages,
+                    tokenize=False,
+                    add_generation_prompt=True,
+                    enable_thinking=False
+                )
+                request.sequence = BatchSequence(
+                    self.tokenizer(text).input_ids,
+                    request.max_new_tokens,
+                    StopMatcher(request.stop),
+                    temperature=request.temperature
+                )
+            except Exception as e:
+                request.events.put(("error", f"无法构造提示词: {e}"))
+                continue
+            self._running[id(request.sequence)] = request
+            admitted.append(request)
+        if not admitted:
+            return
+
+        new_batch = DecodeBatch(self.model, self.pad_token_id, self.eos_token_ids)
+        new_batch.prefill([request.sequence for request in admitted], self.tokenizer)
+        now = time.perf_counter()
+        for request in admitted:
+            request.first_token_at = now
+        self._publish(new_batch)
+        self._batch.merge(new_batch)
+
+    def _publish(self, batch: DecodeBatch):
+        for sequence in batch.sequences:
+            self._running[id(sequence)].publish()
+        for sequence in batch.evict_finished():
+            self._complete(self._running.pop(id(sequence)))
+
+    def _drop_cancelled(self):
+        """客户端已断开（如 HelloAgentsLLM 命中停止序列后关闭了流）的请求不再继续解码。"""
+        for sequence in self._batch.sequences:
+            if self._running[id(sequence)].cancelled:
+                sequence.finished = True
+        for sequence in self._batch.evict_finished():
+            self._complete(self._running.pop(id(sequence)))
+
+    def _complete(self, request: GenerationRequest):
+        request.finished_at = time.perf_counter()
+        stats = {
+            "id": request.id,
+            "queue_ms": round((request.admitted_at - request.created_at) * 1000, 1),
+            "ttft_ms": round(request.ttft * 1000, 1),
+            "latency_ms": round((request.finished_at - request.created_at) * 1000, 1),
+            "prompt_tokens": len(request.sequence.prompt_ids),
+            "completion_tokens": len(request.sequence.generated_ids),
+            "cancelled": request.cancelled,
+        }
+        with self._lock:
+            self.completed += 1
+            self.generated_tokens += stats["completion_tokens"]
+            self.recent.append(stats)
+        queued = self._queue.qsize()
+        emit("server.request_done", f"✅ {request.id}: TTFT {stats['ttft_ms']}ms (排队 {stats['queue_ms']}ms), "
+             f"{stats['completion_tokens']} 个 Token, 排队中 {queued} 个请求", queued=queued, **stats)
+
+    def _fail_running(self, message: str):
+        for request in self._running.values():
+            request.events.put(("error", message))
+        self._running.clear()
+        self._batch = DecodeBatch(self.model, self.pad_token_id, self.eos_token_ids)
+
+class LocalLLMServer:
+    """
+    在后台线程中运行的 HTTP 服务，对外提供 /v1/chat/completions（支持 stream）、/v1/models 与 /metrics。
+
+    :param default_max_tokens: 请求未指定 max_tokens 时的 Token 预算
+    """
+    def __init__(self, model_name: str = "Qwen/Qwen3-0.6B", precision: str = "fp32", max_batch_size: int = 8,
+                 default_max_tokens: int = 2048, host: str = "127.0.0.1", port: int = 8000):
+        self.model_name = model_name
+        self.precision = precision
+        self.default_max_tokens = default_max_tokens
+        tokenizer, model = MODEL_REGISTRY.acquire(model_name, precision)
+        self.scheduler = ContinuousBatchScheduler(model, tokenizer, max_batch_size)
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "LocalLLMServer":
+        self.scheduler.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self.scheduler.stop()
+        MODEL_REGISTRY.release(self.model_name, self.precision)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload: Dict):
+                body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _send_error(self, status: int, message: str, error_type: str = "invalid_request_error"):
+                self._send_json(status, {"error": {"message": message, "type": error_type}})
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def _write_event(self, payload: Dict):
+                self._write_chunk(f"data: {json.dumps(payload, ensure_ascii=False)}\n\n".encode("utf-8"))
+
+            def do_GET(self):
+                if self.path == "/metrics":
+                    self._send_json(200, server.scheduler.metrics())
+                elif self.path == "/v1/models":
+                    self._send_json(200, {"object": "list", "data": [
+                        {"id": server.model_name, "object": "model", "owned_by": "local"}
+                    ]})
+                else:
+                    self._send_error(404, f"未知路径: {self.path}")
+
+            def do_POST(self):
+                if self.path != "/v1/chat/completions":
+                    self._send_error(404, f"未知路径: {self.path}")
+                    return
+                try:
+                    body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                except json.JSONDecodeError as e:
+                    self._send_error(400, f"请求体不是有效的 JSON: {e}")
+                    return
+                messages = body.get("messages")
+                if not messages:
+                    self._send_error(400, "messages 不能为空")
+                    return
+
+                stop = body.get("stop") or []
+                if isinstance(stop, str):
+                    stop = [stop]
+                max_tokens = body.get("max_completion_tokens") or body.get("max_tokens") or server.default_max_tokens
+                temperature = body.get("temperature")
+                request = server.scheduler.submit(
+                    messages, max_tokens, 1.0 if temperature is None else temperature, stop
+                )
+                model = body.get("model") or server.model_name
+                if body.get("stream"):
+                    self._stream(request, model, bool((body.get("stream_options") or {}).get("include_usage")))
+                else:
+                    self._complete(request, model)
+
+            def _usage(self, request: GenerationRequest) -> Dict:
+                prompt_tokens = len(request.sequence.prompt_ids)
+                completion_tokens = len(request.sequence.generated_ids)
+                return {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": completion_tokens,
+                    "total_tokens": prompt_tokens + completion_tokens,
+                }
+
+            def _complete(self, request: GenerationRequest, model: str):
+                contents = []
+                while True:
+                    kind, payload = request.events.get()
+                    if kind == "delta":
+                        contents.append(payload)
+                    elif kind == "error":
+                        self._send_error(500, payload, "server_error")
+                        return
+                    else:
+                        break
+                self._send_json(200, {
+                    "id": request.id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "message": {"role": "assistant", "content": "".join(contents)},
+                        "finish_reason": payload,
+                    }],
+                    "usage": self._usage(request),
+                })
+
+            def _stream(self, request: GenerationRequest, model: str, include_usage: bool):
+                def chunk(delta: Dict, finish_reason: str = None) -> Dict:
+                    return {
+                        "id": request.id, "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+                    }
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    self._write_event(chunk({"role": "assistant", "content": ""}))
+                    while True:
+                        kind, payload = request.events.get()
+                        if kind == "delta":
+                            self._write_event(chunk({"content": payload}))
+                        elif kind == "error":
+                            self._write_event({"error": {"message": payload, "type": "server_error"}})
+                            break
+                        else:
+                            self._write_event(chunk({}, payload))
+                            if include_usage:
+                                self._write_event({
+                                    "id": request.id, "object": "chat.completion.chunk", "created": int(time.time()),
+                                    "model": model, "choices": [], "usage": self._usage(request),
+                                })
+                            break
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    request.cancelled = True # 客户端提前关闭了流，调度器会在下一步移除该请求
+
+        return Handler
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="本地 OpenAI 兼容推理服务（连续批处理）")
+    parser.add_argument("--model", default="Qwen/Qwen3-0.6B")
+    parser.add_argument("--precision", default="fp32", choices=["fp32", "bf16", "int8", "auto"],
+                        help="auto 沿用检查点的 dtype，多个服务进程可共享页缓存中的权重")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch-size", type=int, default=8)
+    parser.add_argument("--default-max-tokens", type=int, default=2048)
+    args = parser.parse_args()
+
+    with LocalLLMServer(args.model, args.precision, args.max_batch_size, args.default_max_tokens,
+                        args.host, args.port) as llm_server:
+        print(f"🚀 本地推理服务已启动: {llm_server.base_url} (Ctrl+C 退出)")
+        print(f"📊 监控: http://{args.host}:{args.port}/metrics")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
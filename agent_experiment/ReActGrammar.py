@@ -0,0 +1,177 @@
+import torch
+from typing import Dict, List, Optional
+from transformers import LogitsProcessor
+
+# 状态以元组表示，便于按状态缓存允许的 Token 集合:
+#   ("lit", 剩余字面量, 之后的状态)   必须逐字输出的部分，如 "Thought: "、"\nAction: "
+#   ("thought", 是否已有内容)        Thought 的内容，遇到换行进入 Action
+#   ("name", 已输出的部分, 是否为第一行)  工具名称，第一行 Action 还可以是 Finish
+#   ("arg", 是否为 Finish, 是否已有内容)  方括号中的参数，遇到 "]" 结束
+#   ("after",)                      一行工具调用结束，可以换行继续下一行 Action 或结束
+#   ("done",)                       Finish[...] 之后只能结束
+FINISH = "Finish"
+NAME_STATE = ("name", "", True)
+START_STATE = ("lit", "Thought: ", ("thought", False))
+ACTION_STATE = ("lit", "Action: ", NAME_STATE)
+NEXT_ACTION_STATE = ("lit", "Action: ", ("name", "", False)) # 工具调用之后的 Action 行不能再是 Finish
+
+class ReActGrammar:
+    """
+    ReAct 回覆格式的文法：
+        Thought: <一行思考>
+        Action: <工具名>[<参数>]      （可以有多行互不依赖的 Action）
+    或  Action: Finish[<最终答案>]      （只能是唯一的一行 Action，不能跟在工具调用之后）
+    工具名只能是注册过的工具。以逐字符推进的状态机实现。
+    """
+    def __init__(self, tool_names: List[str]):
+        self.tool_names = sorted(set(tool_names) - {FINISH})
+        self.names = sorted(self.tool_names + [FINISH])
+
+    def _names(self, state: tuple) -> List[str]:
+        """name 状态下可选的名称：只有第一行 Action 可以是 Finish。"""
+        return self.names if state[2] else self.tool_names
+
+    def advance(self, state: tuple, char: str) -> Optional[tuple]:
+        """
+        输入一个字符后的新状态，不符合文法时返回 None。
+        """
+        kind = state[0]
+        if kind == "lit":
+            text, next_state = state[1], state[2]
+            if char != text[0]:
+                return None
+            return ("lit", text[1:], next_state) if len(text) > 1 else next_state
+        if kind == "thought":
+            if char == "\n":
+                return ACTION_STATE if state[1] else None
+            return ("thought", state[1] or not char.isspace())
+        if kind == "name":
+            names = self._names(state)
+            if char == "[":
+                return ("arg", state[1] == FINISH, False) if state[1] in names else None
+            partial = state[1] + char
+            return ("name", partial, state[2]) if any(name.startswith(partial) for name in names) else None
+        if kind == "arg":
+            if char == "]":
+                return (("done",) if state[1] else ("after",)) if state[2] else None
+            if char == "\n":
+                return None
+            return ("arg", state[1], state[2] or not char.isspace())
+        if kind == "after":
+            return NEXT_ACTION_STATE if char == "\n" else None
+        return None
+
+    def walk(self, state: tuple, text: str) -> Optional[tuple]:
+        for char in text:
+            state = self.advance(state, char)
+            if state is None:
+                return None
+        return state
+
+    @staticmethod
+    def is_accepting(state: tuple) -> bool:
+        return state[0] in ("after", "done")
+
+    def next_chars(self, state: tuple) -> List[str]:
+        """受限状态下允许的下一个字符。"""
+        kind = state[0]
+        if kind == "lit":
+            return [state[1][0]]
+        if kind == "name":
+            names = self._names(state)
+            chars = {name[len(state[1])] for name in names if name.startswith(state[1]) and len(name) > len(state[1])}
+            if state[1] in names:
+                chars.add("[")
+            return sorted(chars)
+        if kind == "after":
+            return ["\n"]
+        return []
+
+class TokenVocabulary:
+    """
+    分词器中每个 Token 解码后的文本及其索引，每个分词器只需构建一次。
+    """
+    def __init__(self, tokenizer):
+        special_ids = set(tokenizer.all_special_ids)
+        size = len(tokenizer)
+        texts = tokenizer.batch_decode([[token_id] for token_id in range(size)])
+        self.size = size
+        self.texts: List[str] = ["" if token_id in special_ids else text for token_id, text in enumerate(texts)]
+        self.by_first_char: Dict[str, List[int]] = {}
+        self.with_newline: List[int] = []
+        self.with_bracket_or_newline: List[int] = []
+        plain = torch.zeros(size, dtype=torch.bool)
+        plain_in_arg = torch.zeros(size, dtype=torch.bool)
+        for token_id, text in enumerate(self.texts):
+            if not text:
+                continue
+            self.by_first_char.setdefault(text[0], []).append(token_id)
+            if "\n" in text:
+                self.with_newline.append(token_id)
+            else:
+                plain[token_id] = True
+            if "\n" in text or "]" in text:
+                self.with_bracket_or_newline.append(token_id)
+            else:
+                plain_in_arg[token_id] = True
+        self.plain = plain               # 不含换行的 Token，Thought 中总是允许
+        self.plain_in_arg = plain_in_arg # 不含换行与 "]" 的 Token，参数中总是允许
+
+class ReActLogitsProcessor(LogitsProcessor):
+    """
+    按 ReActGrammar 屏蔽不符合格式的 Token，只用于单条序列或同一文法的批次。
+    每个状态允许的 Token 集合会被缓存，状态数有限，预热后每一步只需查表。
+    """
+    def __init__(self, grammar: ReActGrammar, vocabulary: TokenVocabulary, prompt_length: int,
+                 eos_token_ids: List[int], mask_cache: Dict[tuple, torch.Tensor] = None):
+        self.grammar = grammar
+        self.vocabulary = vocabulary
+        self.prompt_length = prompt_length
+        self.eos_token_ids = eos_token_ids
+        self.mask_cache = {} if mask_cache is None else mask_cache
+        self._states: List[Optional[tuple]] = []
+        self._consumed = 0
+
+    def allowed_mask(self, state: tuple) -> torch.Tensor:
+        mask = self.mask_cache.get(state)
+        if mask is not None:
+            return mask
+
+        vocabulary = self.vocabulary
+        if state[0] == "thought":
+            mask, candidates = vocabulary.plain.clone(), vocabulary.with_newline
+        elif state[0] == "arg":
+            mask, candidates = vocabulary.plain_in_arg.clone(), vocabulary.with_bracket_or_newline
+        else:
+            mask = torch.zeros(vocabulary.size, dtype=torch.bool)
+            candidates = [
+                token_id
+                for char in self.grammar.next_chars(state)
+                for token_id in vocabulary.by_first_char.get(char, [])
+            ]
+        for token_id in candidates:
+            if self.grammar.walk(state, vocabulary.texts[token_id]) is not None:
+                mask[token_id] = True
+        if self.grammar.is_accepting(state):
+            mask[[token_id for token_id in self.eos_token_ids if token_id < vocabulary.size]] = True
+        self.mask_cache[state] = mask
+        return mask
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if not self._states:
+            self._states = [START_STATE] * input_ids.shape[0]
+            self._consumed = self.prompt_length
+        for row in range(input_ids.shape[0]):
+            for token_id in input_ids[row, self._consumed:].tolist():
+                if self._states[row] is not None and token_id < self.vocabulary.size:
+                    self._states[row] = self.grammar.walk(self._states[row], self.vocabulary.texts[token_id])
+        self._consumed = input_ids.shape[1]
+
+        for row, state in enumerate(self._states):
+            if state is None:
+                continue # 已偏离文法（如 EOS 之后的填充），不再约束
+            mask = self.allowed_mask(state).to(scores.device)
+            allowed = torch.zeros(scores.shape[-1], dtype=torch.bool, device=scores.device)
+            allowed[:mask.shape[0]] = mask[:scores.shape[-1]]
+            scores[row] = scores[row].masked_fill(~allowed, float("-inf"))
+        return scores
@@ -5,37 +5,104 @@ REACT_PROMPT_TEMPLATE = """
 可调用的外部工具如下:
 {tools}
 
-每次仅能回覆一组 Thought-Action 对，格式如下：
+每次回覆一个 Thought 以及一行或多行 Action，格式如下：
 Thought: 你的思考过程与结论，用于分析问题、拆解任务
 Action: {{tool_name}}[{{tool_input}}]
 
 注意事项：
-- 请严格按照回覆格式进行回应，不可输出复数对回覆
-- 当你收集到足够的资讯，能够回答用户询问时，请于 Action: 中输出 Finish: "问题的最终答案"
+- 请严格按照回覆格式进行回应，不可输出复数个 Thought
+- 若需要多次调用互不依赖的工具（如查询多个城市的天气），可以在同一次回覆中输出多行 Action，它们会被同时执行
+- 当你收集到足够的资讯，能够回答用户询问时，只输出一行 Action: Finish[问题的最终答案]
 
 现在，请开始解决以下问题:
 Question: {question}
 History: {history}
 """
 
+# 模型常会继续编造 Observation，遇到即停止生成
+REACT_STOP_SEQUENCES = ["Observation:"]
+
+# 用于把提示词拆成 历史之前 / 历史之后 两段的占位符
+HISTORY_SENTINEL = "\u0000HISTORY\u0000"
+
 import re
-from LLMClient import HelloAgentsLLM, HelloAgentsLLM_Local
+import time
+import asyncio
+from LLMClient import HelloAgentsLLM, get_llm
 from tools.ToolExecutor import ToolExecutor
+from HistoryManager import HistoryManager
+from Tracing import emit, span
+
+class StreamingReActParser:
+    """
+    增量解析LLM的流式输出：每凑齐一行就从中提取 Thought 与 Action，不必等待完整的回覆。
+    整段输出喂完并 close 后，产生的事件与 ReActAgent._parse_output 的结果一致。
+    """
+    def __init__(self):
+        self._buffer = ""
+        self._thought_seen = False
+
+    def feed(self, chunk: str):
+        """
+        输入一段新文本，返回其中已完整的行产生的事件 [("thought" | "action", 内容), ...]。
+        """
+        self._buffer += chunk
+        *lines, self._buffer = self._buffer.split("\n")
+        return [event for line in lines for event in self._parse_line(line)]
+
+    def close(self):
+        """流结束，解析最后一行（没有以换行结尾）。"""
+        line, self._buffer = self._buffer, ""
+        return self._parse_line(line)
+
+    def _parse_line(self, line: str):
+        events = []
+        if not self._thought_seen:
+            thought_match = re.search(r"Thought: (.*)", line)
+            if thought_match:
+                self._thought_seen = True
+                events.append(("thought", thought_match.group(1).strip()))
+        events.extend(("action", action.strip()) for action in re.findall(r"Action: (.*)", line) if action.strip())
+        return events
 
 class ReActAgent:
-    def __init__(self, llm_client: HelloAgentsLLM_Local, tool_executor: ToolExecutor, max_steps: int = 5):
+    def __init__(self, llm_client: HelloAgentsLLM, tool_executor: ToolExecutor, max_steps: int = 5,
+                 history_manager: HistoryManager = None, stream_actions: bool = False,
+                 cancel_after_action: bool = False):
+        """
+        :param history_manager: 历史记录管理器，可设置提示词的 Token 预算；默认不压缩历史。
+            其中保存着本次运行的历史，不能在多个智能体之间共用
+        :param stream_actions: 边生成边解析，每行 Action 一结束就开始执行工具，与剩余的生成重叠；
+            需要 llm_client 提供 think_stream，每步的重叠时间记录在 step_stats 中
+        :param cancel_after_action: 流式模式下，第一个工具调用开始执行后即取消剩余的生成
+        """
         self.llm_client = llm_client
         self.tool_executor = tool_executor
         self.max_steps = max_steps
-        self.history = []
+        self.history_manager = history_manager or HistoryManager(tokenizer=getattr(llm_client, "tokenizer", None))
+        self._static_prompt = None # (question, 工具版本, 历史之前的部分, 历史之后的部分, 两者的 Token 数)
+        self.stream_actions = stream_actions and hasattr(llm_client, "think_stream")
+        if stream_actions and not self.stream_actions:
+            emit("agent.warning", "警告:LLM客户端不支持 think_stream，将等待完整回覆后再执行工具。")
+        self.cancel_after_action = cancel_after_action
+        self.step_stats = [] # 流式模式下每一步的生成耗时、工具耗时与两者重叠的时间
+
+    @property
+    def history(self):
+        """所有 Action 与 Observation 的原文。"""
+        return self.history_manager.lines
+
+    @history.setter
+    def history(self, lines):
+        """重置历史记录；传入非空的列表时按其中的 Action 与 Observation 行重建。"""
+        self.history_manager.load_lines(list(lines))
 
     def _parse_output(self, text: str):
-        """解析LLM的输出，提取Thought和Action。"""
+        """解析LLM的输出，提取Thought和所有的Action。"""
         thought_match = re.search(r"Thought: (.*)", text)
-        action_match = re.search(r"Action: (.*)", text)
         thought = thought_match.group(1).strip() if thought_match else None
-        action = action_match.group(1).strip() if action_match else None
-        return thought, action
+        actions = [action.strip() for action in re.findall(r"Action: (.*)", text) if action.strip()]
+        return thought, actions
 
     def _parse_action(self, action_text: str):
         """解析Action字符串，提取工具名称和输入。"""
@@ -44,87 +111,371 @@ class ReActAgent:
             return match.group(1), match.group(2)
         return None, None
 
-    def run(self, question: str):
+    def _get_static_prompt(self, question: str):
         """
-        运行ReAct智能体来回答一个问题。
+        提示词中除历史以外的部分（指令、工具列表与问题）在一次运行中不变，只在问题或工具注册表变化时重新生成。
+        本地客户端还会预先分词这部分，之后每一步只需对历史分词。
         """
-        self.history = [] # 每次运行时重置历史记录
-        current_step = 0
+        version = self.tool_executor.version
+        if self._static_prompt is None or self._static_prompt[:2] != (question, version):
+            head, tail = REACT_PROMPT_TEMPLATE.format(
+                tools=self.tool_executor.getAvailableTools(),
+                question=question,
+                history=HISTORY_SENTINEL
+            ).split(HISTORY_SENTINEL)
+            reserved_tokens = 0
+            if self.history_manager.token_budget is not None:
+                reserved_tokens = self.history_manager.count_tokens(head + tail)
+            if hasattr(self.llm_client, "pin_prefix"):
+                self.llm_client.pin_prefix(head)
+            self._static_prompt = (question, version, head, tail, reserved_tokens)
+        return self._static_prompt[2:]
 
-        while current_step < self.max_steps:
-            current_step += 1
-            print(f"--- 第 {current_step} 步 ---")
+    def _build_messages(self, question: str):
+        """格式化提示词，构造本轮调用LLM的消息。"""
+        with span("agent.build_prompt") as prompt_span:
+            head, tail, reserved_tokens = self._get_static_prompt(question)
+            prompt = head + self.history_manager.render(reserved_tokens) + tail
+            prompt_span.set(prompt_chars=len(prompt))
+            return [{"role": "user", "content": prompt}]
 
-            # 1. 格式化提示词
-            tools_desc = self.tool_executor.getAvailableTools()
-            history_str = "\n".join(self.history)
-            prompt = REACT_PROMPT_TEMPLATE.format(
-                tools=tools_desc,
-                question=question,
-                history=history_str
-            )
+    def _think_options(self):
+        """调用LLM时的参数；客户端开启了约束解码时，把已注册的工具名称交给它构造文法。"""
+        options = {"stop": REACT_STOP_SEQUENCES}
+        if getattr(self.llm_client, "constrained_decoding", False):
+            options["tool_names"] = list(self.tool_executor.tools)
+        return options
+
+    def _decide(self, response_text: str):
+        """
+        解析LLM的输出并决定下一步。
 
-            # 2. 调用LLM进行思考
-            messages = [{"role": "user", "content": prompt}]
-            response_text = self.llm_client.think(messages=messages)
-            
+        :return: ("abort", None) 终止流程；("skip", None) 跳过本轮；
+            ("finish", 最终答案)；("tools", [(action, tool_name, tool_input), ...])
+        """
+        with span("agent.parse"):
             if not response_text:
-                print("错误:LLM未能返回有效响应。")
-                break
-            else: 
-                print(f"Original Response: \n{response_text}\n")
-
-            # 3. 解析LLM的输出
-            thought, action = self._parse_output(response_text)
-            
+                emit("agent.error", "错误:LLM未能返回有效响应。")
+                return "abort", None
+            emit("agent.response", f"Original Response: \n{response_text}\n", chars=len(response_text))
+
+            thought, actions = self._parse_output(response_text)
+
             if thought:
-                print(f"💭 思考: {thought}")
+                emit("agent.thought", f"💭 思考: {thought}", thought=thought)
 
-            if not action:
-                print("警告:未能解析出有效的Action，流程终止。")
+            if not actions:
+                emit("agent.warning", "警告:未能解析出有效的Action，流程终止。")
+                return "abort", None
 
-            # 4. 执行Action
-            if action.startswith("Finish"):
+            if actions[0].startswith("Finish"):
                 # 如果是Finish指令，提取最终答案并结束
-                final_answer = re.match(r"Finish\[?(.*)\]?", action).group(1)
-                print(f"🎉 最终答案: {final_answer}")
-                return final_answer
-            
-            tool_name, tool_input = self._parse_action(action)
+                final_answer = re.match(r"Finish\[?(.*)\]?", actions[0]).group(1)
+                emit("agent.finish", f"🎉 最终答案: {final_answer}", answer=final_answer)
+                return "finish", final_answer
+
+            tool_calls = []
+            for action in actions:
+                if action.startswith("Finish"):
+                    # 尚未看到本轮工具的观察结果，此时的 Finish 为时过早，忽略
+                    break
+                tool_name, tool_input = self._parse_action(action)
+                if not tool_name or not tool_input:
+                    # ... 处理无效Action格式 ...
+                    continue
+                emit("agent.action", f"🎬 行动: {tool_name}[{tool_input}]", tool=tool_name, input=tool_input)
+                tool_calls.append((action, tool_name, tool_input))
+
+            if not tool_calls:
+                return "skip", None
+            return "tools", tool_calls
+
+    def _record(self, tool_calls, observations):
+        """将本轮所有的Action及其Observation按顺序添加到历史记录中。"""
+        for (action, _, _), observation in zip(tool_calls, observations):
+            emit("agent.observation", f"👀 观察: \n{observation}", chars=len(str(observation)))
+            self.history_manager.add(action, observation)
+
+    def _report_history(self):
+        """打印本次运行中历史压缩节省的 Token 数。"""
+        report = self.history_manager.report()
+        if report["tokens_saved"] > 0:
+            emit("agent.history", f"🧹 历史压缩: 截断 {report['truncations']} 次, 摘要 {report['summaries']} 次, "
+                 f"共节省 {report['tokens_saved']} 个提示词 Token", **report)
+
+    def _dispatch_events(self, events, submit, dispatched) -> bool:
+        """
+        流式模式下处理解析出的事件：按 _decide 的规则把有效的工具调用立即交给 submit 执行。
+        提前执行的调用与 _decide 最终给出的 tool_calls 按顺序一一对应。
+
+        :param dispatched: 已提交的调用 [(action, 句柄, 提交时刻)]，新提交的会追加进去
+        :return: 是否不再需要后续的输出（出现 Finish，或 cancel_after_action 时已提交了工具调用）
+        """
+        for kind, value in events:
+            if kind != "action":
+                continue
+            if value.startswith("Finish"):
+                # 第一行即 Finish 时之后的内容都用不到；否则之后的 Action 本来就会被忽略
+                return True
+            tool_name, tool_input = self._parse_action(value)
             if not tool_name or not tool_input:
-                # ... 处理无效Action格式 ...
                 continue
+            dispatched.append((value, submit(tool_name, tool_input), time.perf_counter()))
+            if self.cancel_after_action:
+                return True
+        return False
+
+    def _overlap_stats(self, step: int, started: float, generation_end: float, dispatched, finished_at) -> dict:
+        """
+        统计一步中工具执行与生成重叠的时间：每个工具从提交到完成（或生成结束）之间的时长之和。
 
-            print(f"🎬 行动: {tool_name}[{tool_input}]")
-            
-            tool_function = self.tool_executor.getTool(tool_name)
-            if not tool_function:
-                observation = f"错误:未找到名为 '{tool_name}' 的工具。"
+        :param finished_at: 工具在 dispatched 中的下标 -> 完成时刻，尚未记录的视为在生成结束之后完成
+        """
+        overlap = sum(
+            max(0.0, min(generation_end, finished_at.get(i, generation_end)) - submitted)
+            for i, (_, _, submitted) in enumerate(dispatched)
+        ) if dispatched else 0.0
+        stats = {
+            "step": step,
+            "generation_s": generation_end - started,
+            "tool_calls": len(dispatched),
+            "tools_s": time.perf_counter() - dispatched[0][2] if dispatched else 0.0,
+            "overlap_s": overlap,
+        }
+        self.step_stats.append(stats)
+        if dispatched:
+            emit("agent.overlap", f"⏱️ 工具与生成重叠 {overlap:.2f} 秒 (生成 {stats['generation_s']:.2f} 秒, "
+                 f"{len(dispatched)} 个工具提前开始执行)", **stats)
+        return stats
+
+    def _match_dispatched(self, tool_calls, dispatched, submit):
+        """按顺序取出与 tool_calls 对应的提前提交的句柄，对应不上的（如同一段输出中被取消的部分）此时才提交。"""
+        handles = []
+        for i, (action, tool_name, tool_input) in enumerate(tool_calls):
+            if i < len(dispatched) and dispatched[i][0] == action:
+                handles.append(dispatched[i][1])
             else:
-                observation = tool_function(tool_input) # 调用真实工具
-            
-            print(f"👀 观察: \n{observation}")
-            
-            # 将本轮的Action和Observation添加到历史记录中
-            self.history.append(f"Action: {action}")
-            self.history.append(f"Observation: {observation}")
-
-        # 循环结束
-        print("已达到最大步数，流程终止。")
-        return None
+                handles.append(submit(tool_name, tool_input))
+        return handles
+
+    def _stream_step(self, messages, step: int):
+        """
+        流式模式的一步：边生成边解析，每行 Action 一结束就把工具调用提交到线程池，与剩余的生成重叠执行。
+        是否结束、执行哪些工具仍由 _decide 根据（可能被提前截断的）完整输出决定。
+
+        :return: (decision, payload, observations)，只有 decision 为 "tools" 时 observations 不为 None
+        """
+        parser = StreamingReActParser()
+        dispatched, finished_at = [], {}
+
+        def submit(tool_name, tool_input):
+            index = len(dispatched)
+            future = self.tool_executor.submitTool(tool_name, tool_input)
+            future.add_done_callback(lambda _: finished_at.setdefault(index, time.perf_counter()))
+            return future
+
+        started = time.perf_counter()
+        chunks = []
+        stream = self.llm_client.think_stream(messages=messages, **self._think_options())
+        try:
+            for chunk in stream:
+                chunks.append(chunk)
+                if self._dispatch_events(parser.feed(chunk), submit, dispatched):
+                    break
+            else:
+                self._dispatch_events(parser.close(), submit, dispatched)
+        except Exception as e:
+            emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", error=str(e))
+            chunks = []
+        finally:
+            stream.close() # 提前退出时取消剩余的生成
+        generation_end = time.perf_counter()
+
+        decision, payload = self._decide("".join(chunks))
+        observations = None
+        if decision == "tools":
+            handles = self._match_dispatched(payload, dispatched, self.tool_executor.submitTool)
+            observations = [future.result() for future in handles]
+        else:
+            for _, future, _ in dispatched:
+                future.cancel() # 输出最终无效（如调用出错）时不再需要提前开始的工具
+        self._overlap_stats(step, started, generation_end, dispatched, finished_at)
+        return decision, payload, observations
+
+    async def _astream_step(self, messages, step: int):
+        """
+        _stream_step 的协程版本：工具调用以 asyncio 任务的形式提前开始。
+        """
+        parser = StreamingReActParser()
+        dispatched, finished_at = [], {}
+
+        def submit(tool_name, tool_input):
+            index = len(dispatched)
+            task = asyncio.ensure_future(self._aexecute(tool_name, tool_input))
+            task.add_done_callback(lambda _: finished_at.setdefault(index, time.perf_counter()))
+            return task
+
+        started = time.perf_counter()
+        chunks = []
+        stream = self.llm_client.think_stream(messages=messages, **self._think_options())
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                if self._dispatch_events(parser.feed(chunk), submit, dispatched):
+                    break
+            else:
+                self._dispatch_events(parser.close(), submit, dispatched)
+        except Exception as e:
+            emit("llm.error", f"❌ 调用LLM API时发生错误: {e}", error=str(e))
+            chunks = []
+        finally:
+            await stream.aclose()
+        generation_end = time.perf_counter()
+
+        decision, payload = self._decide("".join(chunks))
+        observations = None
+        if decision == "tools":
+            handles = self._match_dispatched(
+                payload, dispatched, lambda tool_name, tool_input: self._aexecute(tool_name, tool_input)
+            )
+            observations = list(await asyncio.gather(*handles))
+        else:
+            for _, task, _ in dispatched:
+                task.cancel()
+        self._overlap_stats(step, started, generation_end, dispatched, finished_at)
+        return decision, payload, observations
+
+    async def _aexecute(self, tool_name: str, tool_input: str) -> str:
+        """arun 中执行单个工具：协程工具直接 await，同步工具放到线程中执行，出错时都返回错误描述作为 Observation。"""
+        return await self.tool_executor.aexecuteTool(tool_name, tool_input)
+
+    def run(self, question: str):
+        """
+        运行ReAct智能体来回答一个问题。
+        """
+        with span("agent.run", question=question[:200]) as run_span:
+            self.history_manager.reset() # 每次运行时重置历史记录
+            self.step_stats = []
+            current_step = 0
+
+            while current_step < self.max_steps:
+                current_step += 1
+                emit("agent.step", f"--- 第 {current_step} 步 ---", step=current_step)
+                with span("agent.step", step=current_step) as step_span:
+                    # 1. 格式化提示词
+                    messages = self._build_messages(question)
+
+                    # 2. 调用LLM进行思考并解析输出；流式模式下工具在生成过程中就已开始执行
+                    observations = None
+                    if self.stream_actions:
+                        decision, payload, observations = self._stream_step(messages, current_step)
+                    else:
+                        response_text = self.llm_client.think(
+                            messages=messages,
+                            **self._think_options()
+                        )
+                        decision, payload = self._decide(response_text)
+
+                    # 3. 根据解析结果决定下一步
+                    step_span.set(decision=decision)
+                    if decision == "abort":
+                        break
+                    if decision == "finish":
+                        self._report_history()
+                        run_span.set(steps=current_step, answered=True)
+                        return payload
+                    if decision == "skip":
+                        continue
+
+                    # 4. 执行Action，同一轮的多个工具调用并行执行
+                    if observations is None:
+                        with span("agent.tools", tool_calls=len(payload)):
+                            observations = self.tool_executor.executeBatch([
+                                (tool_name, tool_input) for _, tool_name, tool_input in payload
+                            ])
+
+                    self._record(payload, observations)
+
+            # 循环结束
+            emit("agent.max_steps", "已达到最大步数，流程终止。", max_steps=self.max_steps)
+            self._report_history()
+            run_span.set(steps=current_step, answered=False)
+            return None
+
+    async def arun(self, question: str):
+        """
+        run 的协程版本：等待LLM与工具调用时让出事件循环，便于在同一进程中并发驱动多个智能体。
+        llm_client 需提供 async think（如 HelloAgentsLLM_Async）；同步工具会被放到线程池中执行。
+        每个 ReActAgent 实例同一时间只应运行一个 arun，并发时请为每个任务创建独立的实例并共用 llm_client。
+        """
+        with span("agent.run", question=question[:200]) as run_span:
+            self.history_manager.reset() # 每次运行时重置历史记录
+            self.step_stats = []
+            current_step = 0
+
+            while current_step < self.max_steps:
+                current_step += 1
+                emit("agent.step", f"--- 第 {current_step} 步 ---", step=current_step)
+                with span("agent.step", step=current_step) as step_span:
+                    # 1. 格式化提示词（压缩历史时可能同步调用 summarizer，放到线程中执行）
+                    if self.history_manager.summarizer:
+                        messages = await asyncio.to_thread(self._build_messages, question)
+                    else:
+                        messages = self._build_messages(question)
+
+                    # 2. 调用LLM进行思考并解析输出；流式模式下工具在生成过程中就已开始执行
+                    observations = None
+                    if self.stream_actions:
+                        decision, payload, observations = await self._astream_step(messages, current_step)
+                    else:
+                        response_text = await self.llm_client.think(
+                            messages=messages,
+                            **self._think_options()
+                        )
+                        decision, payload = self._decide(response_text)
+
+                    # 3. 根据解析结果决定下一步
+                    step_span.set(decision=decision)
+                    if decision == "abort":
+                        break
+                    if decision == "finish":
+                        self._report_history()
+                        run_span.set(steps=current_step, answered=True)
+                        return payload
+                    if decision == "skip":
+                        continue
+
+                    # 4. 执行Action，同一轮的多个工具调用并发执行
+                    if observations is None:
+                        with span("agent.tools", tool_calls=len(payload)):
+                            observations = await asyncio.gather(*[
+                                self._aexecute(tool_name, tool_input) for _, tool_name, tool_input in payload
+                            ])
+
+                    self._record(payload, observations)
+
+            # 循环结束
+            emit("agent.max_steps", "已达到最大步数，流程终止。", max_steps=self.max_steps)
+            self._report_history()
+            run_span.set(steps=current_step, answered=False)
+            return None
 
 # 示例
 if __name__ == "__main__":
     from tools.Search_by_SerpApi import search
 
-    llm = HelloAgentsLLM_Local()
+    from HistoryManager import llm_summarizer
+
+    llm = get_llm("local", use_prefix_cache=True)
 
     tool = ToolExecutor()
     tool.registerTool(
         search, 
         "一个网页搜索引擎。当你需要回答有關 即時性資訊 或 進行事實驗證時使用此工具，如：獲取當前時間、即時熱點事件等。")
 
-    agent = ReActAgent(llm, tool, 5)
+    # 搜索结果很长，限制提示词预算，较早的 Observation 会被截断或摘要
+    history_manager = HistoryManager(token_budget=4096, tokenizer=llm.tokenizer, summarizer=llm_summarizer(llm))
+    agent = ReActAgent(llm, tool, 5, history_manager)
 
     # initial_promt = input("You: ")
     # agent.run(initial_promt)
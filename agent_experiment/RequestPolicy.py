@@ -0,0 +1,286 @@
+import asyncio
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Callable, Dict, Optional
+
+try:
+    from .Tracing import emit
+except ImportError: # 在 agent_experiment 目录下直接导入时
+    from Tracing import emit
+
+class FirstTokenTimeout(TimeoutError):
+    """在首 Token 截止时间内没有收到任何内容。"""
+
+# 值得重试的 HTTP 状态码：请求超时、冲突、限流，以及所有 5xx
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+def is_retryable(error: Exception) -> bool:
+    """
+    判断一次失败是否值得重试：连接错误、超时与服务端错误可以重试，参数错误、鉴权失败等重试也无济于事。
+    """
+    if isinstance(error, (FirstTokenTimeout, TimeoutError, ConnectionError)):
+        return True
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        # openai 的连接错误与超时没有状态码
+        return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+    return status_code in RETRYABLE_STATUS_CODES or status_code >= 500
+
+class RequestPolicy:
+    """
+    LLM 流式请求的重试与对冲策略，只作用于"发起请求直到收到首个片段"这一段：
+    一旦开始输出内容，中途出错不再重试（已输出的内容无法撤回）。
+
+    - 失败或超过首 Token 截止时间时，按带抖动的指数退避（full jitter）等待后重试；
+    - 开启对冲时，首 Token 等待超过近期 TTFT 的 p95 仍未到达，就再发一个相同的请求，谁先开始输出就用谁，另一个随即关闭。
+
+    :param max_retries: 首次请求之外最多重试的次数
+    :param backoff_base: 第 n 次重试前的等待时间在 [0, backoff_base * 2^n] 中均匀抽取
+    :param backoff_max: 单次等待时间的上限（秒）
+    :param ttft_deadline: 首 Token 截止时间（秒），None 表示只受客户端超时限制
+    :param hedge: 是否发送对冲请求
+    :param hedge_quantile: 以近期 TTFT 的该分位数作为发送对冲请求的等待时间
+    :param hedge_min_samples: TTFT 样本少于该数量时不对冲（分位数还不可靠）
+    :param hedge_delay: 固定的对冲等待时间（秒），提供时不再根据分位数计算
+    :param window: 计算分位数时保留的最近 TTFT 样本数
+    """
+    def __init__(self, max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 ttft_deadline: float = None, hedge: bool = False, hedge_quantile: float = 0.95,
+                 hedge_min_samples: int = 20, hedge_delay: float = None, window: int = 200):
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.ttft_deadline = ttft_deadline
+        self.hedge = hedge
+        self.hedge_quantile = hedge_quantile
+        self.hedge_min_samples = hedge_min_samples
+        self.hedge_delay = hedge_delay
+        self._ttfts = deque(maxlen=window)
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                      "ttft_timeouts": 0, "errors": 0}
+
+    def backoff(self, retry: int) -> float:
+        """第 retry 次重试（从 0 开始）前的等待时间。"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** retry))
+
+    def record_ttft(self, seconds: float):
+        with self._lock:
+            self._ttfts.append(seconds)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """近期 TTFT 的分位数（q 取 0~1），没有样本时返回 None。"""
+        with self._lock:
+            samples = sorted(self._ttfts)
+        if not samples:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def hedge_after(self) -> Optional[float]:
+        """发送对冲请求前等待的时间，None 表示本次不对冲。"""
+        if not self.hedge:
+            return None
+        if self.hedge_delay is not None:
+            return self.hedge_delay
+        with self._lock:
+            if len(self._ttfts) < self.hedge_min_samples:
+                return None
+        return self.percentile(self.hedge_quantile)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def _deadline_error(self) -> FirstTokenTimeout:
+        self._count("ttft_timeouts")
+        return FirstTokenTimeout(f"{self.ttft_deadline:.2f} 秒内未收到首个 Token")
+
+    def open_stream(self, open_fn: Callable):
+        """
+        按策略发起流式请求，直到收到首个非空片段。
+
+        :param open_fn: 发起一次请求的函数，返回 (response, 片段迭代器)；response 需提供 close()
+        :return: (response, 首个片段, 之后片段的迭代器)
+        """
+        self._count("requests")
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff(attempt - 1)
+                self._count("retries")
+                emit("llm.retry", f"🔁 第 {attempt} 次重试，{delay:.2f} 秒后重新请求 ({last_error})",
+                     attempt=attempt, delay_s=delay, error=str(last_error))
+                time.sleep(delay)
+            try:
+                return self._race(open_fn)
+            except Exception as e:
+                self._count("errors")
+                if not is_retryable(e):
+                    raise
+                last_error = e
+        raise last_error
+
+    def _race(self, open_fn: Callable):
+        """
+        一轮请求：先发一个，必要时再发一个对冲请求，返回最先开始输出的那个，其余的都关闭。
+        每个请求在各自的线程中阻塞等待首个片段。
+        """
+        results = queue.Queue()
+        state = {"done": False}
+        lock = threading.Lock()
+
+        def attempt(hedged: bool):
+            started = time.perf_counter()
+            try:
+                response, contents = open_fn()
+                first = ""
+                for content in contents:
+                    if content:
+                        first = content
+                        break
+                result = (response, first, contents, hedged, time.perf_counter() - started, None)
+            except Exception as e:
+                result = (None, None, None, hedged, None, e)
+            with lock:
+                if not state["done"]:
+                    results.put(result)
+                    return
+            if result[0] is not None:
+                result[0].close() # 已经有别的请求胜出，或这一轮已放弃
+
+        def launch(hedged: bool):
+            self._count("attempts")
+            threading.Thread(target=attempt, args=(hedged,), daemon=True).start()
+
+        def finish():
+            # 之后到达的请求由各自的线程关闭，已经在队列中的在这里关闭
+            with lock:
+                state["done"] = True
+            while not results.empty():
+                response = results.get_nowait()[0]
+                if response is not None:
+                    response.close()
+
+        start = time.perf_counter()
+        deadline = start + self.ttft_deadline if self.ttft_deadline else None
+        hedge_after = self.hedge_after()
+        hedge_at = start + hedge_after if hedge_after is not None else None
+        launch(hedged=False)
+        pending, error = 1, None
+        while pending:
+            wake_at = min([t for t in (deadline, hedge_at) if t is not None], default=None)
+            try:
+                result = results.get(timeout=None if wake_at is None else max(0.0, wake_at - time.perf_counter()))
+            except queue.Empty:
+                if hedge_at is not None and time.perf_counter() >= hedge_at:
+                    hedge_at = None
+                    self._count("hedges")
+                    emit("llm.hedge", f"🪁 {hedge_after:.2f} 秒内未收到首个 Token，发送对冲请求", delay_s=hedge_after)
+                    launch(hedged=True)
+                    pending += 1
+                    continue
+                finish()
+                raise self._deadline_error()
+            pending -= 1
+            response, first, contents, hedged, ttft, error = result
+            if error is not None:
+                continue # 另一个请求可能仍会成功
+            finish()
+            self.record_ttft(ttft)
+            if hedged:
+                self._count("hedge_wins")
+            return response, first, contents
+        finish()
+        raise error
+
+    async def aopen_stream(self, open_fn: Callable):
+        """
+        open_stream 的协程版本，open_fn 为返回 (response, 异步片段迭代器) 的协程函数，response 需提供 async close()。
+        """
+        self._count("requests")
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                delay = self.backoff(attempt - 1)
+                self._count("retries")
+                emit("llm.retry", f"🔁 第 {attempt} 次重试，{delay:.2f} 秒后重新请求 ({last_error})",
+                     attempt=attempt, delay_s=delay, error=str(last_error))
+                await asyncio.sleep(delay)
+            try:
+                return await self._arace(open_fn)
+            except Exception as e:
+                self._count("errors")
+                if not is_retryable(e):
+                    raise
+                last_error = e
+        raise last_error
+
+    async def _arace(self, open_fn: Callable):
+        """_race 的协程版本，每个请求是一个 asyncio 任务。"""
+        async def attempt():
+            started = time.perf_counter()
+            response, contents = await open_fn()
+            try:
+                first = ""
+                async for content in contents:
+                    if content:
+                        first = content
+                        break
+            except BaseException:
+                await response.close()
+                raise
+            return response, first, contents, time.perf_counter() - started
+
+        async def finish(tasks):
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    await task.result()[0].close()
+
+        def launch():
+            self._count("attempts")
+            return asyncio.ensure_future(attempt())
+
+        start = time.perf_counter()
+        deadline = start + self.ttft_deadline if self.ttft_deadline else None
+        hedge_after = self.hedge_after()
+        hedge_at = start + hedge_after if hedge_after is not None else None
+        pending = {launch()}
+        hedge_task, error = None, None
+        while pending:
+            wake_at = min([t for t in (deadline, hedge_at) if t is not None], default=None)
+            timeout = None if wake_at is None else max(0.0, wake_at - time.perf_counter())
+            done, pending = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                if hedge_at is not None and time.perf_counter() >= hedge_at:
+                    hedge_at = None
+                    self._count("hedges")
+                    emit("llm.hedge", f"🪁 {hedge_after:.2f} 秒内未收到首个 Token，发送对冲请求", delay_s=hedge_after)
+                    hedge_task = launch()
+                    pending.add(hedge_task)
+                    continue
+                await finish(pending)
+                raise self._deadline_error()
+            for task in done:
+                if task.exception() is not None:
+                    error = task.exception()
+                    continue
+                await finish((pending | done) - {task})
+                response, first, contents, ttft = task.result()
+                self.record_ttft(ttft)
+                if task is hedge_task:
+                    self._count("hedge_wins")
+                return response, first, contents
+        raise error
+
+    def report(self) -> Dict:
+        """统计信息以及当前的 TTFT 分位数。"""
+        with self._lock:
+            report = dict(self.stats)
+        report["ttft_p50"] = self.percentile(0.5)
+        report["ttft_p95"] = self.percentile(0.95)
+        return report
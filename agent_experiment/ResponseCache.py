@@ -0,0 +1,85 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+# 默认的缓存文件位置
+DEFAULT_RESPONSE_CACHE_PATH = Path(__file__).parent / ".cache" / "llm_responses.sqlite"
+
+class ResponseCache:
+    """
+    确定性的 LLM 响应缓存，存储在 SQLite 文件中。
+    以 模型ID + messages + 采样参数 的哈希作为键，值为按原始顺序保存的流式 chunk 列表，
+    命中时可以按原路径重新"播放"一遍流式输出。总大小超过 max_bytes 时淘汰最久未访问的条目。
+    """
+    def __init__(self, path: Path = DEFAULT_RESPONSE_CACHE_PATH, max_bytes: int = 64 * 1024 * 1024):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, chunks TEXT, size INTEGER, last_access REAL)"
+            )
+
+    @staticmethod
+    def make_key(model: str, messages: List[Dict[str, str]], **params) -> str:
+        """
+        计算缓存键。params 为所有会影响输出的采样参数（temperature、stop、max_new_tokens 等）。
+        """
+        payload = json.dumps(
+            {"model": model, "messages": messages, "params": params},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[List[str]]:
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT chunks FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+
+    def put(self, key: str, chunks: List[str]):
+        data = json.dumps(chunks, ensure_ascii=False, separators=(",", ":"))
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)",
+                (key, data, len(data.encode("utf-8")), time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        """
+        按最近访问时间从旧到新删除条目，直到总大小不超过 max_bytes。
+        """
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        stale_keys = []
+        for key, size in rows:
+            if total <= self.max_bytes:
+                break
+            stale_keys.append((key,))
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", stale_keys)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": total}
+
+    def clear(self):
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM responses")
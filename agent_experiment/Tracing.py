@@ -0,0 +1,229 @@
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+# --- 事件输出 ---
+# 智能体、LLM 客户端与工具执行器的运行信息都经由 emit 发出，默认打印到控制台，与原先的 print 输出一致。
+# sink 的签名为 sink(event, message, end, fields)：
+#   event   事件类型，如 "agent.thought"、"llm.delta"、"tool.register"
+#   message 面向人的文本（原先 print 的内容），end 为其结尾（流式输出的片段为 ""）
+#   fields  结构化字段，如 {"step": 1}、{"tool": "search"}
+
+def console_sink(event: str, message: str, end: str, fields: Dict):
+    print(message, end=end, flush=not end)
+
+_event_sink: Optional[Callable] = console_sink
+
+def set_event_sink(sink: Optional[Callable]) -> Optional[Callable]:
+    """
+    替换事件输出，返回原来的 sink；None 表示丢弃所有事件。
+    """
+    global _event_sink
+    previous, _event_sink = _event_sink, sink
+    return previous
+
+def emit(event: str, message: str = "", end: str = "\n", trace: bool = True, **fields):
+    """
+    发出一个事件：交给当前的 sink，开启追踪时同时记录到当前的 span 中。
+
+    :param trace: 是否记录到 span 中；流式输出的每个片段等高频事件应传 False
+    """
+    sink = _event_sink
+    if sink is not None:
+        sink(event, message, end, fields)
+    if trace and _tracer is not None:
+        current = _current_span.get()
+        if current is not None:
+            current.event(event, **(fields or {"message": message[:200]}))
+
+# --- 追踪 ---
+
+class Span:
+    """
+    一段计时区间。作为上下文管理器使用时成为当前 span，其间创建的 span 以它为父节点；
+    在生成器中使用时改用 Tracer.start_span / finish，不改变当前 span。
+    """
+    __slots__ = ("tracer", "name", "category", "span_id", "parent_id", "thread_id", "start", "end",
+                 "attributes", "events", "_token")
+
+    def __init__(self, tracer: "Tracer", name: str, category: str, parent_id: Optional[int], attributes: Dict):
+        self.tracer = tracer
+        self.name = name
+        self.category = category
+        self.span_id = next(tracer._ids)
+        self.parent_id = parent_id
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+        self.attributes = attributes
+        self.events: List[Dict] = []
+        self._token = None
+
+    @property
+    def duration(self) -> Optional[float]:
+        return None if self.end is None else self.end - self.start
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def event(self, name: str, **fields):
+        self.events.append({"name": name, "time": time.perf_counter(), "fields": fields})
+
+    def finish(self):
+        if self.end is None:
+            self.end = time.perf_counter()
+            self.tracer._record(self)
+
+    def __enter__(self) -> "Span":
+        self._token = _current_span.set(self)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is not None:
+            self.attributes["error"] = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self._token)
+        self.finish()
+        return False
+
+class _NoopSpan:
+    """追踪关闭时使用的空 span，所有操作都不做任何事。"""
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def event(self, name: str, **fields):
+        pass
+
+    def finish(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NOOP_SPAN = _NoopSpan()
+
+class Tracer:
+    """
+    收集一次或多次运行中的所有 span，可导出为 JSONL（每行一个 span）或 Chrome 追踪格式
+    （在 chrome://tracing 或 https://ui.perfetto.dev 中打开）。线程安全。
+    """
+    def __init__(self):
+        self.spans: List[Span] = []
+        self.origin = time.perf_counter()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def start_span(self, name: str, category: str = "agent", **attributes) -> Span:
+        parent = _current_span.get()
+        return Span(self, name, category, parent.span_id if parent is not None else None, attributes)
+
+    def _record(self, span: Span):
+        with self._lock:
+            self.spans.append(span)
+
+    def _span_dict(self, span: Span) -> Dict:
+        return {
+            "name": span.name,
+            "category": span.category,
+            "span_id": span.span_id,
+            "parent_id": span.parent_id,
+            "thread_id": span.thread_id,
+            "start_s": span.start - self.origin,
+            "duration_s": span.duration,
+            "attributes": span.attributes,
+            "events": [
+                {"name": event["name"], "time_s": event["time"] - self.origin, **event["fields"]}
+                for event in span.events
+            ],
+        }
+
+    def export_jsonl(self, path):
+        """每行一个 span，按开始时间排序。"""
+        with self._lock:
+            spans = sorted(self.spans, key=lambda span: span.start)
+        with open(path, "w", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(self._span_dict(span), ensure_ascii=False, default=str) + "\n")
+
+    def export_chrome(self, path):
+        """导出为 Chrome 追踪格式（Trace Event Format），时间单位为微秒。"""
+        pid = os.getpid()
+        trace_events = []
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            trace_events.append({
+                "name": span.name, "cat": span.category, "ph": "X", "pid": pid, "tid": span.thread_id,
+                "ts": (span.start - self.origin) * 1e6, "dur": span.duration * 1e6,
+                "args": {"span_id": span.span_id, "parent_id": span.parent_id, **span.attributes},
+            })
+            for event in span.events:
+                trace_events.append({
+                    "name": event["name"], "cat": span.category, "ph": "i", "s": "t", "pid": pid,
+                    "tid": span.thread_id, "ts": (event["time"] - self.origin) * 1e6, "args": event["fields"],
+                })
+        Path(path).write_text(json.dumps({"traceEvents": trace_events}, ensure_ascii=False, default=str),
+                              encoding="utf-8")
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """按 span 名称汇总次数与耗时（秒）。"""
+        with self._lock:
+            spans = list(self.spans)
+        summary = {}
+        for span in spans:
+            stats = summary.setdefault(span.name, {"count": 0, "total_s": 0.0, "max_s": 0.0})
+            stats["count"] += 1
+            stats["total_s"] += span.duration
+            stats["max_s"] = max(stats["max_s"], span.duration)
+        for stats in summary.values():
+            stats["mean_s"] = stats["total_s"] / stats["count"]
+        return summary
+
+_tracer: Optional[Tracer] = None
+_current_span: contextvars.ContextVar = contextvars.ContextVar("current_span", default=None)
+
+def enable_tracing(tracer: Tracer = None) -> Tracer:
+    """开启追踪（进程内全局生效），返回收集 span 的 Tracer。"""
+    global _tracer
+    _tracer = tracer or Tracer()
+    return _tracer
+
+def disable_tracing() -> Optional[Tracer]:
+    """关闭追踪，返回之前的 Tracer。"""
+    global _tracer
+    previous, _tracer = _tracer, None
+    return previous
+
+def tracing_enabled() -> bool:
+    return _tracer is not None
+
+def current_span():
+    """当前的 span，没有或追踪关闭时返回空 span，可直接调用 set / event。"""
+    if _tracer is None:
+        return NOOP_SPAN
+    current = _current_span.get()
+    return current if current is not None else NOOP_SPAN
+
+def span(name: str, category: str = "agent", **attributes):
+    """
+    创建一个作为上下文管理器使用的 span；追踪关闭时返回空 span，几乎没有开销。
+    """
+    tracer = _tracer
+    if tracer is None:
+        return NOOP_SPAN
+    return tracer.start_span(name, category, **attributes)
+
+def start_span(name: str, category: str = "agent", **attributes):
+    """
+    创建一个不成为当前 span 的 span，需手动调用 finish()；用于生成器等跨越多次调用的区间。
+    """
+    return span(name, category, **attributes)
@@ -0,0 +1,71 @@
+# ReActAgent.arun 并发基准：在同一个事件循环中驱动多个智能体，与逐个同步运行 run 对比总耗时
+# 使用本地桩服务器模拟 LLM，使用带固定延迟的假工具模拟网络 I/O
+# 用法: python agent_experiment/benchmarks/bench_async_agents.py [--agents 100] [--llm-latency 0.2]
+
+import argparse
+import asyncio
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LLMClient import HelloAgentsLLM, HelloAgentsLLM_Async
+from ReAct_Agent import ReActAgent
+from tools.ToolExecutor import ToolExecutor
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+TOOL_LATENCY = 0.1
+
+def get_weather(city: str) -> str:
+    """假天气工具，固定延迟模拟网络请求。"""
+    time.sleep(TOOL_LATENCY)
+    return f"{city}当前天气:晴，气温25摄氏度"
+
+def build_tools() -> ToolExecutor:
+    tools = ToolExecutor()
+    tools.registerTool(get_weather, "查询指定城市的实时天气。")
+    return tools
+
+def run_sync(base_url: str, num_agents: int) -> float:
+    llm = HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=base_url)
+    tools = build_tools()
+    start = time.perf_counter()
+    for _ in range(num_agents):
+        assert ReActAgent(llm, tools).run("北京今天适合去哪里玩？")
+    return time.perf_counter() - start
+
+async def run_async(base_url: str, num_agents: int) -> float:
+    # 所有智能体共用一个客户端，也就共用同一个连接池
+    llm = HelloAgentsLLM_Async(model="stub-model", apiKey="stub", baseUrl=base_url, max_connections=num_agents)
+    tools = build_tools()
+    start = time.perf_counter()
+    answers = await asyncio.gather(*[
+        ReActAgent(llm, tools).arun("北京今天适合去哪里玩？")
+        for _ in range(num_agents)
+    ])
+    elapsed = time.perf_counter() - start
+    await llm.close()
+    assert all(answers)
+    return elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ReActAgent.arun 并发基准")
+    parser.add_argument("--agents", type=int, default=100)
+    parser.add_argument("--sync-agents", type=int, default=5, help="同步基线只跑少量智能体，再按比例折算")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="桩服务器的首 Token 延迟（秒）")
+    args = parser.parse_args()
+
+    with StubOpenAIServer(first_token_delay=args.llm_latency) as stub:
+        # 智能体的过程输出非常多，基准期间不打印
+        with contextlib.redirect_stdout(io.StringIO()):
+            sync_elapsed = run_sync(stub.base_url, args.sync_agents)
+            async_elapsed = asyncio.run(run_async(stub.base_url, args.agents))
+
+    per_agent_sync = sync_elapsed / args.sync_agents
+    print("--- ReActAgent 并发基准 ---")
+    print(f"同步 run   : {args.sync_agents} 个智能体 {sync_elapsed:.2f}s (每个 {per_agent_sync:.3f}s, "
+          f"{args.agents} 个约需 {per_agent_sync * args.agents:.1f}s)")
+    print(f"异步 arun  : {args.agents} 个智能体 {async_elapsed:.2f}s")
+    print(f"加速比     : {per_agent_sync * args.agents / async_elapsed:.1f}x")
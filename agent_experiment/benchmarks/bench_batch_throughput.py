@@ -0,0 +1,49 @@
+# HelloAgentsLLM_Local.think_batch 吞吐量基准：比较不同批次大小下的 tokens/s
+# 用法: python agent_experiment/benchmarks/bench_batch_throughput.py [--model Qwen/Qwen3-0.6B] [--max-new-tokens 64]
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LocalLLMClient import HelloAgentsLLM_Local
+
+PROMPTS = [
+    "请用一句话介绍北京。",
+    "快速排序的时间复杂度是多少？",
+    "今天深圳下雨，推荐一个室内景点。",
+    "解释一下什么是 ReAct 智能体。",
+    "Dell 和 Lenovo 的笔记本各有什么优势？",
+    "写一个 Python 函数判断回文字符串。",
+    "为什么天空是蓝色的？",
+    "给出三个提高睡眠质量的建议。",
+]
+
+def run_benchmark(llm: HelloAgentsLLM_Local, batch_sizes, max_new_tokens: int):
+    results = []
+    # 预热一次，避免首次调用的初始化开销计入结果
+    llm.think_batch([[{"role": "user", "content": PROMPTS[0]}]], max_new_tokens=4)
+
+    for batch_size in batch_sizes:
+        list_of_messages = [
+            [{"role": "user", "content": PROMPTS[i % len(PROMPTS)]}]
+            for i in range(batch_size)
+        ]
+        llm.think_batch(list_of_messages, max_new_tokens=max_new_tokens)
+        results.append(dict(llm.batch_stats))
+    return results
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="think_batch 吞吐量基准")
+    parser.add_argument("--model", default="Qwen/Qwen3-0.6B")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 16, 32])
+    args = parser.parse_args()
+
+    llm = HelloAgentsLLM_Local(args.model)
+    results = run_benchmark(llm, args.batch_sizes, args.max_new_tokens)
+
+    print("\n--- think_batch 吞吐量 ---")
+    print(f"{'batch':>6} {'tokens':>8} {'秒':>8} {'tokens/s':>10}")
+    for stats in results:
+        print(f"{stats['batch_size']:>6} {stats['generated_tokens']:>8} {stats['elapsed']:>8.2f} {stats['tokens_per_s']:>10.1f}")
@@ -0,0 +1,83 @@
+# Cassette 录制/回放基准：先对桩服务器与带延迟的假工具录制一次完整的 ReActAgent 运行，
+# 关闭桩服务器后再分别按录制时的节奏与尽快回放，检查答案与历史完全一致，并报告各自的耗时与 cassette 文件大小。
+# 尽快回放时的耗时只剩框架本身的开销，可用于在相同输入上比较优化前后的差异
+# 用法: python agent_experiment/benchmarks/bench_cassette_replay.py [--cassette /tmp/react.cassette.jsonl.gz] [--replays 20]
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from Cassette import Cassette
+from LLMClient import HelloAgentsLLM
+from ReAct_Agent import ReActAgent
+from tools.ToolExecutor import ToolExecutor
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+QUESTION = "北京和上海今天哪个城市更适合出游？"
+TOOL_LATENCY = 0.15
+
+def responder(messages):
+    """第一步并行查询两个城市的天气，第二步搜索景点，之后给出答案。"""
+    prompt = messages[-1]["content"]
+    if "Observation:" not in prompt:
+        return "Thought: 需要分别查询北京和上海的天气。\nAction: get_weather[北京]\nAction: get_weather[上海]"
+    if "search[" not in prompt:
+        return "Thought: 两个城市都是晴天，搜索北京的景点。\nAction: search[北京 晴天 景点]"
+    return "Thought: 已经获得足够的信息。\nAction: Finish[两个城市都是晴天，推荐去北京的颐和园。]"
+
+def get_weather(city: str) -> str:
+    time.sleep(TOOL_LATENCY)
+    return f"{city}当前天气:晴，气温25摄氏度"
+
+def search(query: str) -> str:
+    time.sleep(TOOL_LATENCY)
+    return f"[1] {query}\n颐和园是北京最值得游览的皇家园林之一。"
+
+def run_agent(llm: HelloAgentsLLM, cassette: Cassette):
+    with contextlib.redirect_stdout(io.StringIO()):
+        tools = ToolExecutor(cassette=cassette)
+        tools.registerTool(get_weather, "查询指定城市的实时天气。")
+        tools.registerTool(search, "一个网页搜索引擎。")
+        agent = ReActAgent(llm, tools)
+        start = time.perf_counter()
+        answer = agent.run(QUESTION)
+        elapsed = time.perf_counter() - start
+        tools.shutdown()
+    return answer, list(agent.history), elapsed
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Cassette 录制/回放基准")
+    parser.add_argument("--cassette", default="/tmp/react.cassette.jsonl.gz")
+    parser.add_argument("--replays", type=int, default=20, help="尽快回放的次数")
+    parser.add_argument("--first-token-delay", type=float, default=0.2)
+    parser.add_argument("--chunk-delay", type=float, default=0.01)
+    args = parser.parse_args()
+
+    cassette_path = Path(args.cassette)
+    cassette_path.unlink(missing_ok=True)
+    with StubOpenAIServer(responder=responder, first_token_delay=args.first_token_delay,
+                          chunk_delay=args.chunk_delay, chunk_size=4) as stub:
+        with Cassette(cassette_path, mode="record") as cassette:
+            llm = HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=stub.base_url, cassette=cassette)
+            recorded = run_agent(llm, cassette)
+            recorded_entries = cassette.report()["recorded"]
+
+    # 桩服务器已关闭，回放时不提供任何服务地址
+    modes = {"录制": recorded[2]}
+    realtime_cassette = Cassette(cassette_path, speed=1.0)
+    realtime = run_agent(HelloAgentsLLM(cassette=realtime_cassette), realtime_cassette)
+    modes["按原速回放"] = realtime[2]
+    fast_cassette = Cassette(cassette_path, speed=0)
+    fast_runs = [run_agent(HelloAgentsLLM(cassette=fast_cassette), fast_cassette) for _ in range(args.replays)]
+    modes["尽快回放"] = sorted(run[2] for run in fast_runs)[len(fast_runs) // 2]
+
+    identical = all(run[:2] == recorded[:2] for run in [realtime] + fast_runs)
+    print(f"\n--- Cassette 录制/回放: {recorded_entries} 条记录, 文件 {cassette_path.stat().st_size} 字节 ---")
+    for name, seconds in modes.items():
+        print(f"{name:<10} {seconds * 1000:>8.1f}ms")
+    print(f"回放结果与录制{'完全一致' if identical else '不一致'}: {recorded[0]}")
+    print(f"回放统计: {fast_cassette.report()}")
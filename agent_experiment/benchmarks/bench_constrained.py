@@ -0,0 +1,85 @@
+# 约束解码基准：同一组任务分别以普通解码与约束解码（ReAct 文法）运行 ReActAgent，
+# 对比每个任务消耗的步数、生成的 Token 数、格式错误的回覆数以及得到最终答案的比例
+# 工具为固定返回值的假工具，不访问网络
+# 用法: python agent_experiment/benchmarks/bench_constrained.py [--model Qwen/Qwen3-0.6B] [--max-steps 5]
+
+import argparse
+import contextlib
+import io
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LocalLLMClient import HelloAgentsLLM_Local
+from ReAct_Agent import ReActAgent
+from tools.ToolExecutor import ToolExecutor
+
+TASKS = [
+    "你好，请帮我查询一下今天北京的天气，然后根据天气推荐一个合适的旅游景点。",
+    "上海今天会下雨吗？如果下雨，推荐一个室内景点。",
+    "分别查询广州和深圳的天气，告诉我哪个城市更适合周末出游。",
+    "杭州今天适合去西湖吗？",
+]
+
+def get_weather(city: str) -> str:
+    """查询指定城市的实时天气。"""
+    return f"{city}当前天气:晴，气温25摄氏度"
+
+def get_attraction(query: str) -> str:
+    """根据城市和天气搜索推荐的旅游景点。"""
+    return f"{query} 推荐: 城市博物馆（室内）与中央公园（户外），晴天建议前往中央公园。"
+
+def build_tools() -> ToolExecutor:
+    tools = ToolExecutor()
+    tools.registerTool(get_weather, "查询指定城市的实时天气，输入为城市名。")
+    tools.registerTool(get_attraction, "根据城市和天气搜索推荐的旅游景点，输入为 城市, 天气。")
+    return tools
+
+def run_tasks(llm: HelloAgentsLLM_Local, tools: ToolExecutor, max_steps: int):
+    results = []
+    for task in TASKS:
+        agent = ReActAgent(llm, tools, max_steps)
+        usage_before = dict(llm.usage)
+        log = io.StringIO()
+        with contextlib.redirect_stdout(log):
+            answer = agent.run(task)
+        output = log.getvalue()
+        results.append({
+            "answered": answer is not None,
+            "steps": output.count("--- 第 "),
+            "malformed": output.count("未能解析出有效的Action"),
+            "completion_tokens": llm.usage["completion_tokens"] - usage_before["completion_tokens"],
+        })
+    return results
+
+def summarize(results):
+    count = len(results)
+    return {
+        "answered": sum(result["answered"] for result in results) / count,
+        "steps": sum(result["steps"] for result in results) / count,
+        "malformed": sum(result["malformed"] for result in results) / count,
+        "completion_tokens": sum(result["completion_tokens"] for result in results) / count,
+    }
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="约束解码基准")
+    parser.add_argument("--model", default="Qwen/Qwen3-0.6B")
+    parser.add_argument("--max-steps", type=int, default=5)
+    parser.add_argument("--max-new-tokens", type=int, default=256)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        tools = build_tools()
+        baseline_llm = HelloAgentsLLM_Local(args.model, max_new_tokens=args.max_new_tokens)
+        constrained_llm = HelloAgentsLLM_Local(args.model, max_new_tokens=args.max_new_tokens, constrained_decoding=True)
+
+    baseline = summarize(run_tasks(baseline_llm, tools, args.max_steps))
+    constrained = summarize(run_tasks(constrained_llm, tools, args.max_steps))
+
+    print(f"\n--- 约束解码: {args.model}, {len(TASKS)} 个任务 (每任务平均) ---")
+    print(f"{'模式':<10} {'答出比例':>8} {'步数':>6} {'格式错误':>8} {'生成 Token':>10}")
+    for name, summary in (("普通", baseline), ("约束", constrained)):
+        print(f"{name:<10} {summary['answered']:>8.0%} {summary['steps']:>6.2f} {summary['malformed']:>8.2f}"
+              f" {summary['completion_tokens']:>10.1f}")
+    print(f"\n约束解码每个任务节省 {baseline['steps'] - constrained['steps']:.2f} 步、"
+          f"{baseline['completion_tokens'] - constrained['completion_tokens']:.1f} 个生成 Token")
@@ -0,0 +1,77 @@
+# HelloAgentsLLM 端点池基准：启动多个首 Token 延迟不同的桩服务器（其中一个持续返回错误），
+# 多个线程并发调用 think，对比
+#   1. 固定使用某一个端点（.env 中只能配置一个 LLM_BASE_URL 时的做法）；
+#   2. EndpointPool：按首 Token 延迟的移动平均与在途请求数选择端点，剔除持续失败的端点。
+# 报告每次调用耗时的 p50/p99、失败率以及每个端点的统计
+# 用法: python agent_experiment/benchmarks/bench_endpoint_pool.py [--workers 8] [--calls 40] [--delays 0.02 0.05 0.3]
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LLMClient import HelloAgentsLLM
+from EndpointPool import EndpointPool
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "北京今天适合去哪里玩？"}]
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def run(llm: HelloAgentsLLM, workers: int, calls: int):
+    def worker(_):
+        latencies, failures = [], 0
+        for _ in range(calls):
+            start = time.perf_counter()
+            response = llm.think(MESSAGES)
+            latencies.append(time.perf_counter() - start)
+            failures += response is None
+        return latencies, failures
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(worker, range(workers)))
+    latencies = [latency for result in results for latency in result[0]]
+    failures = sum(result[1] for result in results)
+    return latencies, failures / len(latencies)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="端点池基准")
+    parser.add_argument("--workers", type=int, default=8)
+    parser.add_argument("--calls", type=int, default=40, help="每个线程的调用次数")
+    parser.add_argument("--delays", type=float, nargs="+", default=[0.02, 0.05, 0.3], help="各个正常端点的首 Token 延迟（秒）")
+    args = parser.parse_args()
+
+    stubs = [StubOpenAIServer(first_token_delay=delay).start() for delay in args.delays]
+    stubs.append(StubOpenAIServer(error_rate=1.0).start()) # 持续失败的端点
+    names = [f"stub-{delay * 1000:.0f}ms" for delay in args.delays] + ["stub-error"]
+    try:
+        modes = {}
+        for name, stub in zip(names[:-1], stubs):
+            modes[f"固定 {name}"] = run(
+                HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=stub.base_url), args.workers, args.calls
+            )
+        endpoint_pool = EndpointPool([
+            {"base_url": stub.base_url, "name": name} for name, stub in zip(names, stubs)
+        ])
+        pooled_llm = HelloAgentsLLM(model="stub-model", apiKey="stub", endpoints=endpoint_pool)
+        modes["端点池"] = run(pooled_llm, args.workers, args.calls)
+    finally:
+        for stub in stubs:
+            stub.stop()
+
+    print(f"\n--- 端点池: {args.workers} 个线程 x {args.calls} 次调用 ---")
+    print(f"{'模式':<16} {'p50':>8} {'p99':>8} {'失败':>6}")
+    for name, (latencies, failure_rate) in modes.items():
+        print(f"{name:<16} {percentile(latencies, 0.5) * 1000:>6.0f}ms {percentile(latencies, 0.99) * 1000:>6.0f}ms"
+              f" {failure_rate:>6.1%}")
+
+    print(f"\n{'端点':<14} {'请求':>6} {'失败':>6} {'剔除':>6} {'TTFT EWMA':>10}")
+    for name, stats in endpoint_pool.stats().items():
+        ewma = f"{stats['ewma_ttft_ms']:.0f}ms" if stats["ewma_ttft_ms"] is not None else "-"
+        print(f"{name:<14} {stats['requests']:>6} {stats['failures']:>6} {stats['ejections']:>6} {ewma:>10}")
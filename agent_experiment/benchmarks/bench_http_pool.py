@@ -0,0 +1,80 @@
+# 共享 HTTP 连接池基准：对比裸 requests.get 与 get_weather（共享连接池）的单次调用延迟
+# 使用本地桩服务器模拟 wttr.in，可为每个新连接注入握手延迟，近似真实环境中 DNS/TCP/TLS 的建连开销
+# 用法: python agent_experiment/benchmarks/bench_http_pool.py [--calls 200] [--handshake-delay 0.03]
+
+import argparse
+import json
+import statistics
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+import tools.GetWeather_from_wttrin as weather_tool
+
+WTTR_PAYLOAD = json.dumps({
+    "current_condition": [{"weatherDesc": [{"value": "Sunny"}], "temp_C": "25"}]
+}).encode("utf-8")
+
+def start_stub_wttr(handshake_delay: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1" # 支持 keep-alive
+        disable_nagle_algorithm = True # 避免 keep-alive 连接上的小包与延迟 ACK 相互等待
+
+        def log_message(self, *args):
+            pass
+
+        def handle(self):
+            # 每个新连接只付出一次建连开销，之后的 keep-alive 请求不再付出
+            time.sleep(handshake_delay)
+            super().handle()
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(WTTR_PAYLOAD)))
+            self.end_headers()
+            self.wfile.write(WTTR_PAYLOAD)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def measure(call, calls: int):
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+def summarize(name: str, latencies):
+    ordered = sorted(latencies)
+    p50 = statistics.median(ordered) * 1000
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000
+    print(f"{name:<24} p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   mean {statistics.mean(ordered) * 1000:7.2f} ms")
+    return statistics.mean(ordered)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="共享 HTTP 连接池基准")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--handshake-delay", type=float, default=0.03, help="每个新连接的模拟建连延迟（秒）")
+    args = parser.parse_args()
+
+    server = start_stub_wttr(args.handshake_delay)
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    weather_tool.WTTR_BASE_URL = base_url
+
+    bare = measure(lambda: requests.get(f"{base_url}/北京?format=j1").json(), args.calls)
+    pooled = measure(lambda: weather_tool.get_weather("北京"), args.calls)
+    server.shutdown()
+
+    print(f"--- 单次调用延迟（{args.calls} 次，模拟建连延迟 {args.handshake_delay * 1000:.0f} ms）---")
+    bare_mean = summarize("裸 requests.get", bare)
+    pooled_mean = summarize("get_weather (连接池)", pooled)
+    print(f"每次调用节省: {(bare_mean - pooled_mean) * 1000:.2f} ms")
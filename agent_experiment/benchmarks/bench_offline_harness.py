@@ -0,0 +1,221 @@
+# 离线智能体循环基准：用按脚本回答的假 LLM 与按延迟分布休眠的假工具（见 offline_fakes.py）驱动
+#   react         ReActAgent.run
+#   react_stream  ReActAgent.run(stream_actions=True)
+#   react_async   ReActAgent.arun（asyncio 并发）
+#   first_try     agent_first_try.run_agent
+#   second_try    agent_second_try.run_agent
+# 在不同并发度下各运行若干次，报告端到端与每一步的延迟、框架开销（总耗时中既不在等待 LLM 也不在等待工具的部分）
+# 与吞吐量；ReActAgent 的开销另按追踪 span 拆分为提示词构造、历史处理与解析。结果保存为 JSON，可用 --baseline 与之前的结果比较
+# 用法: python agent_experiment/benchmarks/bench_offline_harness.py [--loops react first_try] [--concurrency 1 8 32]
+#       [--runs 32] [--llm-ttft lognormal:0.2,0.5] [--tool-latency uniform:0.05,0.2] [--token-budget 512]
+#       [--out results.json] [--baseline old.json]
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import io
+import json
+import platform
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+sys.path.insert(1, str(Path(__file__).parent.parent.parent)) # agent_first_try.py 与 agent_second_try.py 所在目录
+from HistoryManager import HistoryManager
+from ReAct_Agent import ReActAgent
+from Tracing import disable_tracing, enable_tracing
+from tools.ToolExecutor import ToolExecutor
+from benchmarks.offline_fakes import AsyncScriptedLLM, FakeTools, RunRecorder, ScriptedLLM
+
+QUESTION = "你好，请帮我查询一下今天北京的天气，然后根据天气推荐一个合适的旅游景点。"
+
+# ReActAgent 的脚本：第一步并行查询两个城市的天气，第二步搜索景点，第三步给出答案
+REACT_SCRIPT = [
+    "Thought: 需要先查询北京和上海的天气，两个查询互不依赖。\nAction: get_weather[北京]\nAction: get_weather[上海]",
+    "Thought: 北京天气晴，搜索适合晴天游览的景点。\nAction: search[北京 晴天 旅游景点推荐]",
+    "Thought: 已经获得足够的信息，可以回答了。\nAction: Finish[北京今天晴，推荐去颐和园。]",
+]
+
+# agent_first_try / agent_second_try 使用函数调用形式的 Action
+FUNCTION_SCRIPT = [
+    'Thought: 先查询北京的天气。\nAction: get_weather(city="北京")',
+    'Thought: 北京天气晴，根据天气搜索景点。\nAction: get_attraction(city="北京", weather="晴")',
+    'Thought: 信息已经足够。\nAction: Finish[北京今天晴，推荐去颐和园。]',
+]
+
+LOOPS = ["react", "react_stream", "react_async", "first_try", "second_try"]
+
+# 拆分 ReActAgent 框架开销时关注的 span；history.render（其中 history.compact 为超出预算时的压缩）包含在
+# agent.build_prompt 之内。agent.tools 主要是等待工具的时间，不属于框架开销，不在此列
+OVERHEAD_SPANS = ["agent.build_prompt", "history.render", "history.compact", "agent.parse"]
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+def summarize(samples) -> dict:
+    return {
+        "mean": sum(samples) / len(samples) if samples else 0.0,
+        "p50": percentile(samples, 0.5),
+        "p90": percentile(samples, 0.9),
+        "p99": percentile(samples, 0.99),
+    }
+
+def build_runner(loop: str, args):
+    """返回执行一次运行的函数（react_async 时为协程函数）。"""
+    fake_tools = FakeTools(args.tool_latency, seed=args.seed)
+    llm_options = {"ttft": args.llm_ttft, "chunk_delay": args.chunk_delay, "chunk_size": args.chunk_size,
+                   "seed": args.seed}
+    if loop.startswith("react"):
+        tools = ToolExecutor(max_workers=args.tool_workers)
+        for tool in (fake_tools.search, fake_tools.get_weather, fake_tools.get_attraction):
+            tools.registerTool(tool, tool.__doc__ or tool.__name__)
+        history = lambda: HistoryManager(token_budget=args.token_budget)
+        if loop == "react_async":
+            llm = AsyncScriptedLLM(REACT_SCRIPT, **llm_options)
+            return lambda: ReActAgent(llm, tools, max_steps=args.max_steps, history_manager=history()).arun(QUESTION)
+        llm = ScriptedLLM(REACT_SCRIPT, **llm_options)
+        stream_actions = loop == "react_stream"
+        return lambda: ReActAgent(llm, tools, max_steps=args.max_steps, history_manager=history(),
+                                  stream_actions=stream_actions).run(QUESTION)
+
+    llm = ScriptedLLM(FUNCTION_SCRIPT, **llm_options)
+    if loop == "first_try":
+        import agent_first_try
+        available_tools = {"get_weather": fake_tools.get_weather, "get_attraction": fake_tools.get_attraction}
+        return lambda: agent_first_try.run_agent(llm, QUESTION, available_tools, max_steps=args.max_steps)
+
+    import agent_second_try
+    tool_executor = agent_second_try.build_tool_executor(fake_tools.get_weather, fake_tools.get_attraction)
+    return lambda: agent_second_try.run_agent(llm, QUESTION, tool_executor, max_steps=args.max_steps)
+
+def run_threads(runner, runs: int, concurrency: int):
+    def run_one():
+        recorder = RunRecorder().activate()
+        answer = runner()
+        recorder.finish()
+        return recorder, answer
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        # 每次运行在独立的上下文中，使 RunRecorder 不会串到同一线程的下一次运行
+        futures = [pool.submit(contextvars.copy_context().run, run_one) for _ in range(runs)]
+        return [future.result() for future in futures]
+
+async def run_tasks(runner, runs: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one():
+        async with semaphore:
+            recorder = RunRecorder().activate()
+            answer = await runner()
+            recorder.finish()
+            return recorder, answer
+
+    return await asyncio.gather(*[run_one() for _ in range(runs)])
+
+def measure(loop: str, concurrency: int, args) -> dict:
+    with contextlib.redirect_stdout(io.StringIO()):
+        runner = build_runner(loop, args)
+        tracer = enable_tracing() if loop.startswith("react") else None
+        start = time.perf_counter()
+        if loop == "react_async":
+            results = asyncio.run(run_tasks(runner, args.runs, concurrency))
+        else:
+            results = run_threads(runner, args.runs, concurrency)
+        wall_s = time.perf_counter() - start
+        disable_tracing()
+
+    breakdowns = [recorder.breakdown() for recorder, _ in results]
+    steps = [step for breakdown in breakdowns for step in breakdown["steps"]]
+    total_latency = sum(breakdown["latency_s"] for breakdown in breakdowns)
+    total_overhead = sum(breakdown["overhead_s"] for breakdown in breakdowns)
+    result = {
+        "loop": loop,
+        "concurrency": concurrency,
+        "runs": len(results),
+        "answered": sum(answer is not None for _, answer in results),
+        "wall_s": wall_s,
+        "throughput_runs_per_s": len(results) / wall_s,
+        "throughput_steps_per_s": len(steps) / wall_s,
+        "steps_per_run": len(steps) / len(results),
+        "latency_s": summarize([breakdown["latency_s"] for breakdown in breakdowns]),
+        "step_latency_s": summarize([step["latency_s"] for step in steps]),
+        "llm_s": summarize([breakdown["llm_s"] for breakdown in breakdowns]),
+        "tools_s": summarize([breakdown["tools_s"] for breakdown in breakdowns]),
+        "overhead_s": summarize([breakdown["overhead_s"] for breakdown in breakdowns]),
+        "step_overhead_s": summarize([step["overhead_s"] for step in steps]),
+        "overhead_fraction": total_overhead / total_latency if total_latency else 0.0,
+    }
+    if tracer is not None:
+        summary = tracer.summary()
+        result["spans_ms"] = {
+            name: summary[name]["total_s"] / len(results) * 1000 for name in OVERHEAD_SPANS if name in summary
+        }
+    return result
+
+def print_results(results):
+    print(f"\n{'循环':<13} {'并发':>4} {'吞吐(次/s)':>10} {'p50':>9} {'p99':>9} {'步p50':>8} {'开销/次':>9} {'开销占比':>8}")
+    for result in results:
+        print(f"{result['loop']:<13} {result['concurrency']:>4} {result['throughput_runs_per_s']:>10.1f}"
+              f" {result['latency_s']['p50'] * 1000:>7.1f}ms {result['latency_s']['p99'] * 1000:>7.1f}ms"
+              f" {result['step_latency_s']['p50'] * 1000:>6.1f}ms {result['overhead_s']['mean'] * 1000:>7.2f}ms"
+              f" {result['overhead_fraction']:>8.1%}")
+    spans = [result for result in results if "spans_ms" in result]
+    if spans:
+        print(f"\nReActAgent 每次运行的框架开销拆分（history.render 包含在 agent.build_prompt 之内）:")
+        for result in spans:
+            parts = ", ".join(f"{name} {ms:.3f}ms" for name, ms in result["spans_ms"].items())
+            print(f"  {result['loop']:<13} 并发 {result['concurrency']:>3}: {parts}")
+
+def compare(results, baseline_path: str):
+    baseline = {(r["loop"], r["concurrency"]): r for r in json.loads(Path(baseline_path).read_text("utf-8"))["results"]}
+    print(f"\n--- 与 {baseline_path} 比较 ---")
+    print(f"{'循环':<13} {'并发':>4} {'吞吐':>9} {'p50':>9} {'开销/次':>9}")
+    for result in results:
+        old = baseline.get((result["loop"], result["concurrency"]))
+        if old is None:
+            continue
+        print(f"{result['loop']:<13} {result['concurrency']:>4}"
+              f" {result['throughput_runs_per_s'] / old['throughput_runs_per_s'] - 1:>+9.1%}"
+              f" {result['latency_s']['p50'] / old['latency_s']['p50'] - 1:>+9.1%}"
+              f" {result['overhead_s']['mean'] / max(old['overhead_s']['mean'], 1e-9) - 1:>+9.1%}")
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="离线智能体循环基准")
+    parser.add_argument("--loops", nargs="+", choices=LOOPS, default=LOOPS)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--runs", type=int, default=32, help="每个并发度下的运行次数")
+    parser.add_argument("--max-steps", type=int, default=5)
+    parser.add_argument("--llm-ttft", default="lognormal:0.05,0.5", help="假 LLM 首 Token 延迟的分布")
+    parser.add_argument("--chunk-delay", type=float, default=0.002, help="假 LLM 相邻两段输出的间隔（秒）")
+    parser.add_argument("--chunk-size", type=int, default=8)
+    parser.add_argument("--tool-latency", default="uniform:0.02,0.08", help="假工具延迟的分布")
+    parser.add_argument("--token-budget", type=int, help="ReActAgent 提示词的 Token 预算，提供时会截断较早的 Observation")
+    parser.add_argument("--tool-workers", type=int, default=64, help="ToolExecutor 线程池大小")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default="offline_harness_results.json", help="结果 JSON 的保存路径")
+    parser.add_argument("--baseline", help="之前保存的结果 JSON，提供时打印对比")
+    args = parser.parse_args()
+
+    results = []
+    for loop in args.loops:
+        for concurrency in args.concurrency:
+            results.append(measure(loop, concurrency, args))
+            print(f"✅ {loop} 并发 {concurrency}: {results[-1]['throughput_runs_per_s']:.1f} 次/s", flush=True)
+
+    print_results(results)
+    Path(args.out).write_text(json.dumps({
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"\n结果已保存到 {args.out}")
+    if args.baseline:
+        compare(results, args.baseline)
@@ -0,0 +1,33 @@
+# HelloAgentsLLM_Local 加载精度对比：fp32 / bf16 / int8 的加载耗时、常驻内存、tokens/s 与输出一致性
+# 用法: python agent_experiment/benchmarks/bench_precision.py [--model Qwen/Qwen3-0.6B] [--max-new-tokens 64]
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LocalLLMClient import compare_precisions, PRECISIONS
+
+# 固定的提示词集合，覆盖问答、ReAct 格式输出与代码
+PROMPTS = [
+    "请用一句话介绍北京。",
+    "快速排序的时间复杂度是多少？",
+    "你是一个智能旅行助手，可用工具: get_weather(city)。请按格式回覆:\nThought: ...\nAction: get_weather[城市]\n问题: 上海今天天气如何？",
+    "写一个 Python 函数判断回文字符串。",
+    "Dell 的笔记本电脑有什么卖点？",
+]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="加载精度对比")
+    parser.add_argument("--model", default="Qwen/Qwen3-0.6B")
+    parser.add_argument("--max-new-tokens", type=int, default=64)
+    parser.add_argument("--precisions", nargs="+", default=list(PRECISIONS), choices=list(PRECISIONS))
+    args = parser.parse_args()
+
+    results = compare_precisions(args.model, PROMPTS, args.precisions, args.max_new_tokens)
+
+    print(f"\n--- 加载精度对比: {args.model} ---")
+    print(f"{'精度':<6} {'加载':>8} {'内存':>9} {'tokens/s':>9} {'完全一致':>8} {'Token 一致':>10}")
+    for r in results:
+        print(f"{r['precision']:<6} {r['load_s']:>7.2f}s {r['rss_mb']:>6.0f} MB {r['tokens_per_s']:>9.1f}"
+              f" {r['exact_match']:>8.0%} {r['token_agreement']:>10.0%}")
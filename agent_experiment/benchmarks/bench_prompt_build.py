@@ -0,0 +1,91 @@
+# ReActAgent 每一步构造提示词的开销：随着历史增长，对比
+#   1. 原始做法：每步重新生成工具描述、格式化整个模板、套用对话模板并对全文分词；
+#   2. 固定前缀：静态部分每次运行只渲染、分词一次，每步只对新增的历史分词。
+# 每一步先追加一条历史再构造提示词，与真实运行一致；只测量提示词构造与分词，不做生成
+# 用法: python agent_experiment/benchmarks/bench_prompt_build.py [--model Qwen/Qwen3-0.6B] [--steps 0 5 10 20 40]
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LocalLLMClient import HelloAgentsLLM_Local
+from ReAct_Agent import ReActAgent, REACT_PROMPT_TEMPLATE
+from tools.ToolExecutor import ToolExecutor
+
+QUESTION = "Dell 的最新型號電腦是哪台，基礎硬件設備的型號為何？價格多少？與同價位的其他電腦相比有什麼賣點?"
+OBSERVATION = (
+    "[1] Dell XPS 14 (2025) 搭载 Intel Core Ultra 7 255H，32GB LPDDR5x 内存，1TB SSD，售价 $1,699 起。\n"
+    "[2] 同价位的 MacBook Air 15 与 Lenovo Yoga Slim 7x 在续航上更有优势，XPS 的屏幕与做工更出色。\n"
+) * 3
+
+def search(query: str) -> str:
+    return OBSERVATION
+
+def get_weather(city: str) -> str:
+    return f"{city}当前天气:晴，气温25摄氏度"
+
+def build_agent(llm: HelloAgentsLLM_Local) -> ReActAgent:
+    tools = ToolExecutor()
+    tools.registerTool(search, "一个网页搜索引擎。当你需要回答有關 即時性資訊 或 進行事實驗證時使用此工具。")
+    tools.registerTool(get_weather, "查询指定城市的实时天气。")
+    return ReActAgent(llm, tools)
+
+def baseline_step(agent: ReActAgent, llm: HelloAgentsLLM_Local):
+    """原始做法：每一步都从头生成工具描述、格式化模板、套用对话模板并分词。"""
+    tools_desc = "\n".join([
+        f"- {name}: {info['description']}"
+        for name, info in agent.tool_executor.tools.items()
+    ])
+    prompt = REACT_PROMPT_TEMPLATE.format(tools=tools_desc, question=QUESTION, history="\n".join(agent.history))
+    text = llm.tokenizer.apply_chat_template(
+        [{"role": "user", "content": prompt}],
+        tokenize=False,
+        add_generation_prompt=True,
+        enable_thinking=False
+    )
+    return llm.tokenizer(text).input_ids
+
+def pinned_step(agent: ReActAgent, llm: HelloAgentsLLM_Local):
+    """固定前缀：静态部分已缓存，只对历史部分分词。"""
+    return llm._encode_messages(agent._build_messages(QUESTION))
+
+def timed(step, agent: ReActAgent, llm: HelloAgentsLLM_Local):
+    start = time.perf_counter()
+    ids = step(agent, llm)
+    return time.perf_counter() - start, ids
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ReActAgent 每步提示词构造开销")
+    parser.add_argument("--model", default="Qwen/Qwen3-0.6B")
+    parser.add_argument("--steps", type=int, nargs="+", default=[0, 5, 10, 20, 40])
+    parser.add_argument("--repeats", type=int, default=20)
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        llm = HelloAgentsLLM_Local(args.model)
+        agent = build_agent(llm)
+
+    # 每个记录点: [原始耗时之和, 固定前缀耗时之和, 提示词 Token 数]
+    results = {num_steps: [0.0, 0.0, 0] for num_steps in args.steps}
+    for _ in range(args.repeats):
+        agent.history_manager.reset()
+        for step in range(max(args.steps) + 1):
+            if step:
+                agent.history_manager.add(f"search[{QUESTION} {step}]", OBSERVATION)
+            baseline, baseline_ids = timed(baseline_step, agent, llm)
+            pinned, pinned_ids = timed(pinned_step, agent, llm)
+            assert pinned_ids == baseline_ids, "固定前缀的分词结果与完整分词不一致"
+            if step in results:
+                results[step][0] += baseline
+                results[step][1] += pinned
+                results[step][2] = len(baseline_ids)
+
+    print(f"\n--- 每步提示词构造耗时: {args.model} ---")
+    print(f"{'历史步数':>8} {'提示词 Token':>12} {'原始 (ms)':>10} {'固定前缀 (ms)':>14} {'加速':>6}")
+    for num_steps, (baseline, pinned, num_tokens) in results.items():
+        baseline, pinned = baseline / args.repeats, pinned / args.repeats
+        print(f"{num_steps:>8} {num_tokens:>12} {baseline * 1000:>10.3f} {pinned * 1000:>14.3f} {baseline / pinned:>5.1f}x")
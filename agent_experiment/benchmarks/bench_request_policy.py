@@ -0,0 +1,64 @@
+# HelloAgentsLLM 重试与对冲基准：桩服务器注入长尾延迟与错误，对比
+#   1. 原始做法：一次请求（仅 openai 库自带的重试），失败时 think 返回 None；
+#   2. RequestPolicy：带抖动的指数退避重试 + 首 Token 截止时间 + 按 p95 发送对冲请求。
+# 报告每次 think 调用耗时的 p50/p99 与失败率
+# 用法: python agent_experiment/benchmarks/bench_request_policy.py [--calls 200] [--slow-rate 0.03] [--error-rate 0.05]
+
+import argparse
+import contextlib
+import io
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LLMClient import HelloAgentsLLM
+from RequestPolicy import RequestPolicy
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+MESSAGES = [{"role": "user", "content": "北京今天适合去哪里玩？"}]
+
+def percentile(samples, q: float) -> float:
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+def run(llm: HelloAgentsLLM, calls: int):
+    latencies, failures = [], 0
+    for _ in range(calls):
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            response = llm.think(MESSAGES)
+        latencies.append(time.perf_counter() - start)
+        failures += response is None
+    return latencies, failures
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="重试与对冲基准")
+    parser.add_argument("--calls", type=int, default=200)
+    parser.add_argument("--fast-delay", type=float, default=0.03, help="正常请求的首 Token 延迟（秒）")
+    parser.add_argument("--slow-delay", type=float, default=1.5, help="长尾请求的首 Token 延迟（秒）")
+    parser.add_argument("--slow-rate", type=float, default=0.03)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    def first_token_delay():
+        if random.random() < args.slow_rate:
+            return args.slow_delay
+        return random.uniform(0.5, 1.5) * args.fast_delay
+
+    random.seed(0)
+    with StubOpenAIServer(first_token_delay=first_token_delay, error_rate=args.error_rate) as stub:
+        baseline_llm = HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=stub.base_url)
+        policy = RequestPolicy(max_retries=3, backoff_base=0.02, ttft_deadline=args.slow_delay * 2, hedge=True)
+        policy_llm = HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=stub.base_url, request_policy=policy)
+        run(policy_llm, policy.hedge_min_samples) # 预热，积累对冲所需的 TTFT 样本
+        modes = {"原始": run(baseline_llm, args.calls), "重试+对冲": run(policy_llm, args.calls)}
+
+    print(f"\n--- 重试与对冲: {args.calls} 次调用, 长尾 {args.slow_rate:.0%} x {args.slow_delay}s, "
+          f"错误率 {args.error_rate:.0%} ---")
+    print(f"{'模式':<10} {'p50':>8} {'p99':>8} {'失败':>6}")
+    for name, (latencies, failures) in modes.items():
+        print(f"{name:<10} {percentile(latencies, 0.5) * 1000:>6.0f}ms {percentile(latencies, 0.99) * 1000:>6.0f}ms"
+              f" {failures / args.calls:>6.1%}")
+    print(f"\nRequestPolicy 统计: {policy.report()}")
@@ -0,0 +1,97 @@
+# HelloAgentsLLM_Local 推测解码基准：在 ReAct 轨迹上对比普通贪心 generate 与 prompt_lookup（可选小模型起草）
+# 报告草稿接受率、tokens/s 与加速比，并检查贪心解码下输出完全一致
+# 轨迹文件为 JSONL，每行 {"messages": [...]}；未提供时使用内置的旅行助手示例轨迹
+# 用法: python agent_experiment/benchmarks/bench_speculative.py [--model Qwen/Qwen3-0.6B] [--traces traces.jsonl]
+#       [--assistant-model Qwen/Qwen3-0.6B-Base]
+
+import argparse
+import contextlib
+import io
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LocalLLMClient import HelloAgentsLLM_Local
+from ReAct_Agent import REACT_PROMPT_TEMPLATE
+
+TOOLS = (
+    "- get_weather: 查询指定城市的实时天气。\n"
+    "- get_attraction: 根据城市和天气搜索推荐的旅游景点。"
+)
+QUESTION = "你好，请帮我查询一下今天北京的天气，然后根据天气推荐一个合适的旅游景点。"
+HISTORIES = [
+    [],
+    [
+        "Action: get_weather[北京]",
+        "Observation: 北京当前天气:Sunny，气温26摄氏度",
+    ],
+    [
+        "Action: get_weather[北京]",
+        "Observation: 北京当前天气:Sunny，气温26摄氏度",
+        "Action: get_attraction[北京, Sunny]",
+        "Observation: 北京晴天推荐: 颐和园——中国现存规模最大、保存最完整的皇家园林，昆明湖与万寿山相映成趣，"
+        "适合晴天泛舟与登高远眺；八达岭长城——明长城中保存最好的一段，晴天视野开阔，可以远眺群山。",
+    ],
+]
+
+def sample_traces():
+    return [
+        {"messages": [{"role": "user", "content": REACT_PROMPT_TEMPLATE.format(
+            tools=TOOLS, question=QUESTION, history="\n".join(history)
+        )}]}
+        for history in HISTORIES
+    ]
+
+def load_traces(path: str):
+    with open(path, encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run(llm: HelloAgentsLLM_Local, traces, max_new_tokens: int):
+    outputs, start = [], time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for trace in traces:
+            outputs.append(llm.think(trace["messages"], temperature=0, max_new_tokens=max_new_tokens))
+    return outputs, time.perf_counter() - start
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="推测解码基准")
+    parser.add_argument("--model", default="Qwen/Qwen3-0.6B")
+    parser.add_argument("--traces", help="ReAct 轨迹 JSONL 文件")
+    parser.add_argument("--assistant-model", help="assistant 模式的起草模型")
+    parser.add_argument("--num-draft-tokens", type=int, default=10)
+    parser.add_argument("--max-new-tokens", type=int, default=128)
+    args = parser.parse_args()
+
+    traces = load_traces(args.traces) if args.traces else sample_traces()
+    with contextlib.redirect_stdout(io.StringIO()):
+        baseline_llm = HelloAgentsLLM_Local(args.model)
+        modes = {"prompt_lookup": HelloAgentsLLM_Local(
+            args.model, speculative="prompt_lookup", num_draft_tokens=args.num_draft_tokens
+        )}
+        if args.assistant_model:
+            modes["assistant"] = HelloAgentsLLM_Local(
+                args.model, speculative="assistant", assistant_model_name=args.assistant_model
+            )
+    # 作为基准的普通 generate 同样使用贪心解码
+    baseline_llm.model.generation_config.do_sample = False
+
+    run(baseline_llm, traces[:1], 8) # 预热
+    baseline_outputs, baseline_elapsed = run(baseline_llm, traces, args.max_new_tokens)
+    tokens = sum(len(baseline_llm.tokenizer(output).input_ids) for output in baseline_outputs if output)
+
+    print(f"\n--- 推测解码: {args.model}, {len(traces)} 条轨迹 ---")
+    print(f"{'模式':<14} {'耗时':>8} {'tokens/s':>9} {'加速':>6} {'接受率':>7} {'输出一致':>8}")
+    print(f"{'generate':<14} {baseline_elapsed:>7.2f}s {tokens / baseline_elapsed:>9.1f} {'1.0x':>6} {'-':>7} {'-':>8}")
+    for name, llm in modes.items():
+        outputs, elapsed = run(llm, traces, args.max_new_tokens)
+        if llm.speculative_stats:
+            drafted = sum(stats["drafted_tokens"] for stats in llm.speculative_stats)
+            accepted = sum(stats["accepted_tokens"] for stats in llm.speculative_stats)
+            acceptance = f"{accepted / drafted:.0%}" if drafted else "0%"
+        else:
+            acceptance = "-" # transformers 的辅助生成不提供接受统计
+        identical = sum(a == b for a, b in zip(outputs, baseline_outputs))
+        print(f"{name:<14} {elapsed:>7.2f}s {tokens / elapsed:>9.1f} {baseline_elapsed / elapsed:>5.1f}x"
+              f" {acceptance:>7} {identical:>4}/{len(traces)}")
@@ -0,0 +1,67 @@
+# 冷启动基准：在全新的子进程中测量导入 LLMClient 及加载各后端类的耗时与常驻内存（RSS）
+# 用法: python agent_experiment/benchmarks/bench_startup.py [--repeat 3]
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+AGENT_DIR = Path(__file__).parent.parent
+
+# 在子进程中执行：先导入 LLMClient，再加载指定后端的类；
+# 远程后端还会创建一个客户端实例（此时才导入 openai，不发起网络请求），本地后端不加载模型权重
+PROBE = """
+import json, sys, time
+sys.path.insert(0, {agent_dir!r})
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+base_rss = rss_mb()
+start = time.perf_counter()
+import LLMClient
+import_time = time.perf_counter() - start
+backend = {backend!r}
+if backend:
+    llm_class = LLMClient.get_llm_class(backend)
+    if backend.startswith("openai"):
+        llm_class(model="stub-model", apiKey="stub", baseUrl="http://127.0.0.1:9/v1")
+total_time = time.perf_counter() - start
+print(json.dumps({{
+    "import_s": import_time,
+    "total_s": total_time,
+    "rss_mb": rss_mb(),
+    "rss_delta_mb": rss_mb() - base_rss,
+    "torch_loaded": "torch" in sys.modules,
+}}))
+"""
+
+def probe(backend: str) -> dict:
+    code = PROBE.format(agent_dir=str(AGENT_DIR), backend=backend)
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="LLMClient 冷启动基准")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--backends", nargs="+", default=["", "openai", "openai-async", "local"])
+    args = parser.parse_args()
+
+    print(f"{'后端':<14} {'import LLMClient':>17} {'首次使用':>10} {'RSS':>10} {'RSS 增量':>10} {'torch':>6}")
+    for backend in args.backends:
+        runs = [probe(backend) for _ in range(args.repeat)]
+        print(
+            f"{backend or '(仅导入)':<14}"
+            f" {statistics.median(r['import_s'] for r in runs) * 1000:>14.0f} ms"
+            f" {statistics.median(r['total_s'] for r in runs) * 1000:>7.0f} ms"
+            f" {statistics.median(r['rss_mb'] for r in runs):>7.0f} MB"
+            f" {statistics.median(r['rss_delta_mb'] for r in runs):>7.0f} MB"
+            f" {str(runs[-1]['torch_loaded']):>6}"
+        )
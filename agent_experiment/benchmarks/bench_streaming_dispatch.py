@@ -0,0 +1,78 @@
+# ReActAgent 流式解析与提前执行工具的基准：对比
+#   1. 等待完整回覆后再解析、执行工具（原始做法）；
+#   2. stream_actions：每行 Action 一结束就开始执行工具，与剩余的生成重叠；
+#   3. stream_actions + cancel_after_action：第一个工具开始执行后即取消剩余的生成。
+# 使用本地桩服务器按固定间隔逐段输出回答，使用带固定延迟的假工具模拟网络 I/O
+# 用法: python agent_experiment/benchmarks/bench_streaming_dispatch.py [--runs 5] [--chunk-delay 0.02]
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LLMClient import HelloAgentsLLM
+from ReAct_Agent import ReActAgent
+from tools.ToolExecutor import ToolExecutor
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+TOOL_LATENCY = 0.3
+
+def responder(messages):
+    """第一步在思考之后先给出一行 Action，接着补充说明并给出第二行 Action，拿到 Observation 后给出答案。"""
+    prompt = messages[-1]["content"]
+    if "Observation:" not in prompt:
+        return (
+            "Thought: 需要分别查询北京和上海的天气，两个查询互不依赖。\n"
+            "Action: get_weather[北京]\n"
+            "Action: get_weather[上海]\n"
+            "（两个城市的天气查询可以同时进行，拿到结果后再比较哪个城市更适合出游，并给出推荐的景点与理由。）"
+        )
+    return "Thought: 已经获得两个城市的天气，可以回答了。\nAction: Finish[北京与上海今天都是晴天，都适合出游。]"
+
+def get_weather(city: str) -> str:
+    """假天气工具，固定延迟模拟网络请求。"""
+    time.sleep(TOOL_LATENCY)
+    return f"{city}当前天气:晴，气温25摄氏度"
+
+def build_tools() -> ToolExecutor:
+    tools = ToolExecutor()
+    tools.registerTool(get_weather, "查询指定城市的实时天气。")
+    return tools
+
+def run_mode(base_url: str, runs: int, **agent_options):
+    llm = HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=base_url)
+    with contextlib.redirect_stdout(io.StringIO()):
+        tools = build_tools()
+    elapsed, overlap = 0.0, 0.0
+    for _ in range(runs):
+        with contextlib.redirect_stdout(io.StringIO()):
+            agent = ReActAgent(llm, tools, **agent_options)
+            start = time.perf_counter()
+            answer = agent.run("北京和上海今天哪个城市更适合出游？")
+            elapsed += time.perf_counter() - start
+        assert answer, "智能体未能给出最终答案"
+        overlap += sum(stats["overlap_s"] for stats in agent.step_stats)
+    tools.shutdown()
+    return elapsed / runs, overlap / runs
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="流式解析与提前执行工具基准")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--chunk-delay", type=float, default=0.02)
+    args = parser.parse_args()
+
+    with StubOpenAIServer(responder=responder, chunk_size=4, chunk_delay=args.chunk_delay) as stub:
+        modes = {
+            "完整回覆": run_mode(stub.base_url, args.runs),
+            "流式执行": run_mode(stub.base_url, args.runs, stream_actions=True),
+            "流式+取消": run_mode(stub.base_url, args.runs, stream_actions=True, cancel_after_action=True),
+        }
+
+    baseline = modes["完整回覆"][0]
+    print(f"\n--- 流式解析与提前执行工具: {args.runs} 次运行 (每次平均), 工具延迟 {TOOL_LATENCY}s ---")
+    print(f"{'模式':<10} {'耗时':>8} {'重叠':>8} {'加速':>6}")
+    for name, (elapsed, overlap) in modes.items():
+        print(f"{name:<10} {elapsed:>7.2f}s {overlap:>7.2f}s {baseline / elapsed:>5.2f}x")
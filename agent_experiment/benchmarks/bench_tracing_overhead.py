@@ -0,0 +1,93 @@
+# 追踪与事件输出的开销基准：桩服务器无延迟、假工具立即返回，使每次运行几乎只剩框架本身的开销，对比
+#   1. 默认：事件经控制台 sink 打印（输出被重定向丢弃），与原先的 print 相同；
+#   2. 丢弃事件：set_event_sink(None)；
+#   3. 开启追踪：记录智能体步骤、LLM 调用与工具调用的 span，并导出 JSONL 与 Chrome 追踪文件。
+# 三种模式逐次交替运行，以抵消桩服务器与系统负载的波动；另外测量追踪关闭时单次 span / emit 调用的耗时
+# 用法: python agent_experiment/benchmarks/bench_tracing_overhead.py [--runs 50] [--out-dir /tmp/agent_traces]
+
+import argparse
+import contextlib
+import io
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+from LLMClient import HelloAgentsLLM
+from ReAct_Agent import ReActAgent
+from Tracing import disable_tracing, emit, enable_tracing, set_event_sink, span
+from tools.ToolExecutor import ToolExecutor
+from benchmarks.stub_openai_server import StubOpenAIServer
+
+def get_weather(city: str) -> str:
+    return f"{city}当前天气:晴，气温25摄氏度"
+
+def run_once(llm: HelloAgentsLLM, tools: ToolExecutor) -> float:
+    with contextlib.redirect_stdout(io.StringIO()):
+        agent = ReActAgent(llm, tools)
+        start = time.perf_counter()
+        answer = agent.run("北京今天适合去哪里玩？")
+        elapsed = time.perf_counter() - start
+    assert answer, "智能体未能给出最终答案"
+    return elapsed
+
+def median(samples) -> float:
+    return sorted(samples)[len(samples) // 2]
+
+def noop_cost(calls: int = 200000) -> dict:
+    """追踪关闭且丢弃事件时，单次 span 与 emit 调用的耗时（纳秒）。"""
+    start = time.perf_counter()
+    for _ in range(calls):
+        with span("noop", step=1):
+            pass
+    span_ns = (time.perf_counter() - start) / calls * 1e9
+    start = time.perf_counter()
+    for _ in range(calls):
+        emit("noop", "", step=1)
+    emit_ns = (time.perf_counter() - start) / calls * 1e9
+    return {"span_ns": span_ns, "emit_ns": emit_ns}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="追踪开销基准")
+    parser.add_argument("--runs", type=int, default=50)
+    parser.add_argument("--out-dir", default="/tmp/agent_traces", help="追踪文件的输出目录")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        tools = ToolExecutor()
+        tools.registerTool(get_weather, "查询指定城市的实时天气。")
+    with StubOpenAIServer() as stub:
+        llm = HelloAgentsLLM(model="stub-model", apiKey="stub", baseUrl=stub.base_url, stream_usage=True)
+        for _ in range(5):
+            run_once(llm, tools) # 预热连接
+
+        modes = {"控制台输出": [], "丢弃事件": [], "开启追踪": []}
+        tracer = None
+        for _ in range(args.runs):
+            modes["控制台输出"].append(run_once(llm, tools))
+            console_sink = set_event_sink(None)
+            modes["丢弃事件"].append(run_once(llm, tools))
+            tracer = enable_tracing(tracer)
+            modes["开启追踪"].append(run_once(llm, tools))
+            disable_tracing()
+            set_event_sink(console_sink)
+        set_event_sink(None)
+        noop = noop_cost()
+        set_event_sink(console_sink)
+
+    out_dir = Path(args.out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    tracer.export_jsonl(out_dir / "trace.jsonl")
+    tracer.export_chrome(out_dir / "trace.chrome.json")
+
+    print(f"\n--- 追踪开销: {args.runs} 次运行 ---")
+    baseline = median(modes["丢弃事件"])
+    for name, samples in modes.items():
+        seconds = median(samples)
+        print(f"{name:<8} 每次运行中位数 {seconds * 1000:>7.2f}ms ({(seconds / baseline - 1):+.1%})")
+    print(f"追踪关闭时: span {noop['span_ns']:.0f}ns/次, emit {noop['emit_ns']:.0f}ns/次")
+
+    print(f"\n{'span':<20} {'次数':>6} {'平均':>10} {'最大':>10}")
+    for name, stats in sorted(tracer.summary().items(), key=lambda item: -item[1]["total_s"]):
+        print(f"{name:<20} {stats['count']:>6} {stats['mean_s'] * 1000:>8.2f}ms {stats['max_s'] * 1000:>8.2f}ms")
+    print(f"\n追踪文件: {out_dir / 'trace.jsonl'}, {out_dir / 'trace.chrome.json'}（可在 https://ui.perfetto.dev 中打开）")
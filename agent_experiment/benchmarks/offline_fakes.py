@@ -0,0 +1,243 @@
+# 离线基准使用的假后端：按脚本回答的 LLM、按延迟分布休眠的假工具，以及记录每次运行中 LLM 与工具耗时的 RunRecorder。
+# 不访问任何网络服务，也不加载模型，使智能体循环本身的开销（提示词构造、解析、历史管理等）可以被单独测量。
+
+import asyncio
+import contextvars
+import math
+import random
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    from ..LLMClient import truncate_at_stop
+except ImportError: # benchmarks 作为顶层包导入时
+    from LLMClient import truncate_at_stop
+
+# --- 延迟分布 ---
+
+def parse_latency(spec) -> Callable[[random.Random], float]:
+    """
+    解析延迟分布，返回 sample(rng) -> 秒数 的函数。
+
+    支持的写法：
+      0.1 或 "const:0.1"          固定延迟
+      "uniform:0.05,0.2"          均匀分布
+      "normal:0.1,0.02"           正态分布（均值, 标准差），小于 0 时取 0
+      "lognormal:0.1,0.5"         对数正态分布（中位数, sigma），用于模拟长尾
+    """
+    if isinstance(spec, (int, float)):
+        value = float(spec)
+        return lambda rng: value
+    kind, _, params = spec.partition(":")
+    if not params:
+        value = float(kind)
+        return lambda rng: value
+    values = [float(value) for value in params.split(",")]
+    if kind == "const":
+        return lambda rng: values[0]
+    if kind == "uniform":
+        low, high = values
+        return lambda rng: rng.uniform(low, high)
+    if kind == "normal":
+        mean, stddev = values
+        return lambda rng: max(0.0, rng.gauss(mean, stddev))
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: rng.lognormvariate(math.log(median), sigma) if median > 0 else 0.0
+    raise ValueError(f"未知的延迟分布: {spec}")
+
+class LatencySampler:
+    """带独立随机数生成器的延迟采样器，线程安全，固定种子时可复现。"""
+    def __init__(self, spec, seed: int = 0):
+        self.spec = spec
+        self._sample = parse_latency(spec)
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sample(self) -> float:
+        with self._lock:
+            return self._sample(self._rng)
+
+# --- 每次运行的耗时记录 ---
+
+_current_run: contextvars.ContextVar = contextvars.ContextVar("current_run", default=None)
+
+class RunRecorder:
+    """
+    记录一次智能体运行中每次 LLM 调用与工具调用的起止时刻。
+    在运行开始时调用 activate()；之后在同一上下文中（包括经 submitTool、asyncio 任务与 asyncio.to_thread
+    传递上下文的调用）发生的假 LLM 与假工具调用都会记录到这里。
+    """
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.finished = None
+        self.llm_calls: List[Tuple[float, float]] = []
+        self.tool_calls: List[Tuple[float, float]] = []
+        self._lock = threading.Lock()
+
+    def activate(self) -> "RunRecorder":
+        _current_run.set(self)
+        self.started = time.perf_counter()
+        return self
+
+    def finish(self):
+        self.finished = time.perf_counter()
+
+    def _add(self, calls: List, started: float):
+        with self._lock:
+            calls.append((started, time.perf_counter()))
+
+    @staticmethod
+    def _busy_time(intervals, low: float, high: float) -> float:
+        """[low, high] 内被 intervals 覆盖的总时长（重叠部分只算一次）。"""
+        clipped = sorted((max(start, low), min(end, high)) for start, end in intervals if end > low and start < high)
+        busy, cursor = 0.0, low
+        for start, end in clipped:
+            start = max(start, cursor)
+            if end > start:
+                busy += end - start
+                cursor = end
+        return busy
+
+    def breakdown(self) -> Dict:
+        """
+        按 LLM 调用划分步骤（每一步从一次 LLM 调用开始，到下一次调用或运行结束为止），
+        统计端到端与每一步的耗时、等待 LLM 与工具的时间，其余即框架自身的开销。
+        """
+        end = self.finished or time.perf_counter()
+        waits = self.llm_calls + self.tool_calls
+        starts = sorted(start for start, _ in self.llm_calls)
+        boundaries = starts + [end]
+        steps = []
+        for step_start, step_end in zip(boundaries, boundaries[1:]):
+            llm_s = self._busy_time(self.llm_calls, step_start, step_end)
+            tools_s = self._busy_time(self.tool_calls, step_start, step_end)
+            waiting_s = self._busy_time(waits, step_start, step_end)
+            steps.append({
+                "latency_s": step_end - step_start,
+                "llm_s": llm_s,
+                "tools_s": tools_s,
+                "overhead_s": (step_end - step_start) - waiting_s,
+            })
+        total_s = end - self.started
+        return {
+            "latency_s": total_s,
+            "llm_s": self._busy_time(self.llm_calls, self.started, end),
+            "tools_s": self._busy_time(self.tool_calls, self.started, end),
+            "overhead_s": total_s - self._busy_time(waits, self.started, end),
+            "llm_calls": len(self.llm_calls),
+            "tool_calls": len(self.tool_calls),
+            "steps": steps,
+        }
+
+def current_run() -> Optional[RunRecorder]:
+    return _current_run.get()
+
+# --- 脚本化的 LLM ---
+
+class ScriptedLLM:
+    """
+    按脚本回答的假 LLM：第 n 次调用（在同一次运行中计数）返回 script[n]，超出脚本时重复最后一条。
+    延迟由首 Token 延迟与逐段输出的间隔组成，提供 HelloAgentsLLM 的 think / think_stream，
+    以及 agent_first_try 使用的 generate(prompt, system_prompt) 与 agent_second_try 使用的 generate_response。
+
+    :param script: 依次返回的回答
+    :param ttft: 首 Token 延迟的分布（见 parse_latency）
+    :param chunk_delay: 相邻两段输出之间的间隔（秒）
+    :param chunk_size: 每段输出的字符数
+    """
+    def __init__(self, script: List[str], ttft="const:0", chunk_delay: float = 0.0, chunk_size: int = 8,
+                 seed: int = 0):
+        if not script:
+            raise ValueError("脚本至少需要一条回答。")
+        self.script = script
+        self.ttft = LatencySampler(ttft, seed)
+        self.chunk_delay = chunk_delay
+        self.chunk_size = chunk_size
+        self.model = "scripted"
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _next_response(self) -> str:
+        run = current_run()
+        with self._lock:
+            self.calls += 1
+            index = len(run.llm_calls) if run is not None else self.calls - 1
+        return self.script[min(index, len(self.script) - 1)]
+
+    def _chunks(self, text: str) -> List[str]:
+        return [text[i:i + self.chunk_size] for i in range(0, len(text), self.chunk_size)]
+
+    def think_stream(self, messages: List[Dict[str, str]], temperature: float = 0, stop: List[str] = None,
+                     stop_on_action: bool = None, **kwargs):
+        run, started = current_run(), time.perf_counter()
+        text = truncate_at_stop(self._next_response(), stop, bool(stop_on_action))
+        try:
+            time.sleep(self.ttft.sample())
+            for i, chunk in enumerate(self._chunks(text)):
+                if i and self.chunk_delay:
+                    time.sleep(self.chunk_delay)
+                yield chunk
+        finally:
+            if run is not None:
+                run._add(run.llm_calls, started)
+
+    def think(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return "".join(self.think_stream(messages, **kwargs))
+
+    def generate(self, prompt: str, system_prompt: str = None) -> str:
+        return self.think([{"role": "system", "content": system_prompt}, {"role": "user", "content": prompt}])
+
+    def generate_response(self, user_input: str) -> str:
+        return self.think([{"role": "user", "content": user_input}])
+
+class AsyncScriptedLLM(ScriptedLLM):
+    """ScriptedLLM 的协程版本，供 ReActAgent.arun 使用。"""
+    async def think_stream(self, messages: List[Dict[str, str]], temperature: float = 0, stop: List[str] = None,
+                           stop_on_action: bool = None, **kwargs):
+        run, started = current_run(), time.perf_counter()
+        text = truncate_at_stop(self._next_response(), stop, bool(stop_on_action))
+        try:
+            await asyncio.sleep(self.ttft.sample())
+            for i, chunk in enumerate(self._chunks(text)):
+                if i and self.chunk_delay:
+                    await asyncio.sleep(self.chunk_delay)
+                yield chunk
+        finally:
+            if run is not None:
+                run._add(run.llm_calls, started)
+
+    async def think(self, messages: List[Dict[str, str]], **kwargs) -> str:
+        return "".join([chunk async for chunk in self.think_stream(messages, **kwargs)])
+
+# --- 假工具 ---
+
+class FakeTools:
+    """
+    与真实工具同名、同签名的假工具（search、get_weather、get_attraction），按给定的延迟分布休眠后返回固定格式的结果。
+    以绑定方法的形式注册到 ToolExecutor 即可，工具名称取自方法名。
+    """
+    def __init__(self, latency="const:0", seed: int = 0):
+        self.latency = LatencySampler(latency, seed)
+
+    def _wait(self):
+        run, started = current_run(), time.perf_counter()
+        time.sleep(self.latency.sample())
+        if run is not None:
+            run._add(run.tool_calls, started)
+
+    def search(self, query: str) -> str:
+        """一个网页搜索引擎，返回与关键词相关的网页摘要。"""
+        self._wait()
+        return f"[1] {query}\n关于“{query}”的搜索结果摘要。"
+
+    def get_weather(self, city: str) -> str:
+        """查询指定城市的实时天气。"""
+        self._wait()
+        return f"{city}当前天气:晴，气温25摄氏度"
+
+    def get_attraction(self, city: str, weather: str) -> str:
+        """根据城市和天气搜索推荐的旅游景点。"""
+        self._wait()
+        return f"{city}在{weather}天气下推荐游览颐和园与故宫。"
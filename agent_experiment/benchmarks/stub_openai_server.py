@@ -0,0 +1,156 @@
+# 兼容 OpenAI /v1/chat/completions 接口的本地桩服务器
+# 用于在不访问真实模型服务的情况下测试与压测 HelloAgentsLLM 系列客户端，可注入首 Token 延迟与错误
+
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import Callable, Dict, List, Union
+
+def react_responder(messages: List[Dict[str, str]]) -> str:
+    """
+    默认的脚本化回答：历史为空时调用一次天气工具，拿到 Observation 后给出最终答案。
+    """
+    prompt = messages[-1]["content"]
+    if "Observation:" not in prompt:
+        return "Thought: 需要先查询北京的天气。\nAction: get_weather[北京]"
+    return "Thought: 已经获得天气信息，可以回答了。\nAction: Finish[北京今天晴，适合去颐和园。]"
+
+class StubOpenAIServer:
+    """
+    在后台线程中运行的桩服务器。
+
+    :param responder: 根据 messages 返回完整回答文本的函数
+    :param chunk_size: 流式响应中每个 chunk 包含的字符数
+    :param chunk_delay: 相邻两个 chunk 之间的间隔（秒）
+    :param first_token_delay: 首个 chunk 之前的延迟（秒），也可以是每次请求调用一次、返回秒数的函数
+    :param error_rate: 以该概率直接返回 HTTP 500
+    """
+    def __init__(self, responder: Callable[[List[Dict[str, str]]], str] = react_responder,
+                 chunk_size: int = 8, chunk_delay: float = 0.0,
+                 first_token_delay: Union[float, Callable[[], float]] = 0.0, error_rate: float = 0.0,
+                 host: str = "127.0.0.1", port: int = 0):
+        self.responder = responder
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.first_token_delay = first_token_delay
+        self.error_rate = error_rate
+        self.request_count = 0
+        self.chunks_sent = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._make_handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "StubOpenAIServer":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _next_first_token_delay(self) -> float:
+        if callable(self.first_token_delay):
+            return self.first_token_delay()
+        return self.first_token_delay
+
+    def _make_handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def handle(self):
+                try:
+                    super().handle()
+                except ConnectionResetError:
+                    pass # 客户端关闭了保持的连接
+
+            def _send_json(self, status: int, payload: Dict):
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _write_chunk(self, data: bytes):
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+                self.wfile.flush()
+
+            def do_POST(self):
+                request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                with stub._lock:
+                    stub.request_count += 1
+
+                time.sleep(stub._next_first_token_delay())
+                if stub.error_rate and random.random() < stub.error_rate:
+                    self._send_json(500, {"error": {"message": "injected error", "type": "server_error"}})
+                    return
+
+                text = stub.responder(request.get("messages", []))
+                model = request.get("model", "stub-model")
+                if not request.get("stream"):
+                    self._send_json(200, {
+                        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": model,
+                        "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+                    })
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                try:
+                    for i in range(0, len(text), stub.chunk_size):
+                        if i and stub.chunk_delay:
+                            time.sleep(stub.chunk_delay)
+                        chunk = {
+                            "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                            "choices": [{"index": 0, "delta": {"content": text[i:i + stub.chunk_size]}, "finish_reason": None}],
+                        }
+                        self._write_chunk(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                        with stub._lock:
+                            stub.chunks_sent += 1
+                    if (request.get("stream_options") or {}).get("include_usage"):
+                        # 与 OpenAI 一致，用量放在最后一个 choices 为空的 chunk 中；这里按字符数粗略计数
+                        prompt_chars = sum(len(str(message.get("content", ""))) for message in request.get("messages", []))
+                        usage_chunk = {
+                            "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()), "model": model,
+                            "choices": [], "usage": {"prompt_tokens": prompt_chars, "completion_tokens": len(text),
+                                                     "total_tokens": prompt_chars + len(text)},
+                        }
+                        self._write_chunk(f"data: {json.dumps(usage_chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+                    self._write_chunk(b"data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass # 客户端提前关闭了流
+
+        return Handler
+
+if __name__ == '__main__':
+    with StubOpenAIServer(first_token_delay=0.1, chunk_delay=0.01) as stub:
+        print(f"桩服务器已启动: {stub.base_url} (Ctrl+C 退出)")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
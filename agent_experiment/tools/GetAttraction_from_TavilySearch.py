@@ -3,9 +3,28 @@ from pathlib import Path
 from dotenv import load_dotenv
 from tavily import TavilyClient
 
+try:
+    from .HttpPool import PooledSession
+    from .ToolCache import ErrorResult
+except ImportError: # 直接在 tools 目录下运行时
+    from HttpPool import PooledSession
+    from ToolCache import ErrorResult
+
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
 
+_clients = {}
+
+def _get_tavily_client(api_key: str) -> TavilyClient:
+    """
+    按 API 密钥复用 TavilyClient。每个客户端使用自己的连接池：TavilyClient 会把 API 密钥写入会话的请求头，
+    使用共享会话会让其他工具的请求也带上它。搜索是 POST 请求，沿用默认设置不重试。
+    """
+    client = _clients.get(api_key)
+    if client is None:
+        client = _clients[api_key] = TavilyClient(api_key=api_key, session=PooledSession())
+    return client
+
 def get_attraction(city: str, weather: str) -> str:
     """
     根据城市和天气，使用Tavily Search API搜索并返回优化后的景点推荐。
@@ -13,10 +32,10 @@ def get_attraction(city: str, weather: str) -> str:
     # 1. 从环境变量中读取API密钥
     api_key = os.environ.get("TAVILY_API_KEY")
     if not api_key:
-        return "错误:未配置TAVILY_API_KEY环境变量。"
+        return ErrorResult("错误:未配置TAVILY_API_KEY环境变量。")
 
-    # 2. 初始化Tavily客户端
-    tavily = TavilyClient(api_key=api_key)
+    # 2. 获取（复用）Tavily客户端
+    tavily = _get_tavily_client(api_key)
     
     # 3. 构造一个精确的查询
     query = f"'{city}' 在'{weather}'天气下最值得去的旅游景点推荐及理由"
@@ -45,7 +64,7 @@ def get_attraction(city: str, weather: str) -> str:
         return "根据搜索，为您找到以下信息:\n" + "\n".join(formatted_results)
 
     except Exception as e:
-        return f"错误:执行Tavily搜索时出现问题 - {e}"
+        return ErrorResult(f"错误:执行Tavily搜索时出现问题 - {e}")
 
 # 查詢旅遊景點 Agent 工具示例
 if __name__ == '__main__':
@@ -1,15 +1,25 @@
+import os
 import requests
 
+try:
+    from .HttpPool import get_session
+    from .ToolCache import ErrorResult
+except ImportError: # 直接在 tools 目录下运行时
+    from HttpPool import get_session
+    from ToolCache import ErrorResult
+
+WTTR_BASE_URL = os.getenv("WTTR_BASE_URL", "https://wttr.in")
+
 def get_weather(city: str) -> str:
     """
     通过调用 wttr.in API 查询真实的天气信息。
     """
     # API端点，我们请求JSON格式的数据
-    url = f"https://wttr.in/{city}?format=j1"
+    url = f"{WTTR_BASE_URL}/{city}?format=j1"
     
     try:
-        # 发起网络请求
-        response = requests.get(url)
+        # 发起网络请求（共享连接池，带超时与重试）
+        response = get_session().get(url)
         # 检查响应状态码是否为200 (成功)
         response.raise_for_status() 
         # 解析返回的JSON数据
@@ -25,7 +35,7 @@ def get_weather(city: str) -> str:
         
     except requests.exceptions.RequestException as e:
         # 处理网络错误
-        return f"错误:查询天气时遇到网络问题 - {e}"
+        return ErrorResult(f"错误:查询天气时遇到网络问题 - {e}")
     except (KeyError, IndexError) as e:
         # 处理数据解析错误
-        return f"错误:解析天气数据失败，可能是城市名称无效 - {e}"
\ No newline at end of file
+        return ErrorResult(f"错误:解析天气数据失败，可能是城市名称无效 - {e}")
\ No newline at end of file
@@ -0,0 +1,67 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# 连接超时与读取超时（秒）：上游响应过慢时快速失败，而不是让智能体永远挂起
+DEFAULT_TIMEOUT = (3.05, 20)
+# 每个主机保留的最大连接数，应不小于 ToolExecutor 的并行线程数
+POOL_MAXSIZE = 16
+# 连接错误与 429/5xx 的重试次数，重试间隔按 backoff_factor 指数退避（0.5s, 1s, 2s...），429 时优先按 Retry-After 等待
+MAX_RETRIES = 3
+BACKOFF_FACTOR = 0.5
+# 默认只重试幂等的请求；POST 等非幂等请求重试可能重复执行操作，需要由工具显式开启
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE"})
+
+class PooledSession(requests.Session):
+    """
+    带连接池、默认超时与重试的 requests.Session。
+    所有网络工具共用同一个实例，从而复用 keep-alive 连接，省去每次调用的 DNS、TCP 与 TLS 握手。
+    会修改会话级请求头（如写入 Authorization）的客户端不能使用共享实例，应各自创建一个。
+
+    :param retry_methods: 允许重试的 HTTP 方法，默认只包含幂等方法
+    """
+    def __init__(self, timeout=DEFAULT_TIMEOUT, pool_maxsize: int = POOL_MAXSIZE,
+                 max_retries: int = MAX_RETRIES, backoff_factor: float = BACKOFF_FACTOR,
+                 retry_methods=IDEMPOTENT_METHODS):
+        super().__init__()
+        self.timeout = timeout
+        retry = Retry(
+            total=max_retries,
+            backoff_factor=backoff_factor,
+            status_forcelist=(429, 500, 502, 503, 504),
+            allowed_methods=frozenset(retry_methods),
+            raise_on_status=False,
+        )
+        adapter = HTTPAdapter(pool_connections=pool_maxsize, pool_maxsize=pool_maxsize, max_retries=retry)
+        self.mount("http://", adapter)
+        self.mount("https://", adapter)
+
+    def request(self, method, url, **kwargs):
+        kwargs.setdefault("timeout", self.timeout)
+        return super().request(method, url, **kwargs)
+
+_session: PooledSession = None
+_session_lock = threading.Lock()
+
+def get_session() -> PooledSession:
+    """
+    获取进程内共享的 HTTP 会话（首次调用时创建）。
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = PooledSession()
+    return _session
+
+def configure_session(**kwargs) -> PooledSession:
+    """
+    以新的参数（timeout、pool_maxsize、max_retries、backoff_factor）重建共享会话。
+    """
+    global _session
+    with _session_lock:
+        old_session, _session = _session, PooledSession(**kwargs)
+    if old_session is not None:
+        old_session.close()
+    return _session
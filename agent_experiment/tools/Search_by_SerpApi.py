@@ -3,19 +3,40 @@ from pathlib import Path
 from dotenv import load_dotenv
 from serpapi import SerpApiClient
 
+try:
+    from .HttpPool import get_session
+    from .ToolCache import ErrorResult
+except ImportError: # 直接在 tools 目录下运行时
+    from HttpPool import get_session
+    from ToolCache import ErrorResult
+
+try:
+    from ..Tracing import emit
+except ImportError: # tools 作为顶层包导入，或直接在 tools 目录下运行时（导入 ToolCache 时已将上级目录加入 sys.path）
+    from Tracing import emit
+
 env_path = Path(__file__).parent.parent / ".env"
 load_dotenv(env_path)
 
+class PooledSerpApiClient(SerpApiClient):
+    """
+    SerpApiClient 每次请求都直接调用 requests.get（且默认超时长达 60000 秒），
+    这里改为走共享的 HTTP 连接池，使用连接池的默认超时与重试。
+    """
+    def get_response(self, path="/search"):
+        url, parameter = self.construct_url(path)
+        return get_session().get(url, params=parameter)
+
 def search(query: str) -> str:
     """
     一个基于SerpApi的实战网页搜索引擎工具。
     它会智能地解析搜索结果，优先返回直接答案或知识图谱信息。
     """
-    print(f"🔍 正在执行 [SerpApi] 网页搜索: {query}")
+    emit("tool.search", f"🔍 正在执行 [SerpApi] 网页搜索: {query}", engine="serpapi", query=query)
     try:
         api_key = os.getenv("SERPAPI_API_KEY")
         if not api_key:
-            return "错误:SERPAPI_API_KEY 未在 .env 文件中配置。"
+            return ErrorResult("错误:SERPAPI_API_KEY 未在 .env 文件中配置。")
 
         params = {
             "engine": "google",
@@ -25,7 +46,7 @@ def search(query: str) -> str:
             "hl": "zh-cn", # 语言代码
         }
         
-        client = SerpApiClient(params)
+        client = PooledSerpApiClient(params)
         results = client.get_dict()
         
         # 智能解析:优先寻找最直接的答案
@@ -46,4 +67,4 @@ def search(query: str) -> str:
         return f"对不起，没有找到关于 '{query}' 的信息。"
 
     except Exception as e:
-        return f"搜索时发生错误: {e}"
\ No newline at end of file
+        return ErrorResult(f"搜索时发生错误: {e}")
\ No newline at end of file
@@ -0,0 +1,288 @@
+import asyncio
+import functools
+import inspect
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Any, Callable, Dict, Tuple
+
+try:
+    from ..Tracing import emit
+except ImportError: # tools 作为顶层包导入，或直接在 tools 目录下运行时
+    _AGENT_DIR = str(Path(__file__).resolve().parent.parent)
+    if _AGENT_DIR not in sys.path:
+        sys.path.append(_AGENT_DIR)
+    from Tracing import emit
+
+# 磁盘缓存的默认位置，所有工具共用一个 SQLite 文件，以工具名区分
+DEFAULT_CACHE_PATH = Path(__file__).parent.parent / ".cache" / "tool_cache.sqlite"
+
+_MISSING = object()
+
+class ErrorResult(str):
+    """
+    工具以返回值（而不是异常）报告的错误，如网络请求失败时的 "错误:..."。
+    它就是一个字符串，可以照常作为 Observation 使用；ToolResultCache 不缓存这类结果，抛出的异常同样不缓存。
+    """
+
+class MemoryCacheBackend:
+    """
+    进程内的 LRU 缓存后端。
+    """
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            value, expires_at = item
+            if expires_at < time.time():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any, expires_at: float):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+class DiskCacheBackend:
+    """
+    基于 SQLite 的磁盘缓存后端，进程重启后缓存依然有效。
+    每个工具只占用其 namespace 下的条目，超过 maxsize 时淘汰最久未访问的条目。
+    每个线程使用自己的连接（WAL 模式），并行的工具调用读写缓存时互不阻塞。
+    """
+    def __init__(self, namespace: str, maxsize: int = 128, path: Path = DEFAULT_CACHE_PATH):
+        self.namespace = namespace
+        self.maxsize = maxsize
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._local = threading.local()
+        with self._conn() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS tool_cache ("
+                " namespace TEXT, key TEXT, value TEXT, expires_at REAL, last_access REAL,"
+                " PRIMARY KEY (namespace, key))"
+            )
+
+    def _conn(self) -> sqlite3.Connection:
+        """当前线程的连接，首次使用时创建。"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = sqlite3.connect(str(self.path), timeout=10)
+        return conn
+
+    def get(self, key: str) -> Any:
+        with self._conn() as conn:
+            row = conn.execute(
+                "SELECT value, expires_at FROM tool_cache WHERE namespace = ? AND key = ?",
+                (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                return _MISSING
+            value, expires_at = row
+            if expires_at < time.time():
+                conn.execute("DELETE FROM tool_cache WHERE namespace = ? AND key = ?", (self.namespace, key))
+                return _MISSING
+            conn.execute(
+                "UPDATE tool_cache SET last_access = ? WHERE namespace = ? AND key = ?",
+                (time.time(), self.namespace, key)
+            )
+            return json.loads(value)
+
+    def set(self, key: str, value: Any, expires_at: float):
+        value = json.dumps(value, ensure_ascii=False) # 无法序列化时在写入前抛出
+        with self._conn() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO tool_cache VALUES (?, ?, ?, ?, ?)",
+                (self.namespace, key, value, expires_at, time.time())
+            )
+            # 只保留最近访问的 maxsize 条
+            conn.execute(
+                "DELETE FROM tool_cache WHERE namespace = ? AND key NOT IN ("
+                " SELECT key FROM tool_cache WHERE namespace = ? ORDER BY last_access DESC LIMIT ?)",
+                (self.namespace, self.namespace, self.maxsize)
+            )
+
+    def clear(self):
+        with self._conn() as conn:
+            conn.execute("DELETE FROM tool_cache WHERE namespace = ?", (self.namespace,))
+
+class ToolResultCache:
+    """
+    工具结果缓存：按规范化后的参数缓存结果，带 TTL 与容量上限。
+    相同参数的并发调用只会真正执行一次（single-flight），其余调用等待并共享结果。
+    """
+    def __init__(self, func: Callable, ttl: float, maxsize: int = 128, backend: str = "memory",
+                 cache_path: Path = DEFAULT_CACHE_PATH, cacheable: Callable[[Any], bool] = None):
+        """
+        :param ttl: 缓存有效期（秒）
+        :param maxsize: 最多缓存的条目数
+        :param backend: "memory" 或 "disk"
+        :param cacheable: 判断结果能否缓存的函数，默认不缓存 ErrorResult
+        """
+        self.func = func
+        self.name = func.__name__
+        self.ttl = ttl
+        self.signature = inspect.signature(func)
+        self.cacheable = cacheable or (lambda result: not isinstance(result, ErrorResult))
+        if backend == "memory":
+            self.backend = MemoryCacheBackend(maxsize)
+        elif backend == "disk":
+            self.backend = DiskCacheBackend(self.name, maxsize, cache_path)
+        else:
+            raise ValueError(f"不支持的缓存后端: {backend}")
+
+        self.hits = 0
+        self.misses = 0
+        self.shared = 0 # 通过 single-flight 共享进行中请求结果的次数
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+
+    def make_key(self, args: tuple, kwargs: dict) -> str:
+        """
+        将位置参数与关键字参数统一绑定为参数名 -> 值，并去掉字符串首尾及重复的空白。
+        """
+        bound = self.signature.bind(*args, **kwargs)
+        bound.apply_defaults()
+        normalized = {
+            name: " ".join(value.split()) if isinstance(value, str) else value
+            for name, value in bound.arguments.items()
+        }
+        return json.dumps(normalized, sort_keys=True, ensure_ascii=False, default=str)
+
+    def _lookup(self, key: str) -> Tuple[Any, Future, bool]:
+        """返回 (缓存的值, 进行中请求的 Future, 是否由本次调用执行)；命中时 Future 为 None。"""
+        value = self._get(key) # 读缓存（可能是磁盘 I/O）不持有锁
+        with self._lock:
+            if value is not _MISSING:
+                self.hits += 1
+                return value, None, False
+            flight = self._inflight.get(key)
+            if flight is not None:
+                self.shared += 1
+                return _MISSING, flight, False
+            flight = self._inflight[key] = Future()
+            self.misses += 1
+            return _MISSING, flight, True
+
+    def _store(self, key: str, flight: Future, value: Any = _MISSING, error: BaseException = None):
+        try:
+            if error is not None:
+                flight.set_exception(error)
+                return
+            if self.cacheable(value):
+                self._set(key, value)
+            flight.set_result(value)
+        finally:
+            with self._lock:
+                del self._inflight[key]
+
+    def _get(self, key: str) -> Any:
+        try:
+            return self.backend.get(key)
+        except Exception as e: # 缓存只是加速，读取失败时当作未命中
+            emit("tool.cache_error", f"⚠️ 读取工具 '{self.name}' 的缓存失败: {e}", tool=self.name)
+            return _MISSING
+
+    def _set(self, key: str, value: Any):
+        try:
+            self.backend.set(key, value, time.time() + self.ttl)
+        except Exception as e: # 如结果无法序列化，不缓存，但结果照常返回
+            emit("tool.cache_error", f"⚠️ 工具 '{self.name}' 的结果未能写入缓存: {e}", tool=self.name)
+
+    def __call__(self, *args, **kwargs):
+        try:
+            key = self.make_key(args, kwargs)
+        except TypeError:
+            # 参数与函数签名不匹配，交给函数本身报错
+            return self.func(*args, **kwargs)
+
+        value, flight, is_leader = self._lookup(key)
+        if flight is None:
+            return value
+        if not is_leader:
+            return flight.result()
+
+        try:
+            value = self.func(*args, **kwargs)
+        except BaseException as e:
+            self._store(key, flight, error=e)
+            raise
+        self._store(key, flight, value)
+        return value
+
+    async def acall(self, *args, **kwargs):
+        """
+        协程工具的 __call__：等待进行中的相同请求时不阻塞事件循环。
+        in-flight 表与同步调用共用（concurrent.futures.Future），不同线程、不同事件循环中的调用同样只执行一次。
+        """
+        try:
+            key = self.make_key(args, kwargs)
+        except TypeError:
+            return await self.func(*args, **kwargs)
+
+        value, flight, is_leader = self._lookup(key)
+        if flight is None:
+            return value
+        if not is_leader:
+            return await asyncio.wrap_future(flight)
+
+        try:
+            value = await self.func(*args, **kwargs)
+        except BaseException as e:
+            self._store(key, flight, error=e)
+            raise
+        self._store(key, flight, value)
+        return value
+
+    def stats(self) -> Dict[str, int]:
+        total = self.hits + self.misses + self.shared
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self.shared,
+            "hit_rate": (self.hits + self.shared) / total if total else 0.0,
+        }
+
+    def clear(self):
+        self.backend.clear()
+
+def cached_tool(func: Callable, ttl: float, **cache_kwargs) -> Callable:
+    """
+    用 ToolResultCache 包装工具函数，保留原函数的名称与签名（CheckToolParameterSatisfied 依赖签名），
+    协程函数包装后仍是协程函数。
+    """
+    cache = ToolResultCache(func, ttl, **cache_kwargs)
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            return await cache.acall(*args, **kwargs)
+
+        async_wrapper.cache = cache
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return cache(*args, **kwargs)
+
+    wrapper.cache = cache
+    return wrapper
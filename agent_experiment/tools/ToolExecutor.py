@@ -1,21 +1,62 @@
-from typing import Dict, Any
+import asyncio
+import contextvars
+import inspect
+import sys
+import threading
+from pathlib import Path
+from typing import Dict, Any, List, Tuple
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from .ToolCache import cached_tool, DEFAULT_CACHE_PATH
+except ImportError: # 直接在 tools 目录下运行时
+    from ToolCache import cached_tool, DEFAULT_CACHE_PATH
+
+try:
+    from ..Tracing import emit, span
+except ImportError: # tools 作为顶层包导入，或直接在 tools 目录下运行时
+    _AGENT_DIR = str(Path(__file__).resolve().parent.parent)
+    if _AGENT_DIR not in sys.path:
+        sys.path.append(_AGENT_DIR)
+    from Tracing import emit, span
 
 class ToolExecutor:
     """
     一个 Agent 工具执行器，负责管理和执行工具。
     """
-    def __init__(self):
+    def __init__(self, max_workers: int = 4, cassette=None):
+        """
+        :param max_workers: 并行执行工具调用时线程池的最大线程数
+        :param cassette: Cassette 对象；提供时之后注册的工具都经由它录制或回放（在结果缓存之内，只记录真实的调用）
+        """
         self.tools: Dict[str, Dict[str, Any]] = {}
-
-    def registerTool(self, func: callable, description: str):
+        self.cassette = cassette
+        self.max_workers = max_workers
+        self._pool: ThreadPoolExecutor = None
+        self._pool_lock = threading.Lock() # 异步与批量运行时可能有多个线程同时首次提交
+        self.version = 0 # 每次注册工具时加一，供调用方判断工具描述是否变化
+        self._tools_desc = None # (version, 描述字符串)
+
+    def registerTool(self, func: callable, description: str, cache_ttl: float = None, cache_maxsize: int = 128,
+                     cache_backend: str = "memory", cache_path=DEFAULT_CACHE_PATH):
         """
         向工具箱中注册一个新工具。
+
+        :param cache_ttl: 结果缓存的有效期（秒），None 表示不缓存
+        :param cache_maxsize: 结果缓存的最大条目数
+        :param cache_backend: "memory"（进程内）或 "disk"（SQLite，重启后依然有效）
+        :param cache_path: 磁盘缓存文件的路径
         """
         name = func.__name__
         if name in self.tools:
-            print(f"警告:工具 '{name}' 已存在，将被覆盖。")
+            emit("tool.overwrite", f"警告:工具 '{name}' 已存在，将被覆盖。", tool=name)
+        if self.cassette is not None:
+            func = self.cassette.wrap_tool(func)
+        if cache_ttl is not None:
+            func = cached_tool(func, cache_ttl, maxsize=cache_maxsize, backend=cache_backend, cache_path=cache_path)
         self.tools[name] = {"description": description, "func": func}
-        print(f"工具 '{name}' 已注册。")
+        self.version += 1
+        emit("tool.register", f"工具 '{name}' 已注册。", tool=name)
 
     def getTool(self, name: str) -> callable:
         """
@@ -23,17 +64,98 @@ class ToolExecutor:
         """
         return self.tools.get(name, {}).get("func")
 
-    def getAvailableTools(self) -> str:
+    def getCacheStats(self) -> Dict[str, Dict[str, int]]:
         """
-        获取所有可用工具的格式化描述字符串。
+        获取所有启用了缓存的工具的命中统计。
         """
-        return "\n".join([
-            f"- {name}: {info['description']}" 
+        return {
+            name: info["func"].cache.stats()
             for name, info in self.tools.items()
-        ])
+            if hasattr(info["func"], "cache")
+        }
+
+    def executeTool(self, name: str, tool_input: Any) -> str:
+        """
+        执行一次工具调用并返回观察结果，出错时返回错误描述而不是抛出异常。
+        协程工具在这里没有事件循环可用，会以 asyncio.run 执行；在事件循环中请使用 aexecuteTool。
+
+        :param tool_input: 字符串作为唯一的位置参数传入；字典作为关键字参数传入
+        """
+        with span("tool", "tool", tool=name, input=str(tool_input)[:200]) as tool_span:
+            tool_function = self.getTool(name)
+            if not tool_function:
+                tool_span.set(error="not_found")
+                return f"错误:未找到名为 '{name}' 的工具。"
+            try:
+                result = self._call(tool_function, tool_input)
+                return asyncio.run(result) if inspect.iscoroutine(result) else result
+            except Exception as e:
+                tool_span.set(error=f"{type(e).__name__}: {e}")
+                return f"错误:执行工具 '{name}' 时出现问题 - {e}"
+
+    async def aexecuteTool(self, name: str, tool_input: Any) -> str:
+        """
+        executeTool 的协程版本：协程工具直接 await，同步工具放到线程中执行；
+        两者的错误处理、追踪与缓存/录制包装都与 executeTool 相同，出错时返回错误描述而不是抛出异常。
+        """
+        tool_function = self.getTool(name)
+        if not (tool_function and inspect.iscoroutinefunction(tool_function)):
+            return await asyncio.to_thread(self.executeTool, name, tool_input)
+        with span("tool", "tool", tool=name, input=str(tool_input)[:200]) as tool_span:
+            try:
+                return await self._call(tool_function, tool_input)
+            except Exception as e:
+                tool_span.set(error=f"{type(e).__name__}: {e}")
+                return f"错误:执行工具 '{name}' 时出现问题 - {e}"
+
+    @staticmethod
+    def _call(tool_function: callable, tool_input: Any):
+        if isinstance(tool_input, dict):
+            return tool_function(**tool_input)
+        return tool_function(tool_input)
+
+    def submitTool(self, name: str, tool_input: Any) -> Future:
+        """
+        将一次工具调用提交到线程池，立即返回 Future。工具在提交时的上下文中执行，追踪时其 span 挂在当前步骤之下。
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="tool")
+            pool = self._pool
+        return pool.submit(contextvars.copy_context().run, self.executeTool, name, tool_input)
+
+    def executeBatch(self, calls: List[Tuple[str, Any]]) -> List[str]:
+        """
+        并行执行多次互不依赖的工具调用（线程池大小受 max_workers 限制），按输入顺序返回观察结果。
+
+        :param calls: (工具名称, 工具输入) 列表
+        """
+        if len(calls) <= 1:
+            return [self.executeTool(name, tool_input) for name, tool_input in calls]
+        futures = [self.submitTool(name, tool_input) for name, tool_input in calls]
+        return [future.result() for future in futures]
+
+    def shutdown(self):
+        """
+        关闭线程池。
+        """
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+    def getAvailableTools(self) -> str:
+        """
+        获取所有可用工具的格式化描述字符串，工具未变化时直接返回上次的结果。
+        """
+        if self._tools_desc is None or self._tools_desc[0] != self.version:
+            self._tools_desc = (self.version, "\n".join([
+                f"- {name}: {info['description']}" 
+                for name, info in self.tools.items()
+            ]))
+        return self._tools_desc[1]
 
 
-import inspect
 def CheckToolParameterSatisfied(tool: callable, kwargs:dict) -> tuple[bool, dict, str]:
     """
     檢查 LLM 是否正確提供了工具所需的參數
@@ -69,70 +69,82 @@ class OpenAICompatibleClient:
 import re
 import os
 
-# --- 1. 配置LLM客户端 ---
-# 请根据您使用的服务，将这里替换成对应的凭证和地址
-API_KEY = "YOUR_API_KEY" # TODO
-BASE_URL = "YOUR_BASE_URL" # TODO
-MODEL_ID = "YOUR_MODEL_ID" # TODO
-TAVILY_API_KEY="YOUR_Tavily_KEY" # TODO
-os.environ['TAVILY_API_KEY'] = "YOUR_TAVILY_API_KEY" # TODO
-
-llm = OpenAICompatibleClient(
-    model=MODEL_ID,
-    api_key=API_KEY,
-    base_url=BASE_URL
-)
-
-# --- 2. 初始化 ---
-user_prompt = "你好，请帮我查询一下今天北京的天气，然后根据天气推荐一个合适的旅游景点。"
-prompt_history = [f"用户请求: {user_prompt}"]
-
-print(f"用户输入: {user_prompt}\n" + "="*40)
-
-# --- 3. 运行主循环 ---
-for i in range(5): # 设置最大循环次数
-    print(f"--- 循环 {i+1} ---\n")
-    
-    # 3.1. 构建Prompt
-    full_prompt = "\n".join(prompt_history)
-    
-    # 3.2. 调用LLM进行思考
-    llm_output = llm.generate(full_prompt, system_prompt=AGENT_SYSTEM_PROMPT)
-    # 模型可能会输出多余的Thought-Action，需要截断
-    match = re.search(r'(Thought:.*?Action:.*?)(?=\n\s*(?:Thought:|Action:|Observation:)|\Z)', llm_output, re.DOTALL)
-    if match:
-        truncated = match.group(1).strip()
-        if truncated != llm_output.strip():
-            llm_output = truncated
-            print("已截断多余的 Thought-Action 对")
-    print(f"模型输出:\n{llm_output}\n")
-    prompt_history.append(llm_output)
-    
-    # 3.3. 解析并执行行动
-    action_match = re.search(r"Action: (.*)", llm_output, re.DOTALL)
-    if not action_match:
-        observation = "错误: 未能解析到 Action 字段。请确保你的回复严格遵循 'Thought: ... Action: ...' 的格式。"
+def run_agent(llm, user_prompt: str, tools: dict = None, max_steps: int = 5):
+    """
+    运行 Thought-Action 主循环，返回最终答案；超过最大循环次数时返回 None。
+
+    :param llm: 提供 generate(prompt, system_prompt) 的客户端
+    :param tools: 工具名称 -> 工具函数，默认为 available_tools
+    """
+    tools = available_tools if tools is None else tools
+    prompt_history = [f"用户请求: {user_prompt}"]
+
+    print(f"用户输入: {user_prompt}\n" + "="*40)
+
+    # --- 3. 运行主循环 ---
+    for i in range(max_steps): # 设置最大循环次数
+        print(f"--- 循环 {i+1} ---\n")
+
+        # 3.1. 构建Prompt
+        full_prompt = "\n".join(prompt_history)
+
+        # 3.2. 调用LLM进行思考
+        llm_output = llm.generate(full_prompt, system_prompt=AGENT_SYSTEM_PROMPT)
+        # 模型可能会输出多余的Thought-Action，需要截断
+        match = re.search(r'(Thought:.*?Action:.*?)(?=\n\s*(?:Thought:|Action:|Observation:)|\Z)', llm_output, re.DOTALL)
+        if match:
+            truncated = match.group(1).strip()
+            if truncated != llm_output.strip():
+                llm_output = truncated
+                print("已截断多余的 Thought-Action 对")
+        print(f"模型输出:\n{llm_output}\n")
+        prompt_history.append(llm_output)
+
+        # 3.3. 解析并执行行动
+        action_match = re.search(r"Action: (.*)", llm_output, re.DOTALL)
+        if not action_match:
+            observation = "错误: 未能解析到 Action 字段。请确保你的回复严格遵循 'Thought: ... Action: ...' 的格式。"
+            observation_str = f"Observation: {observation}"
+            print(f"{observation_str}\n" + "="*40)
+            prompt_history.append(observation_str)
+            continue
+        action_str = action_match.group(1).strip()
+
+        if action_str.startswith("Finish"):
+            final_answer = re.match(r"Finish\[(.*)\]", action_str).group(1)
+            print(f"任务完成，最终答案: {final_answer}")
+            return final_answer
+
+        tool_name = re.search(r"(\w+)\(", action_str).group(1)
+        args_str = re.search(r"\((.*)\)", action_str).group(1)
+        kwargs = dict(re.findall(r'(\w+)="([^"]*)"', args_str))
+
+        if tool_name in tools:
+            observation = tools[tool_name](**kwargs)
+        else:
+            observation = f"错误:未定义的工具 '{tool_name}'"
+
+        # 3.4. 记录观察结果
         observation_str = f"Observation: {observation}"
         print(f"{observation_str}\n" + "="*40)
         prompt_history.append(observation_str)
-        continue
-    action_str = action_match.group(1).strip()
-
-    if action_str.startswith("Finish"):
-        final_answer = re.match(r"Finish\[(.*)\]", action_str).group(1)
-        print(f"任务完成，最终答案: {final_answer}")
-        break
-    
-    tool_name = re.search(r"(\w+)\(", action_str).group(1)
-    args_str = re.search(r"\((.*)\)", action_str).group(1)
-    kwargs = dict(re.findall(r'(\w+)="([^"]*)"', args_str))
-
-    if tool_name in available_tools:
-        observation = available_tools[tool_name](**kwargs)
-    else:
-        observation = f"错误:未定义的工具 '{tool_name}'"
-
-    # 3.4. 记录观察结果
-    observation_str = f"Observation: {observation}"
-    print(f"{observation_str}\n" + "="*40)
-    prompt_history.append(observation_str)
+    return None
+
+if __name__ == '__main__':
+    # --- 1. 配置LLM客户端 ---
+    # 请根据您使用的服务，将这里替换成对应的凭证和地址
+    API_KEY = "YOUR_API_KEY" # TODO
+    BASE_URL = "YOUR_BASE_URL" # TODO
+    MODEL_ID = "YOUR_MODEL_ID" # TODO
+    TAVILY_API_KEY="YOUR_Tavily_KEY" # TODO
+    os.environ['TAVILY_API_KEY'] = "YOUR_TAVILY_API_KEY" # TODO
+
+    llm = OpenAICompatibleClient(
+        model=MODEL_ID,
+        api_key=API_KEY,
+        base_url=BASE_URL
+    )
+
+    # --- 2. 初始化 ---
+    user_prompt = "你好，请帮我查询一下今天北京的天气，然后根据天气推荐一个合适的旅游景点。"
+    run_agent(llm, user_prompt)